@@ -0,0 +1,152 @@
+import os
+from uuid import uuid4
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+from tracecat.api.workflows import touch_workflow
+from tracecat.auth import Role, get_service_role_headers
+from tracecat.db import Action, ActionRun, Webhook, Workflow
+from tracecat.types.api import WorkflowResponse
+
+
+@pytest.fixture
+def api_client():
+    os.environ["TRACECAT__SERVICE_KEY"] = "test_service_key"
+    from tracecat.api.app import app
+
+    with TestClient(app) as client:
+        yield client
+
+
+def test_action_run_routes_use_async_sessions(api_client):
+    from tracecat.api import app as api
+
+    role = Role(type="service", user_id=uuid4().hex, service_id="tracecat-runner")
+    headers = get_service_role_headers(role)
+    action_run_id = uuid4().hex
+    params = {
+        "action_id": "action-1",
+        "action_run_id": action_run_id,
+        "workflow_run_id": "workflow-run-1",
+        "status": "running",
+    }
+
+    response = api_client.post(
+        "/runs/batch", json={"action_runs": [params]}, headers=headers
+    )
+    assert response.status_code == 204
+    response = api_client.post(
+        f"/actions/action-1/runs/{action_run_id}",
+        json={"status": "success"},
+        headers=headers,
+    )
+    assert response.status_code == 204
+    response = api_client.post(
+        "/actions/action-1/runs/missing", json={"status": "success"}, headers=headers
+    )
+    assert response.status_code == 404
+
+    with Session(api.engine) as session:
+        statement = select(ActionRun).where(ActionRun.id == action_run_id)
+        action_run = session.exec(statement).one()
+    assert action_run.owner_id == role.user_id
+    assert action_run.status == "success"
+
+
+def test_get_workflow_serves_cached_response_until_updated(api_client):
+    from tracecat.api import app as api
+
+    role = Role(type="service", user_id=uuid4().hex, service_id="tracecat-runner")
+    headers = get_service_role_headers(role)
+    with Session(api.engine) as session:
+        workflow = Workflow(
+            owner_id=role.user_id,
+            title="Workflow",
+            description="",
+            object='{"nodes": []}',
+        )
+        session.add(workflow)
+        session.commit()
+        session.refresh(workflow)
+        action = Action(
+            owner_id=role.user_id,
+            workflow_id=workflow.id,
+            type="http_request",
+            title="Get IP",
+            description="",
+            inputs='{"url": "https://example.com"}',
+        )
+        session.add(action)
+        session.commit()
+        session.refresh(action)
+        workflow_id, action_id = workflow.id, action.id
+
+    response = api_client.get(f"/workflows/{workflow_id}", headers=headers)
+    assert response.status_code == 200
+    workflow_response = WorkflowResponse.model_validate_json(response.content)
+    assert workflow_response.object == {"nodes": []}
+    assert workflow_response.actions[action_id].inputs == {"url": "https://example.com"}
+    with Session(api.engine) as session:
+        updated_at = session.get(Workflow, workflow_id).updated_at
+    cached = api.workflow_response_cache.get(role.user_id, workflow_id, updated_at)
+    assert cached == response.content
+
+    # Editing an action invalidates the cached response
+    with Session(api.engine) as session:
+        action = session.get(Action, action_id)
+        action.title = "Get IP address"
+        session.add(action)
+        touch_workflow(session, workflow_id)
+        session.commit()
+    response = api_client.get(f"/workflows/{workflow_id}", headers=headers)
+    workflow_response = WorkflowResponse.model_validate_json(response.content)
+    assert workflow_response.actions[action_id].title == "Get IP address"
+
+    response = api_client.get(f"/workflows/{uuid4().hex}", headers=headers)
+    assert response.status_code == 404
+
+
+def test_webhook_routes_match_webhook_authentication(api_client):
+    from tracecat.api import app as api
+
+    role = Role(type="service", user_id=uuid4().hex, service_id="tracecat-runner")
+    headers = get_service_role_headers(role)
+    with Session(api.engine) as session:
+        workflow = Workflow(owner_id=role.user_id, title="Workflow", description="")
+        session.add(workflow)
+        session.commit()
+        session.refresh(workflow)
+        action = Action(
+            owner_id=role.user_id,
+            workflow_id=workflow.id,
+            type="webhook",
+            title="Receive alert",
+            description="",
+        )
+        session.add(action)
+        session.commit()
+        session.refresh(action)
+        webhook = Webhook(
+            owner_id=role.user_id, action_id=action.id, workflow_id=workflow.id
+        )
+        session.add(webhook)
+        session.commit()
+        session.refresh(webhook)
+        path, secret, action_key = webhook.id, webhook.secret, action.key
+
+    response = api_client.get("/authenticate/webhooks", headers=headers)
+    assert response.status_code == 200
+    routes = {route["path"]: route for route in response.json()}
+    assert routes[path]["secret"] == secret
+    assert routes[path]["action_key"] == action_key
+    assert routes[path]["owner_id"] == role.user_id
+
+    response = api_client.post(
+        f"/authenticate/webhooks/{path}/{secret}", headers=headers
+    )
+    assert response.json()["status"] == "Authorized"
+    assert response.json()["action_key"] == action_key
+    response = api_client.post(f"/authenticate/webhooks/{path}/wrong", headers=headers)
+    assert response.json()["status"] == "Unauthorized"
@@ -13,6 +13,7 @@ from tracecat.auth import (
     encrypt_key,
 )
 from tracecat.contexts import ctx_session_role
+from tracecat.runner.client import RUNNER_ROLE, SharedAPIClient
 
 
 @pytest.fixture(autouse=True)
@@ -223,3 +224,21 @@ async def test_authenticated_api_client_init_with_role():
         assert client.headers["X-API-Key"] == os.environ["TRACECAT__SERVICE_KEY"]
         assert client.headers["Service-User-ID"] == "mock_user_id"
         assert client.base_url == os.environ["TRACECAT__API_URL"]
+
+
+@pytest.mark.asyncio
+async def test_shared_api_client_injects_role_per_request():
+    async with SharedAPIClient(role=RUNNER_ROLE) as client:
+        ctx_session_role.set(None)
+        request = client.build_request("GET", "/workflows")
+        assert request.headers["Service-Role"] == "tracecat-runner"
+        assert "Service-User-ID" not in request.headers
+
+        ctx_session_role.set(
+            Role(type="service", user_id="mock_user_id", service_id="tracecat-runner")
+        )
+        request = client.build_request("GET", "/workflows")
+        assert request.headers["Service-Role"] == "tracecat-runner"
+        assert request.headers["Service-User-ID"] == "mock_user_id"
+        assert request.headers["X-API-Key"] == os.environ["TRACECAT__SERVICE_KEY"]
+        assert request.url == f"{os.environ['TRACECAT__API_URL']}/workflows"
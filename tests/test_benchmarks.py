@@ -0,0 +1,129 @@
+"""Storage benchmarks.
+
+Skipped unless `TRACECAT__RUN_BENCHMARKS` is set. The number of rows is set by
+`TRACECAT__BENCHMARK_ROWS`.
+"""
+
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from uuid import uuid4
+
+import lancedb
+import pyarrow as pa
+import pytest
+from sqlalchemy import Engine
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, SQLModel, create_engine
+
+from tracecat.db import ActionRun, CaseSchema, create_cases_indices, create_db_engine
+
+pytestmark = [
+    pytest.mark.benchmark,
+    pytest.mark.skipif(
+        not os.environ.get("TRACECAT__RUN_BENCHMARKS"),
+        reason="Set TRACECAT__RUN_BENCHMARKS to run benchmarks",
+    ),
+]
+
+N_ROWS = int(os.environ.get("TRACECAT__BENCHMARK_ROWS", 1_000_000))
+N_WRITERS = 16
+N_WRITES = int(os.environ.get("TRACECAT__BENCHMARK_WRITES", 200))  # Per writer
+N_LOOKUPS = 100
+CHUNK_SIZE = 100_000
+
+
+def _case_rows(start: int, stop: int, n_workflows: int) -> pa.Table:
+    n = stop - start
+    columns = {
+        "id": [f"case-{i}" for i in range(start, stop)],
+        "owner_id": [f"user-{i % 100}" for i in range(start, stop)],
+        "workflow_id": [f"workflow-{i % n_workflows}" for i in range(start, stop)],
+        "title": ["Case"] * n,
+        "payload": ["{}"] * n,
+        "malice": ["benign"] * n,
+        "status": ["open"] * n,
+        "priority": ["low"] * n,
+    }
+    return pa.Table.from_pydict(
+        {
+            field.name: columns.get(field.name, pa.nulls(n, field.type))
+            for field in CaseSchema
+        },
+        schema=CaseSchema,
+    )
+
+
+def _median_lookup_ms(tbl: lancedb.table.Table, where: str) -> float:
+    timings = []
+    for _ in range(N_LOOKUPS):
+        start = time.perf_counter()
+        tbl.search().where(where).limit(10).to_arrow()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def test_cases_point_lookup(tmp_path):
+    tbl = lancedb.connect(tmp_path).create_table(
+        "cases", schema=CaseSchema, exist_ok=True
+    )
+    for start in range(0, N_ROWS, CHUNK_SIZE):
+        tbl.add(_case_rows(start, min(start + CHUNK_SIZE, N_ROWS), N_ROWS // 10))
+
+    case_id = f"case-{N_ROWS // 2}"
+    where = f"id = {case_id!r} AND workflow_id = 'workflow-{(N_ROWS // 2) % (N_ROWS // 10)}'"
+    unindexed_ms = _median_lookup_ms(tbl, where)
+    create_cases_indices(tbl)
+    indexed_ms = _median_lookup_ms(tbl, where)
+
+    print(
+        f"\n{N_ROWS} cases, median lookup: {unindexed_ms:.3f} ms without indexes,"
+        f" {indexed_ms:.3f} ms with indexes"
+    )
+    assert tbl.search().where(where).to_arrow().column("id").to_pylist() == [case_id]
+    assert indexed_ms < unindexed_ms
+
+
+def _write_action_runs(engine: Engine) -> tuple[float, int]:
+    """Commit action runs one at a time from concurrent writers, like the API
+    does under runner load. Returns the writes per second and the failed writes.
+    """
+
+    def write(_) -> int:
+        failed = 0
+        for _ in range(N_WRITES):
+            action_run = ActionRun(
+                owner_id="user", action_id="action", workflow_run_id="run"
+            )
+            action_run.id = uuid4().hex
+            try:
+                with Session(engine) as session:
+                    session.add(action_run)
+                    session.commit()
+            except OperationalError:  # Database is locked
+                failed += 1
+        return failed
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(N_WRITERS) as executor:
+        failed = sum(executor.map(write, range(N_WRITERS)))
+    elapsed = time.perf_counter() - start
+    return (N_WRITERS * N_WRITES - failed) / elapsed, failed
+
+
+def test_action_run_write_throughput(tmp_path):
+    # Defaults before tuning: rollback journal, full sync, 5s busy timeout
+    default_uri = f"sqlite:///{tmp_path / 'default.db'}"
+    default = create_engine(default_uri, connect_args={"check_same_thread": False})
+    tuned = create_db_engine(f"sqlite:///{tmp_path / 'tuned.db'}")
+    results = {}
+    for name, engine in [("default", default), ("tuned", tuned)]:
+        SQLModel.metadata.create_all(engine, tables=[ActionRun.__table__])
+        results[name] = _write_action_runs(engine)
+        engine.dispose()
+
+    for name, (throughput, failed) in results.items():
+        print(f"\n{name}: {throughput:.0f} action runs/s, {failed} failed writes")
+    assert results["tuned"][1] == 0
+    assert results["tuned"][0] > results["default"][0]
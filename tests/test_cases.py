@@ -0,0 +1,220 @@
+from datetime import UTC, datetime, timedelta
+
+import lancedb
+import orjson
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import pytest
+
+from tracecat.api.case_metrics import CaseMetricsCache
+from tracecat.api.cases import case_update_values, export_cases, list_cases_page
+from tracecat.db import CaseSchema
+from tracecat.types.api import CaseParams
+from tracecat.types.cases import Case
+
+
+@pytest.fixture
+def cases_dataset(tmp_path):
+    created_at = datetime(2024, 1, 1, tzinfo=UTC)
+    cases = [
+        Case(
+            id=f"case-{i:02d}",
+            owner_id="test_user_id" if i % 5 else "other_user_id",
+            workflow_id="test_workflow_id",
+            title=f"Case {i}",
+            payload={"i": i},
+            malice="benign",
+            status="open",
+            priority="low",
+            # Pairs of cases share a timestamp, ordered by ID
+            created_at=created_at + timedelta(seconds=i // 2),
+        )
+        for i in reversed(range(25))
+    ]
+    tbl = lancedb.connect(tmp_path).create_table("cases", schema=CaseSchema)
+    # Several appends create several fragments
+    for start in range(0, len(cases), 7):
+        rows = [case.flatten() for case in cases[start : start + 7]]
+        tbl.add(pa.Table.from_pylist(rows, schema=CaseSchema))
+    return tbl.to_lance()
+
+
+def test_list_cases_pages_in_key_order(cases_dataset):
+    ids, cursor = [], None
+    while True:
+        page, cursor = list_cases_page(
+            cases_dataset,
+            owner_id="test_user_id",
+            workflow_id="test_workflow_id",
+            limit=6,
+            cursor=cursor,
+        )
+        ids.extend(case["id"] for case in page)
+        if cursor is None:
+            break
+
+    assert ids == [f"case-{i:02d}" for i in range(25) if i % 5]
+    assert len(page) == 2
+
+
+def test_list_cases_pages_across_updates(tmp_path, cases_dataset):
+    tbl = lancedb.connect(tmp_path).open_table("cases")
+
+    def next_page(cursor):
+        return list_cases_page(
+            tbl.to_lance(),
+            owner_id="test_user_id",
+            workflow_id="test_workflow_id",
+            limit=6,
+            cursor=cursor,
+        )
+
+    page, cursor = next_page(None)
+    ids = [case["id"] for case in page]
+    # Update a case of the first page and one of the next
+    for case_id in ("case-01", "case-12"):
+        params = CaseParams(
+            title="Updated",
+            payload={"updated": True},
+            malice="malicious",
+            status="closed",
+            priority="high",
+        )
+        case = Case.from_params(
+            params, owner_id="test_user_id", workflow_id="test_workflow_id", id=case_id
+        )
+        tbl.update(where=f"id = {case_id!r}", values=case_update_values(case))
+    while cursor is not None:
+        page, cursor = next_page(cursor)
+        ids.extend(case["id"] for case in page)
+
+    assert ids == [f"case-{i:02d}" for i in range(25) if i % 5]
+    (updated,) = tbl.to_lance().to_table(filter=pc.field("id") == "case-12").to_pylist()
+    assert updated["title"] == "Updated"
+    assert updated["created_at"] == datetime(2024, 1, 1, 0, 0, 6, tzinfo=UTC)
+
+
+def test_list_cases_includes_cases_without_created_at(tmp_path):
+    rows = [
+        Case(
+            id=f"case-{i}",
+            owner_id="test_user_id",
+            workflow_id="test_workflow_id",
+            title=f"Case {i}",
+            payload={"i": i},
+            malice="benign",
+            status="open",
+            priority="low",
+        ).flatten()
+        for i in range(4)
+    ]
+    rows[2]["created_at"] = rows[3]["created_at"] = None
+    tbl = lancedb.connect(tmp_path).create_table("cases", schema=CaseSchema)
+    tbl.add(pa.Table.from_pylist(rows, schema=CaseSchema))
+
+    ids, cursor = [], None
+    while True:
+        page, cursor = list_cases_page(
+            tbl.to_lance(),
+            owner_id="test_user_id",
+            workflow_id="test_workflow_id",
+            limit=1,
+            cursor=cursor,
+        )
+        ids.extend(case["id"] for case in page)
+        if cursor is None:
+            break
+    assert ids == ["case-2", "case-3", "case-0", "case-1"]
+
+
+def test_list_cases_projects_fields_and_embeds_json(cases_dataset):
+    page, cursor = list_cases_page(
+        cases_dataset,
+        owner_id="test_user_id",
+        workflow_id="test_workflow_id",
+        limit=2,
+        fields=["title", "payload"],
+    )
+    assert cursor is not None
+    assert orjson.loads(orjson.dumps(page)) == [
+        {"title": "Case 1", "payload": {"i": 1}},
+        {"title": "Case 2", "payload": {"i": 2}},
+    ]
+
+
+@pytest.mark.parametrize(
+    "kwargs", [{"cursor": "not-a-cursor"}, {"fields": ["title", "secret"]}]
+)
+def test_list_cases_rejects_invalid_params(cases_dataset, kwargs):
+    with pytest.raises(ValueError):
+        list_cases_page(
+            cases_dataset,
+            owner_id="test_user_id",
+            workflow_id="test_workflow_id",
+            limit=10,
+            **kwargs,
+        )
+
+
+@pytest.mark.parametrize("format", ["arrow", "parquet"])
+def test_export_cases(cases_dataset, format):
+    chunks = export_cases(
+        cases_dataset,
+        owner_id="test_user_id",
+        workflow_id="test_workflow_id",
+        format=format,
+        fields=["id", "payload"],
+    )
+    data = pa.py_buffer(b"".join(chunks))
+    if format == "arrow":
+        table = pa.ipc.open_stream(data).read_all()
+    else:
+        table = pq.read_table(pa.BufferReader(data))
+
+    assert table.column_names == ["id", "payload"]
+    assert sorted(table.column("id").to_pylist()) == [
+        f"case-{i:02d}" for i in range(25) if i % 5
+    ]
+
+
+def test_case_metrics_are_cached_per_table_version(tmp_path):
+    created_at = datetime(2024, 1, 1, tzinfo=UTC)
+    cases = [
+        Case(
+            owner_id="test_user_id",
+            workflow_id="test_workflow_id",
+            title=f"Case {i}",
+            payload={"i": i},
+            malice="benign",
+            status="open" if i % 2 else "closed",
+            priority="low",
+            created_at=created_at + timedelta(hours=10 * i),
+        )
+        for i in range(5)
+    ]
+    tbl = lancedb.connect(tmp_path).create_table("cases", schema=CaseSchema)
+    tbl.add(pa.Table.from_pylist([c.flatten() for c in cases[:4]], schema=CaseSchema))
+    cache = CaseMetricsCache(max_size=10)
+    kwargs = {"owner_id": "test_user_id", "workflow_id": "test_workflow_id"}
+
+    metrics = cache.get(tbl.to_lance(), **kwargs)
+    assert metrics.statues == [
+        {"status": "closed", "count": 2},
+        {"status": "open", "count": 2},
+    ]
+    assert [(row["bucket"].day, row["count"]) for row in metrics.timeseries] == [
+        (1, 2),
+        (1, 1),
+        (2, 1),
+    ]
+    assert cache.get(tbl.to_lance(), **kwargs) is metrics
+
+    # Writing cases creates a new table version
+    tbl.add(pa.Table.from_pylist([cases[4].flatten()], schema=CaseSchema))
+    metrics = cache.get(tbl.to_lance(), **kwargs)
+    assert metrics.malice == [{"malice": "benign", "count": 5}]
+
+    # Naive datetimes are in UTC
+    metrics = cache.get(tbl.to_lance(), **kwargs, start=datetime(2024, 1, 2))
+    assert metrics.priority == [{"priority": "low", "count": 2}]
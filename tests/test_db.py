@@ -0,0 +1,25 @@
+from sqlalchemy import inspect, text
+from sqlmodel import SQLModel
+
+from tracecat.db import create_db_engine, create_missing_indexes
+
+
+def test_create_missing_indexes_migrates_existing_tables(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'database.db'}")
+    SQLModel.metadata.create_all(engine)
+    # A database created before the indexes were declared
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_actionrun_owner_id_action_id_created_at"))
+        conn.execute(text("DROP INDEX ix_webhook_owner_id_workflow_id"))
+
+    create_missing_indexes(engine)
+    create_missing_indexes(engine)  # Idempotent
+
+    inspector = inspect(engine)
+    actionrun_indexes = {i["name"]: i for i in inspector.get_indexes("actionrun")}
+    assert actionrun_indexes["ix_actionrun_owner_id_action_id_created_at"][
+        "column_names"
+    ] == ["owner_id", "action_id", "created_at"]
+    assert "ix_webhook_owner_id_workflow_id" in {
+        i["name"] for i in inspector.get_indexes("webhook")
+    }
@@ -0,0 +1,57 @@
+from datetime import date, datetime
+from uuid import uuid4
+
+import tantivy
+
+from tracecat.api.events import query_events
+from tracecat.db import (
+    build_events_index,
+    create_events_index,
+    get_events_partitions,
+    list_events_partitions,
+)
+from tracecat.types.api import EventSearchParams
+
+
+def test_query_events_filters_orders_and_paginates():
+    build_events_index()
+    workflow_id = f"wf-{uuid4().hex}"
+    for i in range(6):
+        published_at = datetime(2024, 1, 1 + i)
+        writer = create_events_index(published_at.date()).writer()
+        writer.add_document(
+            tantivy.Document(
+                action_id=f"action-{i}",
+                action_run_id=f"ar-{i}",
+                action_title=f"Send email {i}" if i % 2 else f"Open case {i}",
+                action_type="send_email" if i % 2 else "open_case",
+                workflow_id=workflow_id,
+                workflow_title="Phishing triage",
+                workflow_run_id="run-a" if i < 4 else "run-b",
+                data={"i": i},
+                published_at=published_at,
+            )
+        )
+        writer.commit()
+        writer.wait_merging_threads()
+    # Events are partitioned by day
+    assert {date(2024, 1, 1 + i) for i in range(6)} <= set(list_events_partitions())
+    for _, index in get_events_partitions():
+        index.reload()
+
+    def search(**kwargs) -> list[str]:
+        params = EventSearchParams(**{"workflow_id": workflow_id, **kwargs})
+        return [event.action_id for event in query_events(params)]
+
+    assert search() == [f"action-{i}" for i in reversed(range(6))]
+    assert search(order="asc", limit=2, offset=1) == ["action-1", "action-2"]
+    assert search(workflow_run_id="run-a", action_type="send_email") == [
+        "action-3",
+        "action-1",
+    ]
+    assert search(
+        start_time=datetime(2024, 1, 2), end_time=datetime(2024, 1, 4), order="asc"
+    ) == ["action-1", "action-2"]
+    assert search(query="email", workflow_run_id="run-b") == ["action-5"]
+    # Workflow IDs are matched exactly
+    assert search(workflow_id="wf") == []
@@ -0,0 +1,144 @@
+import asyncio
+from uuid import uuid4
+
+import pytest
+
+from tracecat.db import (
+    CASE_INDEXED_COLUMNS,
+    CaseSchema,
+    create_cases_indices,
+    create_vdb_conn,
+    get_vdb_table,
+)
+from tracecat.ingestion import CaseIngestionBuffer, compact_cases_table
+from tracecat.types.cases import Case
+
+
+def _count_cases(workflow_id: str) -> int:
+    tbl = create_vdb_conn().open_table("cases")
+    return tbl.count_rows(f"workflow_id = {workflow_id!r}")
+
+
+@pytest.mark.asyncio
+async def test_case_ingestion_buffer_appends_in_batches():
+    create_vdb_conn().create_table("cases", schema=CaseSchema, exist_ok=True)
+    workflow_id = uuid4().hex
+    cases = [
+        Case(
+            owner_id="test_user_id",
+            workflow_id=workflow_id,
+            title=f"Case {i}",
+            payload={"i": i},
+            malice="benign",
+            status="open",
+            priority="low",
+        )
+        for i in range(3)
+    ]
+    buffer = CaseIngestionBuffer(max_rows=2, flush_interval=3600)
+
+    await buffer.add(cases[:1])
+    assert buffer.size == 1
+    assert _count_cases(workflow_id) == 0
+
+    # Reaching max_rows flushes the buffer
+    await buffer.add(cases[1:])
+    assert buffer.size == 0
+    assert _count_cases(workflow_id) == 3
+
+    await buffer.add(cases[:1])
+    await buffer.stop()
+    assert _count_cases(workflow_id) == 4
+
+    await asyncio.to_thread(compact_cases_table)
+    assert _count_cases(workflow_id) == 4
+
+    # Table handles are shared by the whole process
+    assert get_vdb_table("cases") is get_vdb_table("cases")
+
+
+@pytest.mark.asyncio
+async def test_case_ingestion_buffer_drops_failing_cases():
+    create_vdb_conn().create_table("cases", schema=CaseSchema, exist_ok=True)
+    workflow_id = uuid4().hex
+    cases = [
+        Case(
+            owner_id="test_user_id",
+            workflow_id=workflow_id,
+            title=f"Case {i}",
+            payload={"i": i},
+            malice="benign",
+            status="open",
+            priority="low",
+        )
+        for i in range(2)
+    ]
+    buffer = CaseIngestionBuffer(max_rows=100, flush_interval=3600, max_attempts=2)
+
+    # Invalid cases are dropped without failing the others
+    await buffer.add(cases)
+    buffer._rows[1]["created_at"] = "not a timestamp"
+    await buffer.flush()
+    assert buffer.size == 1
+    await buffer.flush()
+    assert buffer.size == 0
+    assert _count_cases(workflow_id) == 1
+
+    # Cases that keep failing to append are dropped after `max_attempts`
+    async def failing_run_blocking(fn, *args):
+        if fn.__name__ == "_append_cases":
+            raise OSError("Storage unavailable")
+        return fn(*args)
+
+    buffer.run_blocking = failing_run_blocking
+    await buffer.add(cases[:1])
+    await buffer.flush()
+    assert buffer.size == 1
+    await buffer.flush()
+    assert buffer.size == 0
+    await buffer.stop()
+    assert _count_cases(workflow_id) == 1
+
+
+@pytest.mark.asyncio
+async def test_case_ingestion_buffer_stop_keeps_in_flight_append():
+    create_vdb_conn().create_table("cases", schema=CaseSchema, exist_ok=True)
+    workflow_id = uuid4().hex
+    case = Case(
+        owner_id="test_user_id",
+        workflow_id=workflow_id,
+        title="Case",
+        payload={"i": 0},
+        malice="benign",
+        status="open",
+        priority="low",
+    )
+    appending = asyncio.Event()
+
+    async def slow_run_blocking(fn, *args):
+        if fn.__name__ == "_append_cases":
+            appending.set()
+            await asyncio.sleep(0.05)
+        return fn(*args)
+
+    buffer = CaseIngestionBuffer(
+        max_rows=100, flush_interval=0.01, run_blocking=slow_run_blocking
+    )
+    await buffer.add([case])
+    # Stop while the background loop is appending the case
+    await appending.wait()
+    await buffer.stop()
+    assert buffer.size == 0
+    assert _count_cases(workflow_id) == 1
+
+
+def test_create_cases_indices_is_idempotent(tmp_path):
+    import lancedb
+
+    tbl = lancedb.connect(tmp_path).create_table("cases", schema=CaseSchema)
+    create_cases_indices(tbl)
+    create_cases_indices(tbl)
+    indices = tbl.to_lance().list_indices()
+    assert sorted(f for index in indices for f in index["fields"]) == sorted(
+        CASE_INDEXED_COLUMNS
+    )
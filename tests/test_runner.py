@@ -0,0 +1,516 @@
+import asyncio
+import os
+import threading
+from datetime import UTC, date, datetime
+from uuid import uuid4
+
+import orjson
+import pytest
+import respx
+import tantivy
+from cryptography.fernet import Fernet
+from httpx import Response
+
+from tracecat.auth import Role
+from tracecat.config import TRACECAT__API_URL
+from tracecat.contexts import ctx_session_role
+from tracecat.db import Secret, create_events_index, list_events_partitions
+from tracecat.runner import actions
+from tracecat.runner.actions import ActionRunResult, ActionTrail, run_action
+from tracecat.runner.cache import WorkflowCache
+from tracecat.runner.events import EventIndexer
+from tracecat.runner.executor import StorageExecutor
+from tracecat.runner.outbox import ActionRunOutbox
+from tracecat.runner.retention import RunResultStore
+from tracecat.runner.secrets import SecretCache
+from tracecat.runner.templates import TemplatePlan
+from tracecat.runner.tracker import DependencyFailedError, DependencyTracker
+from tracecat.runner.webhooks import WebhookTable
+from tracecat.runner.workflows import Workflow, WorkflowRunContext
+from tracecat.types.api import UpsertActionRunParams
+
+
+def _build_tracker(adj_list: dict[str, list[str]]) -> DependencyTracker:
+    deps: dict[str, set[str]] = {k: set() for k in adj_list}
+    for upstream, downstream in adj_list.items():
+        for key in downstream:
+            deps[key].add(upstream)
+    return DependencyTracker(adj_list=adj_list, action_dependencies=deps)
+
+
+@pytest.mark.asyncio
+async def test_dependency_tracker_wakes_on_last_upstream():
+    tracker = _build_tracker({"a": ["c"], "b": ["c"], "c": []})
+    waiter = asyncio.create_task(tracker.wait("c"))
+
+    tracker.mark_success("a")
+    await asyncio.sleep(0)
+    assert not waiter.done()
+
+    tracker.mark_success("b")
+    await asyncio.wait_for(waiter, timeout=1)
+    assert tracker.is_ready("c")
+
+
+@pytest.mark.asyncio
+async def test_dependency_tracker_propagates_failure():
+    tracker = _build_tracker({"a": ["b"], "b": ["c"], "c": [], "d": ["c"]})
+    waiter = asyncio.create_task(tracker.wait("c"))
+
+    tracker.mark_success("d")
+    tracker.mark_failure("a")
+
+    with pytest.raises(DependencyFailedError):
+        await asyncio.wait_for(waiter, timeout=1)
+    with pytest.raises(DependencyFailedError):
+        await tracker.wait("b")
+
+
+@pytest.mark.asyncio
+async def test_workflow_run_context_drains_when_jobs_complete():
+    workflow = Workflow(
+        title="Test Workflow", adj_list={}, actions={}, owner_id="test_user_id"
+    )
+    run_context = WorkflowRunContext(workflow=workflow, workflow_run_id="wfr")
+    release = asyncio.Event()
+    run_context.add_running_job("ar", asyncio.create_task(release.wait()))
+
+    next_action_run = asyncio.create_task(run_context.next_action_run())
+    await asyncio.sleep(0)
+    assert not next_action_run.done()
+
+    release.set()
+    assert await asyncio.wait_for(next_action_run, timeout=1) is None
+    assert run_context.running_jobs_store == {}
+
+
+@pytest.mark.asyncio
+async def test_workflow_run_context_wakes_on_cancel():
+    workflow = Workflow(
+        title="Test Workflow", adj_list={}, actions={}, owner_id="test_user_id"
+    )
+    run_context = WorkflowRunContext(workflow=workflow, workflow_run_id="wfr")
+    running = asyncio.create_task(asyncio.Event().wait())
+    run_context.add_running_job("ar", running)
+
+    # The queue is empty and the running job never completes
+    next_action_run = asyncio.create_task(run_context.next_action_run())
+    await asyncio.sleep(0)
+    assert not next_action_run.done()
+
+    run_context.cancel()
+    assert await asyncio.wait_for(next_action_run, timeout=1) is None
+    assert run_context.cancelled
+    running.cancel()
+
+
+@pytest.mark.asyncio
+async def test_run_workflow_drops_context_if_status_update_fails(monkeypatch):
+    from tracecat.runner import app as runner
+
+    workflow = Workflow(
+        title="Test Workflow", adj_list={}, actions={}, owner_id="test_user_id"
+    )
+
+    class FakeCachedWorkflow:
+        def __init__(self) -> None:
+            self.workflow = workflow
+
+    async def get_workflow(workflow_id):
+        return FakeCachedWorkflow()
+
+    statuses = []
+
+    async def update_workflow_run(*, workflow_id, workflow_run_id, status):
+        statuses.append(status)
+        if status == "running":
+            raise RuntimeError("API unavailable")
+
+    monkeypatch.setattr(runner.workflow_cache, "get", get_workflow)
+    monkeypatch.setattr(runner, "update_workflow_run", update_workflow_run)
+    await runner.run_workflow(
+        workflow_id="wf", workflow_run_id="wfr-failed", entrypoint_key="a.entry"
+    )
+    assert "wfr-failed" not in runner.workflow_run_contexts
+    assert statuses == ["running", "failure"]
+
+
+@pytest.mark.asyncio
+async def test_run_result_store_evicts_lru_and_spills(tmp_path):
+    (tmp_path / "wfr-stale.json").write_bytes(b"{}")
+    store = RunResultStore(ttl=3600, max_bytes=64, spill_path=tmp_path)
+    # Spill files of a previous process are deleted
+    await store.start()
+    assert not (tmp_path / "wfr-stale.json").exists()
+
+    await store.put("wfr-1", owner_id="user", results={"ar-1": "x" * 40})
+    await store.put("wfr-2", owner_id="user", results={"ar-2": "y" * 40})
+
+    # wfr-1 was least recently used and got spilled to disk
+    assert store.size_bytes <= 64
+    assert store.metrics()["spilled_runs"] == 1
+    assert (tmp_path / "wfr-1.json").exists()
+    assert store.get("wfr-1", owner_id="user") == {"ar-1": "x" * 40}
+    assert store.get("wfr-2", owner_id="user") == {"ar-2": "y" * 40}
+    assert store.get("wfr-2", owner_id="someone_else") is None
+
+
+@pytest.mark.asyncio
+async def test_run_result_store_expires_runs(tmp_path):
+    store = RunResultStore(ttl=0, max_bytes=1024, spill_path=tmp_path)
+    await store.put("wfr-1", owner_id="user", results={"ar-1": 1})
+    assert store.get("wfr-1", owner_id="user") is None
+    assert store.metrics() == {
+        "retained_runs": 0,
+        "retained_bytes": 0,
+        "spilled_runs": 0,
+    }
+
+
+def test_action_trail_shares_upstream_results():
+    def result(slug: str) -> ActionRunResult:
+        return ActionRunResult(action_key=f"id.{slug}", output={"slug": slug})
+
+    root = ActionTrail().extend("ar:a", result("a"))
+    left = root.extend("ar:b", result("b"))
+    right = root.extend("ar:c", result("c"))
+    joined = ActionTrail.join([left, right]).extend("ar:d", result("d"))
+
+    assert list(joined) == ["ar:a", "ar:b", "ar:c", "ar:d"]
+    assert len(joined) == 4
+    assert len(ActionTrail.join([left, right])) == 3
+    assert [ar_id for ar_id, _ in joined.items()] == list(joined)
+    assert [r.output["slug"] for r in joined.values()] == ["a", "b", "c", "d"]
+    assert joined["ar:a"] is root["ar:a"]
+    assert joined["ar:d"].output == {"slug": "d"}
+    assert "ar:b" not in right
+    with pytest.raises(KeyError):
+        right["ar:b"]
+
+
+@pytest.mark.asyncio
+async def test_llm_action_reuses_template_plan(monkeypatch):
+    ctx_session_role.set(None)
+    prompts: list[str] = []
+
+    async def mock_openai_call(*, prompt: str, **kwargs):
+        prompts.append(prompt)
+        return "Bonjour"
+
+    monkeypatch.setattr(actions, "async_openai_call", mock_openai_call)
+    # Untemplated subtrees like the task fields are shared by all evaluations
+    plan = TemplatePlan(
+        {
+            "task_fields": {"type": "llm.translate", "to_language": "french"},
+            "message": "Translate {{ $.webhook.text }}",
+        }
+    )
+    trail = ActionTrail().extend(
+        "ar:webhook",
+        ActionRunResult(action_key="id.webhook", output={"text": "Hello"}),
+    )
+    for _ in range(2):
+        result = await run_action(
+            type="llm",
+            action_run_id="ar:llm",
+            workflow_id="wf",
+            key="id.llm",
+            title="LLM",
+            action_trail=trail,
+            template_plan=plan,
+        )
+        assert result.output == {"output": "Bonjour", "output_type": "str"}
+    assert prompts == ["Translate Hello", "Translate Hello"]
+
+
+@pytest.mark.asyncio
+async def test_action_run_outbox_coalesces_status_changes():
+    outbox = ActionRunOutbox(flush_interval=3600, max_batch_size=100)
+
+    def change(ar_id: str, status: str) -> UpsertActionRunParams:
+        return UpsertActionRunParams(
+            action_id="a", action_run_id=ar_id, workflow_run_id="wfr", status=status
+        )
+
+    outbox.put(change("ar-1", "pending"))
+    outbox.put(change("ar-2", "pending"))
+    outbox.put(change("ar-1", "running"))
+    outbox.put(change("ar-1", "success"))
+    # A failed flush must not overwrite a newer status
+    outbox._add(("tracecat-runner", None), change("ar-1", "pending"), overwrite=False)
+
+    assert outbox.size == 2
+    (changes,) = outbox._pending.values()
+    assert {k: v.status for k, v in changes.items()} == {
+        "ar-1": "success",
+        "ar-2": "pending",
+    }
+    outbox._task.cancel()
+
+
+@pytest.mark.asyncio
+async def test_action_run_outbox_only_retries_transient_errors():
+    os.environ["TRACECAT__SERVICE_KEY"] = "test_service_key"
+    ctx_session_role.set(None)
+    outbox = ActionRunOutbox(flush_interval=3600, max_batch_size=100, max_attempts=2)
+    outbox.put(
+        UpsertActionRunParams(
+            action_id="a", action_run_id="ar-1", workflow_run_id="wfr", status="success"
+        )
+    )
+    outbox._task.cancel()
+
+    with respx.mock:
+        route = respx.post(f"{TRACECAT__API_URL}/runs/batch").mock(
+            return_value=Response(503)
+        )
+        await outbox.flush()
+        assert outbox.size == 1
+        # Dropped after `max_attempts` failed reports
+        await outbox.flush()
+        assert outbox.size == 0
+        assert route.call_count == 2
+
+        outbox._add(
+            ("tracecat-runner", None),
+            UpsertActionRunParams(
+                action_id="a",
+                action_run_id="ar-2",
+                workflow_run_id="wfr",
+                status="success",
+            ),
+        )
+        route.mock(return_value=Response(422))
+        await outbox.flush()
+        assert outbox.size == 0
+        assert route.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_action_run_outbox_stop_keeps_in_flight_flush():
+    os.environ["TRACECAT__SERVICE_KEY"] = "test_service_key"
+    ctx_session_role.set(None)
+    outbox = ActionRunOutbox(flush_interval=3600, max_batch_size=1)
+    in_flight = asyncio.Event()
+    reported = []
+
+    async def report(request):
+        in_flight.set()
+        await asyncio.sleep(0.05)
+        reported.extend(
+            r["action_run_id"] for r in orjson.loads(request.content)["action_runs"]
+        )
+        return Response(204)
+
+    with respx.mock:
+        respx.post(f"{TRACECAT__API_URL}/runs/batch").mock(side_effect=report)
+        # A full batch wakes the flush loop
+        outbox.put(
+            UpsertActionRunParams(
+                action_id="a",
+                action_run_id="ar-1",
+                workflow_run_id="wfr",
+                status="success",
+            )
+        )
+        await asyncio.wait_for(in_flight.wait(), timeout=1)
+        await outbox.stop()
+
+    assert reported == ["ar-1"]
+    assert outbox.size == 0
+
+
+@pytest.mark.asyncio
+async def test_secret_cache_fetches_missing_secrets_in_one_request():
+    os.environ["TRACECAT__SERVICE_KEY"] = "test_service_key"
+    os.environ["TRACECAT__DB_ENCRYPTION_KEY"] = Fernet.generate_key().decode()
+    ctx_session_role.set(
+        Role(type="service", service_id="tracecat-runner", user_id="test_user_id")
+    )
+
+    secrets = []
+    for name, value in {"API_KEY_1": "1234567890", "API_KEY_2": "asdfghjkl"}.items():
+        secret = Secret(name=name, owner_id="test_user_id")
+        secret.key = value  # Encrypt the secret
+        secrets.append(secret.model_dump(mode="json"))
+
+    cache = SecretCache(ttl=60)
+    with respx.mock:
+        route = respx.post(f"{TRACECAT__API_URL}/secrets/search").mock(
+            return_value=Response(200, json=secrets)
+        )
+        await cache.prefetch(["API_KEY_1", "API_KEY_2"])
+        actual = await cache.get_many(["API_KEY_1", "API_KEY_2", "API_KEY_1"])
+        assert route.call_count == 1
+        assert actual == {"API_KEY_1": "1234567890", "API_KEY_2": "asdfghjkl"}
+
+        with pytest.raises(ValueError):
+            await cache.get_many(["API_KEY_1", "MISSING"])
+        assert route.call_count == 2
+    assert len(cache) == 2
+
+
+@pytest.mark.asyncio
+async def test_workflow_cache_shares_fetches_and_invalidates():
+    os.environ["TRACECAT__SERVICE_KEY"] = "test_service_key"
+    ctx_session_role.set(
+        Role(type="service", service_id="tracecat-runner", user_id="test_user_id")
+    )
+    workflow_response = {
+        "id": "wf",
+        "title": "Test Workflow",
+        "description": "",
+        "status": "online",
+        "actions": {},
+        "object": {"nodes": [], "edges": []},
+        "owner_id": "test_user_id",
+    }
+
+    cache = WorkflowCache(ttl=60, max_size=10)
+    with respx.mock:
+        route = respx.get(f"{TRACECAT__API_URL}/workflows/wf").mock(
+            return_value=Response(200, json=workflow_response)
+        )
+        first, second = await asyncio.gather(cache.get("wf"), cache.get("wf"))
+        assert route.call_count == 1
+        assert first.workflow is second.workflow
+        assert first.workflow.title == "Test Workflow"
+
+        # Expired, but unchanged workflows are not recompiled
+        cache.ttl = 0
+        cache._entries[("test_user_id", "wf")].expires_at = 0
+        refreshed = await cache.get("wf")
+        assert route.call_count == 2
+        assert refreshed.workflow is first.workflow
+
+        cache.invalidate("wf")
+        assert len(cache) == 0
+        recompiled = await cache.get("wf")
+        assert route.call_count == 3
+        assert recompiled.workflow is not first.workflow
+
+
+@pytest.mark.asyncio
+async def test_webhook_table_authenticates_from_memory():
+    os.environ["TRACECAT__SERVICE_KEY"] = "test_service_key"
+    ctx_session_role.set(None)
+
+    def route(i: int) -> dict[str, str]:
+        return {
+            "path": f"path-{i}",
+            "secret": f"secret-{i}",
+            "owner_id": "test_user_id",
+            "action_id": f"action-{i}",
+            "action_key": f"action-{i}.get_ip",
+            "workflow_id": "wf",
+        }
+
+    table = WebhookTable(ttl=60, miss_ttl=60)
+    with respx.mock:
+        list_route = respx.get(f"{TRACECAT__API_URL}/authenticate/webhooks").mock(
+            return_value=Response(200, json=[route(1)])
+        )
+        auth_route = respx.post(
+            f"{TRACECAT__API_URL}/authenticate/webhooks/path-2/secret-2"
+        ).mock(
+            return_value=Response(
+                200,
+                json={
+                    **route(2),
+                    "status": "Authorized",
+                    "webhook_id": "path-2",
+                },
+            )
+        )
+        unknown_route = respx.post(
+            f"{TRACECAT__API_URL}/authenticate/webhooks/unknown/secret"
+        ).mock(return_value=Response(404))
+
+        await table.warm()
+        for _ in range(3):
+            response = await table.authenticate("path-1", "secret-1")
+            assert response.status == "Authorized"
+            assert response.action_key == "action-1.get_ip"
+        wrong_secret = await table.authenticate("path-1", "secret-2")
+        assert wrong_secret.status == "Unauthorized"
+        # Unknown paths are rejected without calling the API
+        assert await table.authenticate("unknown", "secret") is None
+        assert list_route.call_count == 1
+        assert auth_route.call_count == unknown_route.call_count == 0
+
+        # After an invalidation, missing paths are authenticated by the API
+        # until the table is reloaded in the background
+        list_route.mock(return_value=Response(200, json=[route(1), route(2)]))
+        table.invalidate_workflow("wf")
+        assert len(table) == 0
+        response = await table.authenticate("path-2", "secret-2")
+        assert response.status == "Authorized"
+        assert auth_route.call_count == 1
+        await table._background_task
+        assert list_route.call_count == 2
+        assert table.up_to_date
+        assert len(table) == 2
+
+        # Expired tables are reloaded in the background, serving the old table
+        table._expires_at = 0
+        response = await table.authenticate("path-1", "secret-1")
+        assert response.status == "Authorized"
+        await table._background_task
+        assert list_route.call_count == 3
+
+        # Paths unknown to the API are remembered
+        list_route.mock(return_value=Response(503))
+        table.invalidate_workflow("wf")
+        for _ in range(2):
+            assert await table.authenticate("unknown", "secret") is None
+        await table._background_task
+        assert not table.up_to_date
+        assert await table.authenticate("unknown", "secret") is None
+        assert unknown_route.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_event_indexer_commits_batches():
+    indexer = EventIndexer(
+        batch_size=2, commit_interval=60, queue_size=10, retention_days=30
+    )
+    await indexer.start()
+    workflow_run_id = uuid4().hex
+    # Opening today's partition drops expired partitions
+    await indexer.put(tantivy.Document(published_at=datetime(2000, 1, 1)))
+    for i in range(3):
+        await indexer.put(
+            tantivy.Document(
+                action_run_id=f"ar-{i}",
+                workflow_run_id=workflow_run_id,
+                published_at=datetime.now(UTC).replace(tzinfo=None),
+            )
+        )
+    # The remaining document of the last batch is committed on stop
+    await indexer.stop()
+
+    assert date(2000, 1, 1) not in list_events_partitions()
+    index = create_events_index(datetime.now(UTC).date())
+    index.reload()
+    query = index.parse_query(workflow_run_id, ["workflow_run_id"])
+    assert index.searcher().search(query, limit=10).count == 3
+
+
+@pytest.mark.asyncio
+async def test_storage_executor_applies_backpressure():
+    executor = StorageExecutor(name="storage", max_workers=1, max_pending=1)
+    release = threading.Event()
+    first = asyncio.create_task(executor.run(release.wait, 5))
+    second = asyncio.create_task(executor.run(lambda: "done"))
+    await asyncio.sleep(0.1)
+
+    # The second call waits for the first one to leave the pool
+    assert executor.metrics() == {
+        "storage_active": 1,
+        "storage_queued": 0,
+        "storage_waiting": 1,
+    }
+    release.set()
+    assert await asyncio.wait_for(second, timeout=5) == "done"
+    assert await first
+    executor.shutdown()
@@ -1,26 +1,9 @@
 import os
-import re
-from functools import partial
 
 import pytest
-import respx
 from cryptography.fernet import Fernet
-from fastapi.testclient import TestClient
-from httpx import Response
 
-from tracecat.config import TRACECAT__API_URL
-from tracecat.db import Secret
-from tracecat.runner.app import app
-from tracecat.runner.templates import (
-    JSONPATH_TEMPLATE_PATTERN,
-    SECRET_TEMPLATE_PATTERN,
-    _evaluate_jsonpath_str,
-    _evaluate_secret_str,
-    evaluate_templated_fields,
-    evaluate_templated_secrets,
-)
-
-client = TestClient(app)
+from tracecat.runner.templates import TemplatePlan, compile_template
 
 
 @pytest.fixture(autouse=True)
@@ -41,33 +24,20 @@ def setup_enrionment():
     yield
 
 
-@pytest.mark.asyncio
-async def test_evaluate_secret_string():
-    mock_secret_manager = {
+def test_evaluate_secret_string():
+    secrets = {
         "TEST_API_KEY_1": "not_so_secret",
         "ANOTHER_SECRET": "not_a_secret",
     }
-
-    async def mock_secret_getter(secret_name: str):
-        return mock_secret_manager[secret_name]
-
-    mock_templated_string = (
+    template = compile_template(
         "This is a {{ SECRETS.TEST_API_KEY_1 }} secret {{ SECRETS.ANOTHER_SECRET }}"
     )
+    assert template.secret_names == {"TEST_API_KEY_1", "ANOTHER_SECRET"}
     expected = "This is a not_so_secret secret not_a_secret"
-    actual = await _evaluate_secret_str(
-        mock_templated_string,
-        template_pattern=SECRET_TEMPLATE_PATTERN,
-        secret_getter=mock_secret_getter,
-    )
-    assert actual == expected
+    assert template.evaluate({}, secrets) == expected
 
 
-@pytest.mark.asyncio
-async def test_evaluate_templated_secret():
-    # Health check
-    client.get("/")
-
+def test_evaluate_templated_secret():
     TEST_SECRETS = {
         "TEST_API_KEY_1": "1234567890",
         "test_api_key_2": "asdfghjkl",
@@ -116,123 +86,69 @@ async def test_evaluate_templated_secret():
         ],
     }
 
-    base_secrets_url = f"{TRACECAT__API_URL}/secrets"
-    with respx.mock:
-        # Mock workflow getter from API side
-        for secret_name, secret_value in TEST_SECRETS.items():
-            secret = Secret(
-                name=secret_name,
-                owner_id="test_user_id",
-            )
-            secret.key = secret_value  # Encrypt the secret
-
-            # Mock hitting get secrets endpoint
-            print(secret)
-            respx.get(f"{base_secrets_url}/{secret_name}").mock(
-                return_value=Response(
-                    200,
-                    json=secret.model_dump(mode="json"),
-                )
-            )
-
-        # Start test
-        actual = await evaluate_templated_secrets(
-            templated_fields=mock_templated_kwargs
-        )
+    plan = TemplatePlan(mock_templated_kwargs)
+    assert plan.secret_names == set(TEST_SECRETS)
+    actual = plan.evaluate(source_data={}, secrets=TEST_SECRETS)
     assert actual == exptected
 
 
-def test_evaluate_jsonpath_str_raises_exception():
-    matcher = partial(re.match, JSONPATH_TEMPLATE_PATTERN)
-    json_data = {
-        "question_generation": {
-            "questions": [
-                "What is the capital of France?",
-                "What is the capital of Germany?",
-            ],
+JSON_DATA = {
+    "question_generation": {
+        "questions": [
+            "What is the capital of France?",
+            "What is the capital of Germany?",
+        ],
+    },
+    "receive_sentry_event": {
+        "event_id": "123",
+    },
+    "list_nested": [
+        {
+            "a": "1",
+            "b": "2",
         },
-        "receive_sentry_event": {
-            "event_id": "123",
+        {
+            "a": "3",
+            "b": "4",
         },
-        "list_nested": [
-            {
-                "a": "1",
-                "b": "2",
-            },
-            {
-                "a": "3",
-                "b": "4",
-            },
-        ],
-        "list_nested_different_types": [
-            {
-                "a": 1,
-                "b": 2,
-            },
-            {
-                "a": "3",
-                "b": "4",
-            },
-        ],
-    }
+    ],
+    "list_nested_different_types": [
+        {
+            "a": 1,
+            "b": 2,
+        },
+        {
+            "a": "3",
+            "b": "4",
+        },
+    ],
+}
+
+
+def test_evaluate_jsonpath_str_raises_exception():
     with pytest.raises(ValueError):
         # Invalid jsonpath
-        match = matcher("{{ .bad_jsonpath }}")
-        _evaluate_jsonpath_str(match, json_data)
+        compile_template("{{ .bad_jsonpath }}").evaluate(JSON_DATA, {})
 
 
 def test_evaluate_jsonpath_str():
-    matcher = partial(re.match, JSONPATH_TEMPLATE_PATTERN)
-    json_data = {
-        "question_generation": {
-            "questions": [
-                "What is the capital of France?",
-                "What is the capital of Germany?",
-            ],
-        },
-        "receive_sentry_event": {
-            "event_id": "123",
-        },
-        "list_nested": [
-            {
-                "a": "1",
-                "b": "2",
-            },
-            {
-                "a": "3",
-                "b": "4",
-            },
-        ],
-        "list_nested_different_types": [
-            {
-                "a": 1,
-                "b": 2,
-            },
-            {
-                "a": "3",
-                "b": "4",
-            },
-        ],
-    }
-    match = matcher("{{ $.question_generation.questions[0] }}")
+    def evaluate(template: str) -> str:
+        return compile_template(template).evaluate(JSON_DATA, {})
+
     expected = "What is the capital of France?"
-    assert _evaluate_jsonpath_str(match, json_data) == expected
+    assert evaluate("{{ $.question_generation.questions[0] }}") == expected
 
-    match = matcher("{{ $.receive_sentry_event.event_id }}")
     expected = "123"
-    assert _evaluate_jsonpath_str(match, json_data) == expected
+    assert evaluate("{{ $.receive_sentry_event.event_id }}") == expected
 
-    match = matcher("{{ $.question_generation.questions }}")
-    expected = str(json_data["question_generation"]["questions"])
-    assert _evaluate_jsonpath_str(match, json_data) == expected
+    expected = str(JSON_DATA["question_generation"]["questions"])
+    assert evaluate("{{ $.question_generation.questions }}") == expected
 
-    match = matcher("{{ $.list_nested[*].a }}")
     expected = "['1', '3']"
-    assert _evaluate_jsonpath_str(match, json_data) == expected
+    assert evaluate("{{ $.list_nested[*].a }}") == expected
 
-    match = matcher("{{ $.list_nested_different_types[*].b }}")
     expected = "[2, '4']"
-    assert _evaluate_jsonpath_str(match, json_data) == expected
+    assert evaluate("{{ $.list_nested_different_types[*].b }}") == expected
 
 
 def test_evaluate_templated_fields_no_match():
@@ -250,10 +166,12 @@ def test_evaluate_templated_fields_no_match():
     expected_kwargs = {
         "title": "My ticket title",
     }
-    actual_kwargs = evaluate_templated_fields(
-        templated_fields=kwargs, source_data=json_data
-    )
+    plan = TemplatePlan(kwargs)
+    assert plan.secret_names == set()
+    actual_kwargs = plan.evaluate(source_data=json_data, secrets={})
     assert actual_kwargs == expected_kwargs
+    # The top level dict is always copied
+    assert actual_kwargs is not kwargs
 
 
 def test_evaluate_templated_fields():
@@ -300,30 +218,15 @@ def test_evaluate_templated_fields():
             ],
         },
     }
-    actual_kwargs = evaluate_templated_fields(
-        templated_fields=kwargs, source_data=json_data
-    )
+    actual_kwargs = TemplatePlan(kwargs).evaluate(source_data=json_data, secrets={})
     assert actual_kwargs == expected_kwargs
 
 
 def test_evaluate_templated_fields_matches_multiple_in_string():
-    json_data = {
-        "question_generation": {
-            "questions": [
-                "What is the capital of France?",
-                "What is the capital of Germany?",
-            ],
-        },
-        "receive_sentry_event": {
-            "event_id": "123",
-        },
-    }
     templated_string = "My questions {{ $.question_generation.questions[0] }}, my sentry event: {{ $.receive_sentry_event.event_id }}"
 
     exptected = "My questions What is the capital of France?, my sentry event: 123"
-    actual = JSONPATH_TEMPLATE_PATTERN.sub(
-        lambda m: _evaluate_jsonpath_str(m, json_data), templated_string
-    )
+    actual = compile_template(templated_string).evaluate(JSON_DATA, {})
     assert actual == exptected
 
 
@@ -359,29 +262,80 @@ def test_evaluate_templated_fields_matches_multiple_different_types():
             "details": "The event occurred at 1234567890",
         },
     }
-    actual = evaluate_templated_fields(
-        templated_fields=mock_templated_kwargs, source_data=mock_json_data
+    actual = TemplatePlan(mock_templated_kwargs).evaluate(
+        source_data=mock_json_data, secrets={}
     )
     assert actual == exptected
 
 
 def test_evaluate_templated_fields_raises_exception():
-    mock_json_data = {
-        "question_generation": {
-            "questions": [
-                "What is the capital of France?",
-                "What is the capital of Germany?",
-            ],
-        },
-        "receive_sentry_event": {
-            "event_id": "123",
-        },
-    }
     mock_templated_kwargs = {
         "questions": "My questions {{ $.nonexistent.field }}, my sentry event: {{ $.receive_sentry_event.event_id }}"
     }
 
     with pytest.raises(ValueError):
-        evaluate_templated_fields(
-            templated_fields=mock_templated_kwargs, source_data=mock_json_data
-        )
+        TemplatePlan(mock_templated_kwargs).evaluate(source_data=JSON_DATA, secrets={})
+
+
+def test_template_plan_evaluates_jsonpaths_and_secrets():
+    json_data = {
+        "receive_sentry_event": {"event_id": 123123},
+        "workspace": {"name": "Tracecat", "visibility": "public"},
+    }
+    kwargs = {
+        "url": "https://api.example.com/events/{{ $.receive_sentry_event.event_id }}",
+        "headers": {"Authorization": "Bearer {{ SECRETS.TEST_API_KEY_1 }}"},
+        "payload": {
+            "{{ $.workspace.visibility }}_workspaces": ["{{ $.workspace.name }}", 1],
+            "static": "No templates here",
+        },
+        "invalid": "{{ $.[ }}",
+    }
+    plan = TemplatePlan(kwargs)
+    assert plan.secret_names == {"TEST_API_KEY_1"}
+
+    # Invalid jsonpaths only fail at evaluation time
+    with pytest.raises(ValueError, match="Invalid jsonpath"):
+        plan.evaluate(source_data=json_data, secrets={"TEST_API_KEY_1": "xyz"})
+
+    kwargs.pop("invalid")
+    actual = TemplatePlan(kwargs).evaluate(
+        source_data=json_data, secrets={"TEST_API_KEY_1": "xyz"}
+    )
+    assert actual == {
+        "url": "https://api.example.com/events/123123",
+        "headers": {"Authorization": "Bearer xyz"},
+        "payload": {
+            "public_workspaces": ["Tracecat", 1],
+            "static": "No templates here",
+        },
+    }
+
+
+def test_template_plan_shares_untemplated_subtrees():
+    json_data = {"workspace": {"name": "Tracecat", "visibility": "public"}}
+    kwargs = {
+        "static": {"body": ["No templates", {"here": 1}]},
+        "nested": {
+            "static": {"body": "No templates"},
+            "templated": ["{{ $.workspace.name }}", {"here": 1}],
+            "{{ $.workspace.visibility }}": "workspace",
+        },
+    }
+    plan = TemplatePlan(kwargs)
+    actual = plan.evaluate(source_data=json_data, secrets={})
+    assert actual == {
+        "static": {"body": ["No templates", {"here": 1}]},
+        "nested": {
+            "static": {"body": "No templates"},
+            "templated": ["Tracecat", {"here": 1}],
+            "public": "workspace",
+        },
+    }
+    assert list(actual["nested"]) == ["static", "templated", "public"]
+    # Untemplated subtrees are shared, templated ones are copied
+    assert actual is not kwargs
+    assert actual["static"] is kwargs["static"]
+    assert actual["nested"]["static"] is kwargs["nested"]["static"]
+    assert actual["nested"]["templated"][1] is kwargs["nested"]["templated"][1]
+    assert kwargs["nested"]["templated"][0] == "{{ $.workspace.name }}"
@@ -1,18 +1,38 @@
+import asyncio
+import hmac
 import json
 from contextlib import asynccontextmanager
+from datetime import UTC, datetime
 from typing import Annotated, Any
 
+import orjson
 import polars as pl
-import tantivy
-from fastapi import Depends, FastAPI, HTTPException, status
+from fastapi import BackgroundTasks, Depends, FastAPI, HTTPException, Query, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.params import Body
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy import Engine, or_
 from sqlalchemy.exc import NoResultFound
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.orm import joinedload
 from sqlmodel import Session, select
-
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from tracecat.api.case_metrics import CaseMetricsCache, MetricsInterval
+from tracecat.api.cases import (
+    EXPORT_MEDIA_TYPES,
+    ExportFormat,
+    case_update_values,
+    export_cases,
+    list_cases_page,
+)
 from tracecat.api.completions import CategoryConstraint, stream_case_completions
+from tracecat.api.events import query_events
+from tracecat.api.workflows import (
+    WorkflowResponseCache,
+    serialize_workflow,
+    touch_workflow,
+)
 from tracecat.auth import (
     AuthenticatedRunnerClient,
     Role,
@@ -20,7 +40,15 @@ from tracecat.auth import (
     authenticate_user,
     authenticate_user_or_service,
 )
-from tracecat.config import TRACECAT__APP_ENV, TRACECAT__RUNNER_URL
+from tracecat.config import (
+    TRACECAT__API_WORKFLOW_CACHE_MAX_SIZE,
+    TRACECAT__APP_ENV,
+    TRACECAT__CASES_BUFFER_FLUSH_INTERVAL,
+    TRACECAT__CASES_BUFFER_MAX_ROWS,
+    TRACECAT__CASES_COMPACTION_INTERVAL,
+    TRACECAT__CASES_METRICS_CACHE_MAX_SIZE,
+    TRACECAT__RUNNER_URL,
+)
 from tracecat.db import (
     Action,
     ActionRun,
@@ -32,10 +60,11 @@ from tracecat.db import (
     Workflow,
     WorkflowRun,
     clone_workflow,
-    create_events_index,
-    create_vdb_conn,
+    create_async_db_engine,
+    get_vdb_table,
     initialize_db,
 )
+from tracecat.ingestion import CaseIngestionBuffer, run_periodic_compaction
 from tracecat.logger import standard_logger
 
 # TODO: Clean up API params / response "zoo"
@@ -45,6 +74,7 @@ from tracecat.types.api import (
     ActionResponse,
     ActionRunResponse,
     AuthenticateWebhookResponse,
+    BatchUpsertActionRunsParams,
     CaseActionParams,
     CaseContextParams,
     CaseParams,
@@ -68,6 +98,7 @@ from tracecat.types.api import (
     UpdateWorkflowParams,
     UpdateWorkflowRunParams,
     WebhookResponse,
+    WebhookRoute,
     WorkflowMetadataResponse,
     WorkflowResponse,
     WorkflowRunResponse,
@@ -78,13 +109,36 @@ logger = standard_logger("api")
 
 
 engine: Engine
+# Used by the hot M2M routes called by the runner, so that they don't occupy
+# the threadpool that sync routes run in
+async_engine: AsyncEngine
+
+# Cases created through the API are appended to the cases table in batches
+case_buffer = CaseIngestionBuffer(
+    max_rows=TRACECAT__CASES_BUFFER_MAX_ROWS,
+    flush_interval=TRACECAT__CASES_BUFFER_FLUSH_INTERVAL,
+)
+workflow_response_cache = WorkflowResponseCache(
+    max_size=TRACECAT__API_WORKFLOW_CACHE_MAX_SIZE
+)
+case_metrics_cache = CaseMetricsCache(max_size=TRACECAT__CASES_METRICS_CACHE_MAX_SIZE)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global engine
+    global engine, async_engine
     engine = initialize_db()
-    yield
+    async_engine = create_async_db_engine()
+    await case_buffer.start()
+    compaction = asyncio.create_task(
+        run_periodic_compaction(TRACECAT__CASES_COMPACTION_INTERVAL)
+    )
+    try:
+        yield
+    finally:
+        compaction.cancel()
+        await case_buffer.stop()
+        await async_engine.dispose()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -108,6 +162,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 
@@ -121,6 +176,20 @@ def check_health() -> dict[str, str]:
     return {"message": "Hello world. I am the API. This is the health endpoint."}
 
 
+async def invalidate_runner_workflow(role: Role, workflow_id: str) -> None:
+    """Tell the runner to drop its cached copy of a workflow.
+
+    This is best effort: the runner's cache also expires on its own.
+    """
+    service_role = Role(type="service", user_id=role.user_id, service_id="tracecat-api")
+    try:
+        async with AuthenticatedRunnerClient(role=service_role) as client:
+            response = await client.post(f"/workflows/{workflow_id}/invalidate")
+            response.raise_for_status()
+    except Exception as e:
+        logger.warning(f"Failed to invalidate workflow {workflow_id!r} in runner: {e}")
+
+
 ### Workflows
 
 
@@ -173,58 +242,41 @@ def create_workflow(
     )
 
 
-@app.get("/workflows/{workflow_id}")
+@app.get("/workflows/{workflow_id}", response_model=WorkflowResponse)
 def get_workflow(
     role: Annotated[Role, Depends(authenticate_user_or_service)],
     workflow_id: str,
-) -> WorkflowResponse:
+) -> Response:
     """Return Workflow as title, description, list of Action JSONs, adjacency list of Action IDs."""
     with Session(engine) as session:
-        # Get Workflow given workflow_id
-        statement = select(Workflow).where(
+        statement = select(Workflow.updated_at).where(
             Workflow.owner_id == role.user_id,
             Workflow.id == workflow_id,
         )
-        result = session.exec(statement)
-        try:
-            workflow = result.one()
-        except NoResultFound as e:
+        updated_at = session.exec(statement).one_or_none()
+        if updated_at is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="Resource not found"
-            ) from e
-
-        # List all Actions related to `workflow_id`
-        statement = select(Action).where(Action.workflow_id == workflow_id)
-        results = session.exec(statement)
-        actions = results.all()
-
-        object = None
-        if workflow.object is not None:
-            # Process react flow object into adjacency list
-            object = json.loads(workflow.object)
-
-    actions_responses = {
-        action.id: ActionResponse(
-            id=action.id,
-            type=action.type,
-            title=action.title,
-            description=action.description,
-            status=action.status,
-            inputs=json.loads(action.inputs) if action.inputs else None,
-            key=action.key,
-        )
-        for action in actions
-    }
-    workflow_response = WorkflowResponse(
-        id=workflow.id,
-        title=workflow.title,
-        description=workflow.description,
-        status=workflow.status,
-        actions=actions_responses,
-        object=object,
-        owner_id=workflow.owner_id,
-    )
-    return workflow_response
+            )
+        content = workflow_response_cache.get(role.user_id, workflow_id, updated_at)
+        if content is None:
+            # Load the workflow and its actions in a single query
+            statement = (
+                select(Workflow)
+                .where(Workflow.owner_id == role.user_id, Workflow.id == workflow_id)
+                .options(joinedload(Workflow.actions))
+            )
+            try:
+                workflow = session.exec(statement).unique().one()
+            except NoResultFound as e:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND, detail="Resource not found"
+                ) from e
+            content = serialize_workflow(workflow)
+            workflow_response_cache.set(
+                role.user_id, workflow_id, workflow.updated_at, content
+            )
+    return Response(content=content, media_type="application/json")
 
 
 @app.post("/workflows/{workflow_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -232,6 +284,7 @@ def update_workflow(
     role: Annotated[Role, Depends(authenticate_user)],
     workflow_id: str,
     params: UpdateWorkflowParams,
+    background_tasks: BackgroundTasks,
 ) -> None:
     """Update Workflow."""
 
@@ -256,15 +309,19 @@ def update_workflow(
             workflow.status = params.status
         if params.object is not None:
             workflow.object = params.object
+        workflow.updated_at = datetime.now(UTC).replace(tzinfo=None)
 
         session.add(workflow)
         session.commit()
 
+    background_tasks.add_task(invalidate_runner_workflow, role, workflow_id)
+
 
 @app.delete("/workflows/{workflow_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_workflow(
     role: Annotated[Role, Depends(authenticate_user)],
     workflow_id: str,
+    background_tasks: BackgroundTasks,
 ) -> None:
     """Delete Workflow."""
 
@@ -283,6 +340,8 @@ def delete_workflow(
         session.delete(workflow)
         session.commit()
 
+    background_tasks.add_task(invalidate_runner_workflow, role, workflow_id)
+
 
 @app.post("/workflows/{workflow_id}/copy", status_code=status.HTTP_204_NO_CONTENT)
 def copy_workflow(
@@ -329,7 +388,7 @@ def list_workflow_runs(
     workflow_id: str,
     limit: int = 20,
 ) -> list[WorkflowRunResponse]:
-    """List all Workflow Runs for a Workflow."""
+    """List the most recent Workflow Runs of a Workflow."""
     with Session(engine) as session:
         # Being here means the user has access to the workflow
         statement = (
@@ -338,6 +397,7 @@ def list_workflow_runs(
                 WorkflowRun.owner_id == role.user_id,
                 WorkflowRun.workflow_id == workflow_id,
             )
+            .order_by(WorkflowRun.created_at.desc())
             .limit(limit)
         )
         results = session.exec(statement)
@@ -396,7 +456,7 @@ def get_workflow_run(
     "/workflows/{workflow_id}/runs/{workflow_run_id}",
     status_code=status.HTTP_204_NO_CONTENT,
 )
-def update_workflow_run(
+async def update_workflow_run(
     role: Annotated[Role, Depends(authenticate_service)],  # M2M
     workflow_id: str,
     workflow_run_id: str,
@@ -404,13 +464,13 @@ def update_workflow_run(
 ) -> None:
     """Update Workflow."""
 
-    with Session(engine) as session:
+    async with AsyncSession(async_engine) as session:
         statement = select(WorkflowRun).where(
             WorkflowRun.owner_id == role.user_id,
             WorkflowRun.id == workflow_run_id,
             WorkflowRun.workflow_id == workflow_id,
         )
-        result = session.exec(statement)
+        result = await session.exec(statement)
         try:
             workflow_run = result.one()
         except NoResultFound as e:
@@ -422,7 +482,7 @@ def update_workflow_run(
             workflow_run.status = params.status
 
         session.add(workflow_run)
-        session.commit()
+        await session.commit()
 
 
 @app.post("/workflows/{workflow_id}/trigger")
@@ -491,6 +551,7 @@ def list_actions(
 def create_action(
     role: Annotated[Role, Depends(authenticate_user)],
     params: CreateActionParams,
+    background_tasks: BackgroundTasks,
 ) -> ActionMetadataResponse:
     with Session(engine) as session:
         action = Action(
@@ -501,6 +562,7 @@ def create_action(
             description="",  # Default to empty string
         )
         session.add(action)
+        touch_workflow(session, params.workflow_id)
         session.commit()
         session.refresh(action)
 
@@ -510,7 +572,9 @@ def create_action(
                 params=CreateWebhookParams(
                     action_id=action.id, workflow_id=params.workflow_id
                 ),
+                background_tasks=background_tasks,
             )
+    background_tasks.add_task(invalidate_runner_workflow, role, params.workflow_id)
     action_metadata = ActionMetadataResponse(
         id=action.id,
         workflow_id=params.workflow_id,
@@ -568,6 +632,7 @@ def update_action(
     role: Annotated[Role, Depends(authenticate_user)],
     action_id: str,
     params: UpdateActionParams,
+    background_tasks: BackgroundTasks,
 ) -> ActionResponse:
     with Session(engine) as session:
         # Fetch the action by id
@@ -593,9 +658,11 @@ def update_action(
             action.inputs = params.inputs
 
         session.add(action)
+        touch_workflow(session, action.workflow_id)
         session.commit()
         session.refresh(action)
 
+    background_tasks.add_task(invalidate_runner_workflow, role, action.workflow_id)
     return ActionResponse(
         id=action.id,
         type=action.type,
@@ -611,6 +678,7 @@ def update_action(
 def delete_action(
     role: Annotated[Role, Depends(authenticate_user)],
     action_id: str,
+    background_tasks: BackgroundTasks,
 ) -> None:
     with Session(engine) as session:
         statement = select(Action).where(
@@ -625,9 +693,13 @@ def delete_action(
                 status_code=status.HTTP_404_NOT_FOUND, detail="Resource not found"
             ) from e
         # If the user doesn't own this workflow, they can't delete the action
+        workflow_id = action.workflow_id
         session.delete(action)
+        touch_workflow(session, workflow_id)
         session.commit()
 
+    background_tasks.add_task(invalidate_runner_workflow, role, workflow_id)
+
 
 ### Action Runs
 
@@ -638,7 +710,7 @@ def list_action_runs(
     action_id: str,
     limit: int = 20,
 ) -> list[ActionRunResponse]:
-    """List all action Runs for an action."""
+    """List the most recent action Runs of an action."""
     with Session(engine) as session:
         # Being here means the user has access to the action
         statement = (
@@ -647,6 +719,7 @@ def list_action_runs(
                 ActionRun.owner_id == role.user_id,
                 ActionRun.action_id == action_id,
             )
+            .order_by(ActionRun.created_at.desc())
             .limit(limit)
         )
         results = session.exec(statement)
@@ -659,7 +732,7 @@ def list_action_runs(
 
 
 @app.post("/actions/{action_id}/runs", status_code=status.HTTP_201_CREATED)
-def create_action_run(
+async def create_action_run(
     role: Annotated[Role, Depends(authenticate_service)],  # M2M
     action_id: str,
     params: CreateActionRunParams,
@@ -672,10 +745,10 @@ def create_action_run(
         id=params.action_run_id,
         workflow_run_id=params.workflow_run_id,
     )
-    with Session(engine) as session:
+    async with AsyncSession(async_engine) as session:
         session.add(action_run)
-        session.commit()
-        session.refresh(action_run)
+        await session.commit()
+        await session.refresh(action_run)
 
     return ActionRunResponse(**action_run.model_dump())
 
@@ -710,7 +783,7 @@ def get_action_run(
     "/actions/{action_id}/runs/{action_run_id}",
     status_code=status.HTTP_204_NO_CONTENT,
 )
-def update_action_run(
+async def update_action_run(
     role: Annotated[Role, Depends(authenticate_service)],  # M2M
     action_id: str,
     action_run_id: str,
@@ -718,13 +791,13 @@ def update_action_run(
 ) -> None:
     """Update action."""
 
-    with Session(engine) as session:
+    async with AsyncSession(async_engine) as session:
         statement = select(ActionRun).where(
             ActionRun.owner_id == role.user_id,
             ActionRun.id == action_run_id,
             ActionRun.action_id == action_id,
         )
-        result = session.exec(statement)
+        result = await session.exec(statement)
         try:
             action_run = result.one()
         except NoResultFound as e:
@@ -736,7 +809,41 @@ def update_action_run(
             action_run.status = params.status
 
         session.add(action_run)
-        session.commit()
+        await session.commit()
+
+
+@app.post("/runs/batch", status_code=status.HTTP_204_NO_CONTENT)
+async def batch_upsert_action_runs(
+    role: Annotated[Role, Depends(authenticate_service)],  # M2M
+    params: BatchUpsertActionRunsParams,
+) -> None:
+    """Create or update the status of many action runs in one transaction.
+
+    The runner reports action run status changes in batches. Action runs that
+    don't exist yet are created with the reported status.
+    """
+
+    if not params.action_runs:
+        return
+    async with AsyncSession(async_engine) as session:
+        statement = select(ActionRun).where(
+            ActionRun.owner_id == role.user_id,
+            ActionRun.id.in_([p.action_run_id for p in params.action_runs]),
+        )
+        result = await session.exec(statement)
+        existing = {action_run.id: action_run for action_run in result}
+        for p in params.action_runs:
+            action_run = existing.get(p.action_run_id)
+            if action_run is None:
+                action_run = ActionRun(
+                    owner_id=role.user_id,
+                    action_id=p.action_id,
+                    id=p.action_run_id,
+                    workflow_run_id=p.workflow_run_id,
+                )
+            action_run.status = p.status
+            session.add(action_run)
+        await session.commit()
 
 
 ### Webhooks
@@ -772,6 +879,7 @@ def list_webhooks(
 def create_webhook(
     role: Annotated[Role, Depends(authenticate_user)],
     params: CreateWebhookParams,
+    background_tasks: BackgroundTasks,
 ) -> WebhookResponse:
     """Create a new Webhook."""
     webhook = Webhook(
@@ -784,6 +892,9 @@ def create_webhook(
         session.commit()
         session.refresh(webhook)
 
+    # Tells the runner's routing table about the new webhook
+    background_tasks.add_task(invalidate_runner_workflow, role, params.workflow_id)
+
     return WebhookResponse(
         id=webhook.id,
         action_id=webhook.action_id,
@@ -824,6 +935,7 @@ def get_webhook(
 def delete_webhook(
     role: Annotated[Role, Depends(authenticate_user)],
     webhook_id: str,
+    background_tasks: BackgroundTasks,
 ) -> None:
     """Delete a Webhook by ID."""
     with Session(engine) as session:
@@ -833,9 +945,13 @@ def delete_webhook(
         )
         result = session.exec(statement)
         webhook = result.one()
+        workflow_id = webhook.workflow_id
         session.delete(webhook)
         session.commit()
 
+    # Also drops the workflow's webhook routes from the runner's routing table
+    background_tasks.add_task(invalidate_runner_workflow, role, workflow_id)
+
 
 @app.get("/webhooks/search")
 def search_webhooks(
@@ -867,36 +983,51 @@ def search_webhooks(
     return webhook_response
 
 
+@app.get("/authenticate/webhooks")
+async def list_webhook_routes(
+    _role: Annotated[Role, Depends(authenticate_service)],  # M2M
+) -> list[WebhookRoute]:
+    """List the routes of all webhooks. Used by the runner to warm its routing table."""
+    async with AsyncSession(async_engine) as session:
+        statement = select(Webhook, Action).join(Action, Action.id == Webhook.action_id)
+        result = await session.exec(statement)
+        return [
+            WebhookRoute(
+                path=webhook.id,
+                secret=webhook.secret,
+                owner_id=action.owner_id,
+                action_id=action.id,
+                action_key=action.key,
+                workflow_id=webhook.workflow_id,
+            )
+            for webhook, action in result.all()
+        ]
+
+
 @app.post("/authenticate/webhooks/{webhook_id}/{secret}")
-def authenticate_webhook(
+async def authenticate_webhook(
     # TODO: Add user id to Role
     _role: Annotated[Role, Depends(authenticate_service)],  # M2M
     webhook_id: str,
     secret: str,
 ) -> AuthenticateWebhookResponse:
-    with Session(engine) as session:
-        statement = select(Webhook).where(Webhook.id == webhook_id)
-        result = session.exec(statement)
+    async with AsyncSession(async_engine) as session:
+        statement = (
+            select(Webhook, Action)
+            .join(Action, Action.id == Webhook.action_id)
+            .where(Webhook.id == webhook_id)
+        )
+        result = await session.exec(statement)
         try:
-            webhook = result.one()
+            webhook, action = result.one()
         except NoResultFound as e:
             logger.error("Webhook does not exist: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="Resource not found"
             ) from e
-        if webhook.secret != secret:
-            logger.error("Secret doesn't match")
-            return AuthenticateWebhookResponse(status="Unauthorized")
-        # Get slug
-        statement = select(Action).where(Action.id == webhook.action_id)
-        result = session.exec(statement)
-        try:
-            action = result.one()
-        except Exception as e:
-            logger.error("Action does not exist: %s", e)
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="Resource not found"
-            ) from e
+    if not hmac.compare_digest(webhook.secret, secret):
+        logger.error("Secret doesn't match")
+        return AuthenticateWebhookResponse(status="Unauthorized")
     return AuthenticateWebhookResponse(
         status="Authorized",
         owner_id=action.owner_id,
@@ -929,9 +1060,8 @@ def search_events(
 ) -> list[Event]:
     """Search for events based on query parameters.
 
-    Note: currently on supports filter by `workflow_id` and sort by `published_at`.
+    Note: `group_by` and `agg` are not supported yet.
     """
-    # TODO: Change this to use tantivy filtered query
     with Session(engine) as session:
         statement = select(Workflow.owner_id).where(Workflow.id == params.workflow_id)
         workflow_owner_id = session.exec(statement).one_or_none()
@@ -939,55 +1069,118 @@ def search_events(
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden"
             )
-    index = create_events_index()
-    index.reload()
-    query = index.parse_query(params.workflow_id, ["workflow_id"])
-    searcher = index.searcher()
-    searcher.search(
-        query, order_by_field=tantivy.field(params.order_by), limit=params.limit
-    )
+    try:
+        return query_events(params)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)
+        ) from e
 
 
 ### Case Management
 
 
 @app.post("/workflows/{workflow_id}/cases", status_code=status.HTTP_201_CREATED)
-def create_case(
+async def create_case(
     role: Annotated[Role, Depends(authenticate_service)],  # M2M
     workflow_id: str,
     cases: list[CaseParams],
 ):
-    db = create_vdb_conn()
-    tbl = db.open_table("cases")
     # Should probably also add a check for existing case IDs
     new_cases = [
         Case(**c.model_dump(), owner_id=role.user_id, workflow_id=workflow_id)
         for c in cases
     ]
-    tbl.add([case.flatten() for case in new_cases])
+    await case_buffer.add(new_cases)
 
 
 @app.get("/workflows/{workflow_id}/cases")
 def list_cases(
     role: Annotated[Role, Depends(authenticate_user)],
     workflow_id: str,
-    limit: int = 100,
-) -> list[Case]:
-    """List all cases under a workflow.
-
-    Note: currently only supports listing the first 100 cases.
+    limit: Annotated[int, Query(ge=1, le=1000)] = 100,
+    cursor: str | None = None,
+    fields: Annotated[list[str] | None, Query()] = None,
+) -> Response:
+    """List a page of cases under a workflow, oldest first.
+
+    Pass the `X-Next-Cursor` response header as `cursor` to get the next page.
+    The header is absent on the last page. Use `fields` to only return some of
+    the cases' fields.
     """
-    db = create_vdb_conn()
-    tbl = db.open_table("cases")
-    result = (
-        tbl.search()
-        .where(f"(owner_id = {role.user_id!r}) AND (workflow_id = {workflow_id!r})")
-        .select(list(Case.model_fields.keys()))
-        .limit(limit)
-        .to_polars()
-        .to_dicts()
+    ds = get_vdb_table("cases").to_lance()
+    try:
+        cases, next_cursor = list_cases_page(
+            ds,
+            owner_id=role.user_id,
+            workflow_id=workflow_id,
+            limit=limit,
+            cursor=cursor,
+            fields=fields,
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)
+        ) from e
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return Response(
+        content=orjson.dumps(cases, option=orjson.OPT_UTC_Z),
+        media_type="application/json",
+        headers=headers,
+    )
+
+
+# NOTE: Declared before `/workflows/{workflow_id}/cases/{case_id}`, which
+# would otherwise match it
+@app.get("/workflows/{workflow_id}/cases/metrics")
+def get_case_metrics(
+    role: Annotated[Role, Depends(authenticate_user)],
+    workflow_id: str,
+    interval: MetricsInterval = "1d",
+    start: datetime | None = None,
+    end: datetime | None = None,
+) -> CaseMetrics:
+    """Get summary statistics of the cases under a workflow created in [start, end)."""
+    ds = get_vdb_table("cases").to_lance()
+    return case_metrics_cache.get(
+        ds,
+        owner_id=role.user_id,
+        workflow_id=workflow_id,
+        interval=interval,
+        start=start,
+        end=end,
+    )
+
+
+# NOTE: Declared before `/workflows/{workflow_id}/cases/{case_id}`, which
+# would otherwise match it
+@app.get("/workflows/{workflow_id}/cases/export")
+def export_workflow_cases(
+    role: Annotated[Role, Depends(authenticate_user)],
+    workflow_id: str,
+    format: ExportFormat = "arrow",
+    fields: Annotated[list[str] | None, Query()] = None,
+) -> StreamingResponse:
+    """Stream all cases under a workflow as an Arrow IPC stream or a Parquet file."""
+    ds = get_vdb_table("cases").to_lance()
+    try:
+        content = export_cases(
+            ds,
+            owner_id=role.user_id,
+            workflow_id=workflow_id,
+            format=format,
+            fields=fields,
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)
+        ) from e
+    filename = f"cases-{workflow_id}.{format}"
+    return StreamingResponse(
+        content,
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
     )
-    return [Case.from_flattened(c) for c in result]
 
 
 @app.get("/workflows/{workflow_id}/cases/{case_id}")
@@ -997,8 +1190,7 @@ def get_case(
     case_id: str,
 ) -> Case:
     """Get a specific case by ID under a workflow."""
-    db = create_vdb_conn()
-    tbl = db.open_table("cases")
+    tbl = get_vdb_table("cases")
     result = (
         tbl.search()
         .where(
@@ -1020,35 +1212,16 @@ def update_case(
     params: CaseParams,
 ):
     """Update a specific case by ID under a workflow."""
-    updated_case = Case.from_params(params, owner_id=role.user_id, id=case_id)
-    db = create_vdb_conn()
-    tbl = db.open_table("cases")
+    updated_case = Case.from_params(
+        params, owner_id=role.user_id, workflow_id=workflow_id, id=case_id
+    )
+    tbl = get_vdb_table("cases")
     tbl.update(
         where=f"(owner_id = {role.user_id!r}) AND (workflow_id = {workflow_id!r}) AND (id = {case_id!r})",
-        values=updated_case.flatten(),
+        values=case_update_values(updated_case),
     )
 
 
-@app.get("/workflows/{workflow_id}/cases/{case_id}/metrics")
-def get_case_metrics(
-    role: Annotated[Role, Depends(authenticate_user)],
-    workflow_id: str,
-    case_id: str,
-) -> CaseMetrics:
-    """Get a specific case by ID under a workflow."""
-    db = create_vdb_conn()
-    tbl = db.open_table("cases")
-    df = pl.DataFrame(
-        tbl.search()
-        .where(
-            f"(owner_id = {role.user_id!r}) AND (workflow_id = {workflow_id!r}) AND (id = {case_id!r})"
-        )
-        .select(list(Case.model_fields.keys()))
-        .to_arrow()
-    ).to_dicts()
-    return df
-
-
 ### Available Case Actions
 
 
@@ -1324,7 +1497,7 @@ def list_secrets(
 
 
 @app.get("/secrets/{secret_name}")
-def get_secret(
+async def get_secret(
     role: Annotated[Role, Depends(authenticate_user_or_service)],
     secret_name: str,
 ) -> Secret:
@@ -1333,14 +1506,14 @@ def get_secret(
     Support access for both user and service roles."""
 
     logger.info(f"Role: {role}")
-    with Session(engine) as session:
+    async with AsyncSession(async_engine) as session:
         # Check if secret exists
         statement = (
             select(Secret)
             .where(Secret.owner_id == role.user_id, Secret.name == secret_name)
             .limit(1)
         )
-        result = session.exec(statement)
+        result = await session.exec(statement)
         secret = result.one_or_none()
         if secret is None:
             raise HTTPException(
@@ -1403,15 +1576,15 @@ def update_secret(
 
 @app.post("/secrets/search")
 def search_secrets(
-    role: Annotated[Role, Depends(authenticate_user)],
+    role: Annotated[Role, Depends(authenticate_user_or_service)],
     params: SearchSecretsParams,
 ) -> list[Secret]:
-    """Get a secret by ID."""
+    """Get secrets by name.
+
+    Support access for both user and service roles."""
     with Session(engine) as session:
-        statement = (
-            select(Secret)
-            .where(Secret.owner_id == role.user_id)
-            .filter(*[Secret.name == name for name in params.names])
+        statement = select(Secret).where(
+            Secret.owner_id == role.user_id, Secret.name.in_(params.names)
         )
         result = session.exec(statement)
         secrets = result.all()
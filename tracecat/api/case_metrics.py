@@ -0,0 +1,131 @@
+"""Summary statistics of a workflow's cases.
+
+Design
+------
+- Metrics are computed with a single lazy polars query over the cases table.
+  The owner, workflow and time range filters and the column projection are
+  pushed down into the Lance scan, so only the 4 columns needed are read, and
+  only for the matching cases.
+- The query counts cases per time bucket, status, priority and malice. The
+  totals per status, priority and malice are derived from these counts.
+- Results are cached per query, together with the version of the cases table
+  they were computed from. Every write to the cases table creates a new
+  version, so any case write invalidates the cached metrics, including writes
+  made by other processes such as the runner.
+- The cache holds at most `max_size` entries, evicting the least recently used.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from datetime import UTC, datetime
+from typing import Literal
+
+import lance
+import polars as pl
+
+from tracecat.types.cases import CaseMetrics
+
+# Width of the time buckets, in polars duration syntax
+MetricsInterval = Literal["1h", "1d", "1w", "1mo"]
+
+_DIMENSIONS = ("status", "priority", "malice")
+
+# (Owner ID, workflow ID, interval, start, end)
+_CacheKey = tuple[str, str, str, datetime | None, datetime | None]
+
+
+def compute_case_metrics(
+    ds: lance.LanceDataset,
+    *,
+    owner_id: str,
+    workflow_id: str,
+    interval: MetricsInterval = "1d",
+    start: datetime | None = None,
+    end: datetime | None = None,
+) -> CaseMetrics:
+    """Count a workflow's cases created in [start, end) by time bucket and state."""
+    predicate = (pl.col("owner_id") == owner_id) & (
+        pl.col("workflow_id") == workflow_id
+    )
+    if start is not None:
+        predicate &= pl.col("created_at") >= _as_utc(start)
+    if end is not None:
+        predicate &= pl.col("created_at") < _as_utc(end)
+
+    counts = (
+        pl.scan_pyarrow_dataset(ds)
+        .filter(predicate)
+        .group_by(
+            pl.col("created_at").dt.truncate(interval).alias("bucket"), *_DIMENSIONS
+        )
+        .agg(pl.len().alias("count"))
+        .sort("bucket", *_DIMENSIONS)
+        .collect()
+    )
+    totals = {
+        dimension: counts.group_by(dimension)
+        .agg(pl.col("count").sum())
+        .sort(dimension)
+        .to_dicts()
+        for dimension in _DIMENSIONS
+    }
+    return CaseMetrics(
+        statues=totals["status"],
+        priority=totals["priority"],
+        malice=totals["malice"],
+        interval=interval,
+        timeseries=counts.to_dicts(),
+    )
+
+
+def _as_utc(dt: datetime) -> datetime:
+    # Naive datetimes are taken to be in UTC, like the timestamps of cases
+    return dt if dt.tzinfo is not None else dt.replace(tzinfo=UTC)
+
+
+class CaseMetricsCache:
+    """Caches case metrics by query and cases table version."""
+
+    def __init__(self, *, max_size: int) -> None:
+        self.max_size = max_size
+        self._entries: OrderedDict[_CacheKey, tuple[int, CaseMetrics]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(
+        self,
+        ds: lance.LanceDataset,
+        *,
+        owner_id: str,
+        workflow_id: str,
+        interval: MetricsInterval = "1d",
+        start: datetime | None = None,
+        end: datetime | None = None,
+    ) -> CaseMetrics:
+        """Return the metrics of `ds`, computing them if they aren't cached."""
+        key = (owner_id, workflow_id, interval, start, end)
+        version = ds.version
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        metrics = compute_case_metrics(
+            ds,
+            owner_id=owner_id,
+            workflow_id=workflow_id,
+            interval=interval,
+            start=start,
+            end=end,
+        )
+        with self._lock:
+            self._entries[key] = (version, metrics)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return metrics
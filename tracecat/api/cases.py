@@ -0,0 +1,257 @@
+"""Paginated reads and bulk exports of the cases table.
+
+Listing cases used to return only the first `limit` rows in no particular
+order, and decoded every JSON column into Python objects only for them to be
+encoded again in the response. There was no way to read cases in bulk.
+
+Design
+------
+- Cases are listed in keyset order, by (`created_at`, `id`). The cursor of a
+  page encodes the key of its last case, and the next page starts strictly
+  after that key. Pages are stable while cases are appended, and no cases are
+  skipped or repeated, unlike with offsets. Updates keep a case's `created_at`,
+  so they don't move it either.
+- Cases without a `created_at` (written before it was set) are listed first,
+  ordered by `id`.
+- Cursors are opaque to clients: URL-safe base64 encoded JSON.
+- A page is found by scanning only the key columns of the matching cases, batch
+  by batch, keeping the `limit` smallest keys. Only then are the requested
+  columns of those cases read. Memory use is bounded by the page and batch
+  size, not the number of cases.
+- JSON columns (`payload`, `context`, `suppression`) are embedded in the
+  response as is, without being decoded and encoded again, as
+  `orjson.Fragment`s (orjson>=3.9).
+- Exports stream the record batches of a filtered scan as an Arrow IPC stream
+  or a Parquet file, without converting them to Python objects. Only the
+  batches being encoded are held in memory.
+"""
+
+from __future__ import annotations
+
+import base64
+import binascii
+from collections.abc import Iterator, Sequence
+from datetime import datetime
+from typing import Any, Literal
+
+import lance
+import orjson
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from tracecat.types.cases import Case
+
+CASE_FIELDS = tuple(Case.model_fields)
+# Columns that hold JSON-serialized objects
+CASE_JSON_FIELDS = frozenset({"payload", "context", "suppression"})
+
+ExportFormat = Literal["arrow", "parquet"]
+EXPORT_MEDIA_TYPES: dict[ExportFormat, str] = {
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+_KEY_FIELDS = ["created_at", "id"]
+_SORT_KEYS = [("created_at", "ascending"), ("id", "ascending")]
+_TIMESTAMP_TYPE = pa.timestamp("us", tz="UTC")
+# Sorts cases without a `created_at` before all others
+_NULL_CREATED_AT = pa.scalar(0, type=_TIMESTAMP_TYPE)
+
+
+def encode_cursor(created_at: datetime | None, case_id: str) -> str:
+    """Encode the key of a case into an opaque cursor."""
+    key = orjson.dumps([created_at and created_at.isoformat(), case_id])
+    return base64.urlsafe_b64encode(key).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime | None, str]:
+    """Decode a cursor into the key of a case.
+
+    Raises
+    ------
+    ValueError
+        If the cursor is malformed.
+    """
+    try:
+        created_at, case_id = orjson.loads(base64.urlsafe_b64decode(cursor))
+        if created_at is None:
+            return None, str(case_id)
+        return datetime.fromisoformat(created_at), str(case_id)
+    except (binascii.Error, orjson.JSONDecodeError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor {cursor!r}") from e
+
+
+def list_cases_page(
+    ds: lance.LanceDataset,
+    *,
+    owner_id: str,
+    workflow_id: str,
+    limit: int,
+    cursor: str | None = None,
+    fields: Sequence[str] | None = None,
+) -> tuple[list[dict[str, Any]], str | None]:
+    """List a page of a workflow's cases in (`created_at`, `id`) order.
+
+    Returns
+    -------
+    The cases of the page, with only the requested fields, and the cursor of
+    the next page, or None if this is the last page. The values of JSON fields
+    are `orjson.Fragment`s, to be serialized with `orjson.dumps`.
+
+    Raises
+    ------
+    ValueError
+        If the cursor is malformed or a field doesn't exist.
+    """
+    fields = _validate_fields(fields)
+    owner_filter = page_filter = _owner_filter(owner_id, workflow_id)
+    if cursor is not None:
+        page_filter &= _after_key(*decode_cursor(cursor))
+
+    # Fetch one extra key to know whether there is a next page
+    keys = _smallest_keys(ds, page_filter, limit + 1)
+    has_next = keys.num_rows > limit
+    keys = keys.slice(0, limit)
+    if keys.num_rows == 0:
+        return [], None
+
+    case_ids = keys.column("id").to_pylist()
+    columns = fields if "id" in fields else [*fields, "id"]
+    table = ds.to_table(
+        columns=columns,
+        filter=owner_filter & pc.field("id").isin(case_ids),
+    )
+    rows_by_id = {row["id"]: row for row in table.to_pylist()}
+    cases = [_page_row(rows_by_id[i], fields) for i in case_ids if i in rows_by_id]
+
+    next_cursor = None
+    if has_next:
+        last = keys.slice(keys.num_rows - 1).to_pylist()[0]
+        created_at = last["created_at"]
+        if created_at == _NULL_CREATED_AT.as_py():
+            created_at = None
+        next_cursor = encode_cursor(created_at, last["id"])
+    return cases, next_cursor
+
+
+def _after_key(created_at: datetime | None, case_id: str) -> pc.Expression:
+    """Match the cases that come strictly after the given key."""
+    if created_at is None:
+        return pc.field("created_at").is_valid() | (
+            pc.field("created_at").is_null() & (pc.field("id") > case_id)
+        )
+    created_at = pa.scalar(created_at, type=_TIMESTAMP_TYPE)
+    return (pc.field("created_at") > created_at) | (
+        (pc.field("created_at") == created_at) & (pc.field("id") > case_id)
+    )
+
+
+def _smallest_keys(ds: lance.LanceDataset, filter: pc.Expression, k: int) -> pa.Table:
+    """Scan the keys of the matching cases and return the `k` smallest, in order."""
+    keys = pa.Table.from_pylist(
+        [], schema=pa.schema([ds.schema.field(f) for f in _KEY_FIELDS])
+    )
+    for batch in ds.to_batches(columns=_KEY_FIELDS, filter=filter):
+        i = batch.schema.get_field_index("created_at")
+        batch = batch.set_column(
+            i, "created_at", pc.fill_null(batch.column(i), _NULL_CREATED_AT)
+        )
+        keys = pa.concat_tables([keys, pa.Table.from_batches([batch])])
+        if keys.num_rows > k:
+            keys = keys.take(pc.select_k_unstable(keys, k, sort_keys=_SORT_KEYS))
+    return keys.sort_by(_SORT_KEYS)
+
+
+def case_update_values(case: Case) -> dict[str, Any]:
+    """Return the column values to update a stored case with.
+
+    The case's `created_at` is kept, as it is the case's key in listings.
+    """
+    values = case.flatten()
+    del values["created_at"]
+    return values
+
+
+def _page_row(row: dict[str, Any], fields: list[str]) -> dict[str, Any]:
+    return {
+        field: orjson.Fragment(row[field])
+        if field in CASE_JSON_FIELDS and row[field] is not None
+        else row[field]
+        for field in fields
+    }
+
+
+def export_cases(
+    ds: lance.LanceDataset,
+    *,
+    owner_id: str,
+    workflow_id: str,
+    format: ExportFormat,
+    fields: Sequence[str] | None = None,
+) -> Iterator[bytes]:
+    """Stream a workflow's cases as an Arrow IPC stream or a Parquet file.
+
+    Yields the encoded bytes as each record batch is written.
+
+    Raises
+    ------
+    ValueError
+        If a field doesn't exist. Raised before anything is yielded.
+    """
+    # NOTE: This isn't a generator itself, so invalid fields are raised before
+    # a response starts streaming
+    fields = _validate_fields(fields)
+    scanner = ds.scanner(columns=fields, filter=_owner_filter(owner_id, workflow_id))
+    return _encode_batches(scanner.to_reader(), format)
+
+
+def _encode_batches(
+    reader: pa.RecordBatchReader, format: ExportFormat
+) -> Iterator[bytes]:
+    sink = _ChunkSink()
+    if format == "arrow":
+        writer = pa.ipc.new_stream(sink, reader.schema)
+    else:
+        writer = pq.ParquetWriter(sink, reader.schema)
+    with writer:
+        for batch in reader:
+            writer.write_batch(batch)
+            if chunk := sink.drain():
+                yield chunk
+    if chunk := sink.drain():
+        yield chunk
+
+
+class _ChunkSink:
+    """A write-only file object that hands out what was written to it."""
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+        self.closed = False
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _validate_fields(fields: Sequence[str] | None) -> list[str]:
+    fields = list(fields or CASE_FIELDS)
+    if unknown := set(fields) - set(CASE_FIELDS):
+        raise ValueError(f"Unknown case fields {sorted(unknown)!r}")
+    return fields
+
+
+def _owner_filter(owner_id: str, workflow_id: str) -> pc.Expression:
+    return (pc.field("owner_id") == owner_id) & (pc.field("workflow_id") == workflow_id)
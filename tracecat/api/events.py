@@ -0,0 +1,111 @@
+"""Filtered search of action run events.
+
+Design
+------
+- Searches use the process-wide handles of the events index partitions, whose
+  searchers are reloaded when the runner commits new events. Partitions are
+  not reopened per request.
+- A search only opens the daily partitions that overlap its time range.
+- Filters on IDs and action types are exact term queries on raw (untokenized)
+  fields, and time filters are range queries on `published_at`. An optional
+  full-text query matches the titles and data of events.
+- Events are ordered by the `published_at` fast field and paginated with
+  `offset` and `limit`. Only the stored documents of the page are retrieved.
+- Partitions hold disjoint, ordered time ranges. They are searched in the
+  requested order until the page is filled, so the remaining partitions are
+  never searched.
+"""
+
+from __future__ import annotations
+
+from datetime import UTC, datetime, timedelta
+from typing import Any
+
+import tantivy
+
+from tracecat.db import get_events_partitions
+from tracecat.types.api import Event, EventSearchParams
+
+# Fields matched by free-text queries
+_FULL_TEXT_FIELDS = ["action_title", "workflow_title", "data"]
+
+
+def build_events_query(
+    index: tantivy.Index, params: EventSearchParams
+) -> tantivy.Query:
+    """Build the query that selects the events matching the search params."""
+    schema = index.schema
+    terms = {
+        "workflow_id": params.workflow_id,
+        "workflow_run_id": params.workflow_run_id,
+        "action_type": params.action_type,
+    }
+    subqueries = [
+        (tantivy.Occur.Must, tantivy.Query.term_query(schema, field, value))
+        for field, value in terms.items()
+        if value is not None
+    ]
+    if params.start_time is not None or params.end_time is not None:
+        time_range = tantivy.Query.range_query(
+            schema,
+            "published_at",
+            tantivy.FieldType.Date,
+            _as_naive_utc(params.start_time),
+            _as_naive_utc(params.end_time),
+            include_upper=params.end_time is None,
+        )
+        subqueries.append((tantivy.Occur.Must, time_range))
+    if params.query:
+        full_text = index.parse_query(params.query, _FULL_TEXT_FIELDS)
+        subqueries.append((tantivy.Occur.Must, full_text))
+    return tantivy.Query.boolean_query(subqueries)
+
+
+def query_events(params: EventSearchParams) -> list[Event]:
+    """Return a page of the events matching the search params.
+
+    Raises
+    ------
+    ValueError
+        If the full-text query is invalid.
+    """
+    start = _as_naive_utc(params.start_time)
+    end = _as_naive_utc(params.end_time)
+    partitions = get_events_partitions(
+        start=start.date() if start is not None else None,
+        # The end time is exclusive
+        end=(end - timedelta(microseconds=1)).date() if end is not None else None,
+    )
+    if params.order == "desc":
+        partitions.reverse()
+
+    # Collect the hits up to the end of the page, partition by partition
+    wanted = params.offset + params.limit
+    hits: list[tuple[tantivy.Searcher, tantivy.DocAddress]] = []
+    for _, index in partitions:
+        searcher = index.searcher()
+        result = searcher.search(
+            build_events_query(index, params),
+            limit=wanted - len(hits),
+            count=False,
+            order_by_field=params.order_by,
+            order=tantivy.Order.Asc if params.order == "asc" else tantivy.Order.Desc,
+        )
+        hits.extend((searcher, address) for _, address in result.hits)
+        if len(hits) >= wanted:
+            break
+    page = hits[params.offset : wanted]
+    return [_to_event(searcher.doc(address)) for searcher, address in page]
+
+
+def _to_event(document: tantivy.Document) -> Event:
+    # Stored fields hold lists of values
+    fields: dict[str, Any] = {k: v[0] for k, v in document.to_dict().items() if v}
+    return Event.model_validate(fields)
+
+
+def _as_naive_utc(dt: datetime | None) -> datetime | None:
+    # Events are published with naive UTC timestamps
+    if dt is None or dt.tzinfo is None:
+        return dt
+    return dt.astimezone(UTC).replace(tzinfo=None)
@@ -0,0 +1,101 @@
+"""Serialized workflow responses.
+
+The runner fetches a workflow from the API on every cache miss of its own
+workflow cache. Building the response used to take two queries, decode every
+action's inputs and the workflow's React Flow object, and encode them again.
+
+Design
+------
+- A workflow and its actions are loaded in a single query.
+- The stored JSON of action inputs and the React Flow object is embedded in
+  the response as is, without being decoded and encoded again, as
+  `orjson.Fragment`s (orjson>=3.9).
+- Serialized responses are cached per (owner, workflow ID), together with the
+  workflow's `updated_at`. A cached response is only served if `updated_at` is
+  unchanged, so edits made through any API process invalidate it. Edits to a
+  workflow's actions bump the workflow's `updated_at`.
+- The cache holds at most `max_size` entries, evicting the least recently used.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from datetime import UTC, datetime
+
+import orjson
+from sqlmodel import Session
+
+from tracecat.db import Workflow
+
+# (Owner ID, workflow ID)
+_CacheKey = tuple[str, str]
+
+
+def serialize_workflow(workflow: Workflow) -> bytes:
+    """Serialize a workflow and its actions as a `WorkflowResponse`."""
+    actions = {
+        action.id: {
+            "id": action.id,
+            "type": action.type,
+            "title": action.title,
+            "description": action.description,
+            "status": action.status,
+            "inputs": orjson.Fragment(action.inputs) if action.inputs else None,
+            "key": action.key,
+        }
+        for action in workflow.actions
+    }
+    return orjson.dumps(
+        {
+            "id": workflow.id,
+            "title": workflow.title,
+            "description": workflow.description,
+            "status": workflow.status,
+            "actions": actions,
+            "object": orjson.Fragment(workflow.object) if workflow.object else None,
+            "owner_id": workflow.owner_id,
+        }
+    )
+
+
+def touch_workflow(session: Session, workflow_id: str) -> None:
+    """Mark a workflow as updated, e.g. when one of its actions changed."""
+    workflow = session.get(Workflow, workflow_id)
+    if workflow is not None:
+        workflow.updated_at = datetime.now(UTC).replace(tzinfo=None)
+        session.add(workflow)
+
+
+class WorkflowResponseCache:
+    """Caches serialized workflow responses by owner, workflow ID and `updated_at`."""
+
+    def __init__(self, *, max_size: int) -> None:
+        self.max_size = max_size
+        self._entries: OrderedDict[_CacheKey, tuple[datetime, bytes]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(
+        self, owner_id: str, workflow_id: str, updated_at: datetime
+    ) -> bytes | None:
+        """Return the cached response, if the workflow wasn't updated since."""
+        key = (owner_id, workflow_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != updated_at:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(
+        self, owner_id: str, workflow_id: str, updated_at: datetime, content: bytes
+    ) -> None:
+        key = (owner_id, workflow_id)
+        with self._lock:
+            self._entries[key] = (updated_at, content)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
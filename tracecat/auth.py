@@ -57,10 +57,9 @@ class AuthenticatedServiceClient(httpx.AsyncClient):
         )
         if self.role.type != "service":
             raise ValueError("AuthenticatedServiceClient can only be used by services")
-        self.headers["Service-Role"] = self.role.service_id or self.__default_service_id
-        self.headers["X-API-Key"] = os.environ["TRACECAT__SERVICE_KEY"]
-        if self.role.user_id:
-            self.headers["Service-User-ID"] = self.role.user_id
+        self.headers.update(
+            get_service_role_headers(self.role, self.__default_service_id)
+        )
 
     async def __aenter__(self):
         """Inject the service role and api key to the headers at query time."""
@@ -131,6 +130,19 @@ class Role(BaseModel):
     service_id: str | None = None
 
 
+def get_service_role_headers(
+    role: Role, default_service_id: str = "tracecat-service"
+) -> dict[str, str]:
+    """Return the headers that authenticate a service role with another service."""
+    headers = {
+        "Service-Role": role.service_id or default_service_id,
+        "X-API-Key": os.environ["TRACECAT__SERVICE_KEY"],
+    }
+    if role.user_id:
+        headers["Service-User-ID"] = role.user_id
+    return headers
+
+
 def compute_hash(object_id: str) -> str:
     return hashlib.sha256(
         f"{object_id}{os.environ["TRACECAT__SIGNING_SECRET"]}".encode()
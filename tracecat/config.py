@@ -11,3 +11,135 @@ TRACECAT__SERVICE_ROLES_WHITELIST = ["tracecat-runner", "tracecat-api"]
 TRACECAT__SELF_HOSTED_DB_BACKEND = os.environ.get(
     "TRACECAT__SELF_HOSTED_DB_BACKEND", "postgres"
 )
+
+# Database connection pool, per engine
+TRACECAT__DB_POOL_SIZE = int(os.environ.get("TRACECAT__DB_POOL_SIZE", 10))
+TRACECAT__DB_MAX_OVERFLOW = int(os.environ.get("TRACECAT__DB_MAX_OVERFLOW", 20))
+TRACECAT__DB_POOL_PRE_PING = (
+    os.environ.get("TRACECAT__DB_POOL_PRE_PING", "true").lower() == "true"
+)
+# Number of compiled SQL statements cached per engine
+TRACECAT__DB_QUERY_CACHE_SIZE = int(
+    os.environ.get("TRACECAT__DB_QUERY_CACHE_SIZE", 1200)
+)
+# Number of executions after which Postgres statements are prepared server-side.
+# Only applies to async engines. Set to -1 to disable prepared statements, e.g.
+# behind PgBouncer in transaction pooling mode.
+TRACECAT__DB_PREPARE_THRESHOLD = int(
+    os.environ.get("TRACECAT__DB_PREPARE_THRESHOLD", 5)
+)
+# How long SQLite waits for a lock held by another connection
+TRACECAT__DB_SQLITE_BUSY_TIMEOUT = float(
+    os.environ.get("TRACECAT__DB_SQLITE_BUSY_TIMEOUT", 30)  # seconds
+)
+
+# Serialized workflow responses cached by the API
+TRACECAT__API_WORKFLOW_CACHE_MAX_SIZE = int(
+    os.environ.get("TRACECAT__API_WORKFLOW_CACHE_MAX_SIZE", 1024)
+)
+
+# Connection pool of the runner's shared API client
+TRACECAT__RUNNER_API_MAX_CONNECTIONS = int(
+    os.environ.get("TRACECAT__RUNNER_API_MAX_CONNECTIONS", 100)
+)
+TRACECAT__RUNNER_API_MAX_KEEPALIVE_CONNECTIONS = int(
+    os.environ.get("TRACECAT__RUNNER_API_MAX_KEEPALIVE_CONNECTIONS", 20)
+)
+TRACECAT__RUNNER_API_KEEPALIVE_EXPIRY = float(
+    os.environ.get("TRACECAT__RUNNER_API_KEEPALIVE_EXPIRY", 30)  # seconds
+)
+
+# Batched reporting of action run statuses from the runner to the API
+TRACECAT__RUNNER_OUTBOX_FLUSH_INTERVAL = float(
+    os.environ.get("TRACECAT__RUNNER_OUTBOX_FLUSH_INTERVAL", 0.5)  # seconds
+)
+TRACECAT__RUNNER_OUTBOX_MAX_BATCH_SIZE = int(
+    os.environ.get("TRACECAT__RUNNER_OUTBOX_MAX_BATCH_SIZE", 500)
+)
+TRACECAT__RUNNER_OUTBOX_MAX_ATTEMPTS = int(
+    os.environ.get("TRACECAT__RUNNER_OUTBOX_MAX_ATTEMPTS", 5)
+)
+
+# Cache of decrypted secrets in the runner
+TRACECAT__RUNNER_SECRETS_TTL = float(
+    os.environ.get("TRACECAT__RUNNER_SECRETS_TTL", 60)  # seconds
+)
+
+# Routing table of webhooks in the runner
+TRACECAT__RUNNER_WEBHOOKS_TTL = float(
+    os.environ.get("TRACECAT__RUNNER_WEBHOOKS_TTL", 60)  # seconds
+)
+TRACECAT__RUNNER_WEBHOOKS_MISS_TTL = float(
+    os.environ.get("TRACECAT__RUNNER_WEBHOOKS_MISS_TTL", 10)  # seconds
+)
+
+# Cache of compiled workflows in the runner
+TRACECAT__RUNNER_WORKFLOW_CACHE_TTL = float(
+    os.environ.get("TRACECAT__RUNNER_WORKFLOW_CACHE_TTL", 60)  # seconds
+)
+TRACECAT__RUNNER_WORKFLOW_CACHE_MAX_SIZE = int(
+    os.environ.get("TRACECAT__RUNNER_WORKFLOW_CACHE_MAX_SIZE", 1024)
+)
+
+# Batched indexing of action run events in the runner
+TRACECAT__RUNNER_EVENTS_BATCH_SIZE = int(
+    os.environ.get("TRACECAT__RUNNER_EVENTS_BATCH_SIZE", 1000)
+)
+TRACECAT__RUNNER_EVENTS_COMMIT_INTERVAL = float(
+    os.environ.get("TRACECAT__RUNNER_EVENTS_COMMIT_INTERVAL", 1)  # seconds
+)
+TRACECAT__RUNNER_EVENTS_QUEUE_SIZE = int(
+    os.environ.get("TRACECAT__RUNNER_EVENTS_QUEUE_SIZE", 10000)
+)
+
+# Thread pool for blocking storage I/O in the runner
+TRACECAT__RUNNER_STORAGE_MAX_WORKERS = int(
+    os.environ.get("TRACECAT__RUNNER_STORAGE_MAX_WORKERS", 8)
+)
+TRACECAT__RUNNER_STORAGE_MAX_PENDING = int(
+    os.environ.get("TRACECAT__RUNNER_STORAGE_MAX_PENDING", 256)
+)
+
+# Number of days action run events are kept in the events index
+TRACECAT__EVENTS_RETENTION_DAYS = int(
+    os.environ.get("TRACECAT__EVENTS_RETENTION_DAYS", 30)
+)
+
+# How often cached LanceDB table handles check for writes by other processes
+TRACECAT__VDB_READ_CONSISTENCY_INTERVAL = float(
+    os.environ.get("TRACECAT__VDB_READ_CONSISTENCY_INTERVAL", 1)  # seconds
+)
+
+# Write-buffered ingestion of cases into LanceDB
+TRACECAT__CASES_BUFFER_MAX_ROWS = int(
+    os.environ.get("TRACECAT__CASES_BUFFER_MAX_ROWS", 1000)
+)
+TRACECAT__CASES_BUFFER_FLUSH_INTERVAL = float(
+    os.environ.get("TRACECAT__CASES_BUFFER_FLUSH_INTERVAL", 1)  # seconds
+)
+# Number of failed appends after which buffered cases are dropped
+TRACECAT__CASES_BUFFER_MAX_ATTEMPTS = int(
+    os.environ.get("TRACECAT__CASES_BUFFER_MAX_ATTEMPTS", 5)
+)
+# Number of appended cases after which the case indexes are updated
+TRACECAT__CASES_INDEX_OPTIMIZE_ROWS = int(
+    os.environ.get("TRACECAT__CASES_INDEX_OPTIMIZE_ROWS", 10000)
+)
+TRACECAT__CASES_COMPACTION_INTERVAL = float(
+    os.environ.get("TRACECAT__CASES_COMPACTION_INTERVAL", 3600)  # seconds
+)
+TRACECAT__CASES_METRICS_CACHE_MAX_SIZE = int(
+    os.environ.get("TRACECAT__CASES_METRICS_CACHE_MAX_SIZE", 1024)
+)
+
+# Retention of finished workflow run results in the runner
+TRACECAT__RUNNER_RESULTS_TTL = float(
+    os.environ.get("TRACECAT__RUNNER_RESULTS_TTL", 3600)  # seconds
+)
+TRACECAT__RUNNER_RESULTS_MAX_BYTES = int(
+    os.environ.get("TRACECAT__RUNNER_RESULTS_MAX_BYTES", 64 * 1024 * 1024)
+)
+# If set, results evicted for size are spilled to this directory
+TRACECAT__RUNNER_RESULTS_SPILL_PATH = os.environ.get(
+    "TRACECAT__RUNNER_RESULTS_SPILL_PATH"
+)
@@ -1,7 +1,10 @@
 import json
 import os
-from datetime import datetime
+import shutil
+import threading
+from datetime import date, datetime, timedelta
 from pathlib import Path
+from typing import Any
 from uuid import uuid4
 
 import lancedb
@@ -9,15 +12,33 @@ import pyarrow as pa
 import tantivy
 from pydantic import computed_field
 from slugify import slugify
-from sqlalchemy import TIMESTAMP, Column, Engine, ForeignKey, String, text
+from sqlalchemy import (
+    TIMESTAMP,
+    Column,
+    Engine,
+    ForeignKey,
+    Index,
+    String,
+    event,
+    make_url,
+    text,
+)
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 from sqlmodel import Field, Relationship, Session, SQLModel, create_engine, select
 
 from tracecat import auth
 from tracecat.auth import decrypt_key, encrypt_key
 from tracecat.config import (
     TRACECAT__APP_ENV,
+    TRACECAT__DB_MAX_OVERFLOW,
+    TRACECAT__DB_POOL_PRE_PING,
+    TRACECAT__DB_POOL_SIZE,
+    TRACECAT__DB_PREPARE_THRESHOLD,
+    TRACECAT__DB_QUERY_CACHE_SIZE,
+    TRACECAT__DB_SQLITE_BUSY_TIMEOUT,
     TRACECAT__RUNNER_URL,
     TRACECAT__SELF_HOSTED_DB_BACKEND,
+    TRACECAT__VDB_READ_CONSISTENCY_INTERVAL,
 )
 from tracecat.labels.mitre import get_mitre_tactics_techniques
 
@@ -154,6 +175,16 @@ class Workflow(Resource, table=True):
 
 
 class WorkflowRun(Resource, table=True):
+    __table_args__ = (
+        # Listing a workflow's runs, most recent first
+        Index(
+            "ix_workflowrun_owner_id_workflow_id_created_at",
+            "owner_id",
+            "workflow_id",
+            "created_at",
+        ),
+    )
+
     id: str | None = Field(default_factory=lambda: uuid4().hex, primary_key=True)
     status: str = "pending"  # "online" or "offline"
     workflow_id: str | None = Field(foreign_key="workflow.id")
@@ -162,6 +193,11 @@ class WorkflowRun(Resource, table=True):
 
 
 class Action(Resource, table=True):
+    __table_args__ = (
+        # Listing a workflow's actions, with or without the owner
+        Index("ix_action_workflow_id_owner_id", "workflow_id", "owner_id"),
+    )
+
     id: str | None = Field(default_factory=lambda: uuid4().hex, primary_key=True)
     type: str
     title: str
@@ -183,6 +219,18 @@ class Action(Resource, table=True):
 
 
 class ActionRun(Resource, table=True):
+    __table_args__ = (
+        # Listing an action's runs, most recent first
+        Index(
+            "ix_actionrun_owner_id_action_id_created_at",
+            "owner_id",
+            "action_id",
+            "created_at",
+        ),
+        # Loading the action runs of a workflow run
+        Index("ix_actionrun_workflow_run_id", "workflow_run_id"),
+    )
+
     id: str | None = Field(default_factory=lambda: uuid4().hex, primary_key=True)
     status: str = "pending"  # "online" or "offline"
     action_id: str | None = Field(foreign_key="action.id")
@@ -200,6 +248,11 @@ class Webhook(Resource, table=True):
     - External sources only have access to the path
     """
 
+    __table_args__ = (
+        Index("ix_webhook_owner_id_workflow_id", "owner_id", "workflow_id"),
+        Index("ix_webhook_owner_id_action_id", "owner_id", "action_id"),
+    )
+
     id: str | None = Field(
         default_factory=lambda: uuid4().hex,
         primary_key=True,
@@ -225,48 +278,162 @@ class Webhook(Resource, table=True):
         return f"{TRACECAT__RUNNER_URL}/webhook/{self.id}/{self.secret}"
 
 
-def create_db_engine() -> Engine:
-    if TRACECAT__APP_ENV == "prod":
-        engine_kwargs = {
-            "pool_timeout": 30,
-            "pool_recycle": 3600,
-            "connect_args": {"sslmode": "require"},
+def _engine_kwargs(uri: str) -> dict[str, Any]:
+    engine_kwargs = {
+        "pool_size": TRACECAT__DB_POOL_SIZE,
+        "max_overflow": TRACECAT__DB_MAX_OVERFLOW,
+        "pool_pre_ping": TRACECAT__DB_POOL_PRE_PING,
+        "query_cache_size": TRACECAT__DB_QUERY_CACHE_SIZE,
+    }
+    if make_url(uri).get_backend_name() == "sqlite":
+        engine_kwargs["connect_args"] = {
+            "check_same_thread": False,
+            "timeout": TRACECAT__DB_SQLITE_BUSY_TIMEOUT,
         }
     else:
-        if TRACECAT__SELF_HOSTED_DB_BACKEND == "postgres":
-            engine_kwargs = {
-                "pool_timeout": 30,
-                "pool_recycle": 3600,
-                "connect_args": {"sslmode": "disable"},
-            }
-        else:
-            engine_kwargs = {"connect_args": {"check_same_thread": False}}
-    engine = create_engine(TRACECAT__DB_URI, **engine_kwargs)
+        engine_kwargs.update(
+            pool_timeout=30,
+            pool_recycle=3600,
+            connect_args={
+                "sslmode": "require" if TRACECAT__APP_ENV == "prod" else "disable"
+            },
+        )
+    return engine_kwargs
+
+
+def _configure_sqlite(engine: Engine) -> None:
+    """Use write-ahead logging on SQLite databases.
+
+    In WAL mode, readers don't block writers and a writer doesn't block
+    readers. With `synchronous=NORMAL`, commits don't wait for an fsync, but the
+    database can't be corrupted: a power loss can only roll back the last
+    commits.
+    """
+    if engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, _connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
+
+def create_db_engine(uri: str = TRACECAT__DB_URI) -> Engine:
+    engine = create_engine(uri, **_engine_kwargs(uri))
+    _configure_sqlite(engine)
     return engine
 
 
-def build_events_index():
-    index_path = STORAGE_PATH / "event_index"
-    index_path.mkdir(parents=True, exist_ok=True)
-    event_schema = (
+def create_async_db_engine(uri: str = TRACECAT__DB_URI) -> AsyncEngine:
+    """Create an engine for async sessions, on the same database as `create_db_engine`.
+
+    Postgres is accessed through psycopg's async driver, SQLite through aiosqlite.
+    """
+    url = make_url(uri)
+    engine_kwargs = _engine_kwargs(uri)
+    if url.get_backend_name() == "sqlite":
+        url = url.set(drivername="sqlite+aiosqlite")
+    else:
+        url = url.set(drivername="postgresql+psycopg")
+        threshold = TRACECAT__DB_PREPARE_THRESHOLD
+        engine_kwargs["connect_args"]["prepare_threshold"] = (
+            threshold if threshold >= 0 else None
+        )
+    engine = create_async_engine(url, **engine_kwargs)
+    _configure_sqlite(engine.sync_engine)
+    return engine
+
+
+# NOTE: The first version of the events index (`event_index`) tokenized IDs as
+# full text, so they couldn't be filtered on exactly. Its schema can't be
+# changed in place, so events are indexed in a new directory.
+EVENTS_INDEX_PATH = STORAGE_PATH / "event_index_v2"
+
+
+def create_events_schema() -> tantivy.Schema:
+    return (
         tantivy.SchemaBuilder()
-        .add_date_field("published_at", fast=True, stored=True)
-        .add_text_field("action_id", stored=True)
-        .add_text_field("action_run_id", stored=True)
+        .add_date_field("published_at", fast=True, stored=True, indexed=True)
+        # IDs and types are matched exactly, not tokenized
+        .add_text_field("action_id", stored=True, tokenizer_name="raw")
+        .add_text_field("action_run_id", stored=True, tokenizer_name="raw")
         .add_text_field("action_title", stored=True)
-        .add_text_field("action_type", stored=True)
-        .add_text_field("workflow_id", stored=True)
+        .add_text_field("action_type", stored=True, tokenizer_name="raw")
+        .add_text_field("workflow_id", stored=True, tokenizer_name="raw")
         .add_text_field("workflow_title", stored=True)
-        .add_text_field("workflow_run_id", stored=True)
+        .add_text_field("workflow_run_id", stored=True, tokenizer_name="raw")
         .add_json_field("data", stored=True)
         .build()
     )
-    tantivy.Index(event_schema, path=str(index_path))
 
 
-def create_events_index() -> tantivy.Index:
-    index_path = STORAGE_PATH / "event_index"
-    return tantivy.Index.open(str(index_path))
+def build_events_index():
+    """Create the directory of the events index partitions."""
+    EVENTS_INDEX_PATH.mkdir(parents=True, exist_ok=True)
+
+
+def create_events_index(day: date) -> tantivy.Index:
+    """Open the partition of the events index holding the events published on
+    `day` (UTC). The partition is created if it doesn't exist.
+    """
+    path = EVENTS_INDEX_PATH / day.isoformat()
+    path.mkdir(parents=True, exist_ok=True)
+    return tantivy.Index(create_events_schema(), path=str(path))
+
+
+def list_events_partitions() -> list[date]:
+    """Return the days of the existing events index partitions, in order."""
+    days = []
+    if EVENTS_INDEX_PATH.is_dir():
+        for path in EVENTS_INDEX_PATH.iterdir():
+            try:
+                days.append(date.fromisoformat(path.name))
+            except ValueError:
+                continue  # Not a partition
+    return sorted(days)
+
+
+def drop_events_partitions(older_than: date) -> list[date]:
+    """Delete the events index partitions of the days before `older_than`."""
+    dropped = [day for day in list_events_partitions() if day < older_than]
+    for day in dropped:
+        shutil.rmtree(EVENTS_INDEX_PATH / day.isoformat(), ignore_errors=True)
+    return dropped
+
+
+_events_partitions: dict[date, tantivy.Index] = {}
+_events_partitions_lock = threading.Lock()
+
+
+def get_events_partitions(
+    start: date | None = None, end: date | None = None
+) -> list[tuple[date, tantivy.Index]]:
+    """Return the process-wide handles of the events index partitions of the days
+    in [start, end], for searching. The partitions are in order of their day.
+
+    The index readers reload their searchers shortly after each commit,
+    including commits made by other processes, so searchers are always fresh
+    without reopening the partitions. Handles of dropped partitions are released.
+    """
+    days = list_events_partitions()
+    with _events_partitions_lock:
+        for day in _events_partitions.keys() - set(days):
+            del _events_partitions[day]
+        partitions = []
+        for day in days:
+            if (start is not None and day < start) or (end is not None and day > end):
+                continue
+            if (index := _events_partitions.get(day)) is None:
+                try:
+                    index = tantivy.Index.open(str(EVENTS_INDEX_PATH / day.isoformat()))
+                except ValueError:
+                    continue  # The partition is still being created
+                index.config_reader(reload_policy="OnCommit")
+                _events_partitions[day] = index
+            partitions.append((day, index))
+        return partitions
 
 
 def create_vdb_conn() -> lancedb.DBConnection:
@@ -274,6 +441,40 @@ def create_vdb_conn() -> lancedb.DBConnection:
     return db
 
 
+_vdb_conn: lancedb.DBConnection | None = None
+_vdb_tables: dict[str, lancedb.table.Table] = {}
+_vdb_lock = threading.Lock()
+
+
+def get_vdb_table(name: str) -> lancedb.table.Table:
+    """Return the process-wide handle of a LanceDB table.
+
+    Opening a connection and a table reads the table's manifest from disk, so
+    handles are opened once per process and reused.
+
+    Notes
+    -----
+    - Writes through the handle are visible to it immediately.
+    - Writes by other processes (e.g. cases opened by the runner, read by the
+      API) are picked up by checking for a new table version at most every
+      `TRACECAT__VDB_READ_CONSISTENCY_INTERVAL` seconds. The manifest is only
+      reloaded if the version changed.
+    """
+    global _vdb_conn
+    with _vdb_lock:
+        if (tbl := _vdb_tables.get(name)) is not None:
+            return tbl
+        if _vdb_conn is None:
+            _vdb_conn = lancedb.connect(
+                STORAGE_PATH / "vector.db",
+                read_consistency_interval=timedelta(
+                    seconds=TRACECAT__VDB_READ_CONSISTENCY_INTERVAL
+                ),
+            )
+        tbl = _vdb_tables[name] = _vdb_conn.open_table(name)
+        return tbl
+
+
 CaseSchema = pa.schema(
     [
         pa.field("id", pa.string(), nullable=False),
@@ -300,14 +501,51 @@ CaseSchema = pa.schema(
 )
 
 
+# Columns that cases are filtered by
+CASE_INDEXED_COLUMNS = ("owner_id", "workflow_id", "id")
+
+
+def create_cases_indices(tbl: lancedb.table.Table) -> None:
+    """Create scalar (BTree) indexes on the columns cases are filtered by.
+
+    Existing indexes are kept. Rows added after an index was created are
+    searched without the index until the indexes are optimized, see
+    `optimize_cases_indices`.
+    """
+    indexed = {
+        field for index in tbl.to_lance().list_indices() for field in index["fields"]
+    }
+    for column in CASE_INDEXED_COLUMNS:
+        if column not in indexed:
+            tbl.create_scalar_index(column)
+
+
+def optimize_cases_indices(tbl: lancedb.table.Table) -> None:
+    """Add the rows appended since the last optimization to the case indexes."""
+    tbl.to_lance().optimize.optimize_indices()
+
+
+def create_missing_indexes(engine: Engine) -> None:
+    """Create the indexes declared on existing tables.
+
+    `create_all` only creates the indexes of the tables it creates, so indexes
+    added to the schema later are missing from existing databases.
+    """
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+
+
 def initialize_db() -> Engine:
     # Relational table
     engine = create_db_engine()
     SQLModel.metadata.create_all(engine)
+    create_missing_indexes(engine)
 
     # VectorDB
     db = create_vdb_conn()
-    db.create_table("cases", schema=CaseSchema, exist_ok=True)
+    cases_tbl = db.create_table("cases", schema=CaseSchema, exist_ok=True)
+    create_cases_indices(cases_tbl)
     # Search
     build_events_index()
 
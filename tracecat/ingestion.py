@@ -0,0 +1,222 @@
+"""Write-buffered ingestion of cases into LanceDB.
+
+Every append to a Lance table creates a new fragment (data file). Appending
+cases one at a time creates many tiny fragments, which makes every scan of the
+cases table slower as case volume grows.
+
+Design
+------
+- Cases are buffered in memory and appended as one Arrow table: when
+  `max_rows` cases are buffered, or `flush_interval` seconds after the last
+  flush, whichever comes first.
+- Flushes are serialized, so cases are appended in the order they were added.
+- Cases that fail to be appended are kept for the next flush, and dropped after
+  `max_attempts` failed appends. After a failed append, cases that don't match
+  the cases table's schema are dropped right away, so they don't fail the
+  other cases again.
+- After a failed append, reaching `max_rows` doesn't trigger another flush
+  until `flush_interval` seconds have passed.
+- The scalar indexes of the cases table are updated every `index_optimize_rows`
+  appended cases, so lookups only scan a bounded number of unindexed rows.
+- The cases table is compacted periodically to merge the fragments that are
+  still created, e.g. by updates or under low write volume.
+
+Buffered cases are only visible to readers once flushed, and are lost if the
+process crashes before the flush.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections.abc import Awaitable, Callable, Sequence
+from datetime import timedelta
+from typing import Any
+
+import pyarrow as pa
+
+from tracecat.config import (
+    TRACECAT__CASES_BUFFER_MAX_ATTEMPTS,
+    TRACECAT__CASES_INDEX_OPTIMIZE_ROWS,
+)
+from tracecat.db import CaseSchema, get_vdb_table, optimize_cases_indices
+from tracecat.logger import standard_logger
+from tracecat.types.cases import Case
+
+logger = standard_logger(__name__)
+
+# Runs a blocking function outside of the event loop
+BlockingRunner = Callable[..., Awaitable[Any]]
+
+_NON_NULLABLE_FIELDS = [field.name for field in CaseSchema if not field.nullable]
+
+
+def _append_cases(rows: list[dict[str, Any]]) -> None:
+    tbl = get_vdb_table("cases")
+    tbl.add(pa.Table.from_pylist(rows, schema=CaseSchema))
+
+
+def _find_invalid_rows(rows: list[dict[str, Any]]) -> set[int]:
+    """Return the indices of the rows that don't match the cases table's schema."""
+    invalid: set[int] = set()
+    for i, row in enumerate(rows):
+        if any(row.get(name) is None for name in _NON_NULLABLE_FIELDS):
+            invalid.add(i)
+            continue
+        try:
+            pa.Table.from_pylist([row], schema=CaseSchema)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            invalid.add(i)
+    return invalid
+
+
+def _optimize_indices() -> None:
+    optimize_cases_indices(get_vdb_table("cases"))
+
+
+def compact_cases_table(cleanup_older_than: timedelta = timedelta(days=7)) -> None:
+    """Merge the small fragments of the cases table and drop old versions."""
+    tbl = get_vdb_table("cases")
+    tbl.compact_files()
+    tbl.cleanup_old_versions(older_than=cleanup_older_than)
+    optimize_cases_indices(tbl)
+    logger.info("Compacted cases table")
+
+
+class CaseIngestionBuffer:
+    """Coalesces cases into large appends to the cases table."""
+
+    def __init__(
+        self,
+        *,
+        max_rows: int,
+        flush_interval: float,
+        max_attempts: int = TRACECAT__CASES_BUFFER_MAX_ATTEMPTS,
+        index_optimize_rows: int = TRACECAT__CASES_INDEX_OPTIMIZE_ROWS,
+        run_blocking: BlockingRunner = asyncio.to_thread,
+    ) -> None:
+        self.max_rows = max_rows
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.index_optimize_rows = index_optimize_rows
+        self.run_blocking = run_blocking
+        self._rows: list[dict[str, Any]] = []
+        # Number of failed appends of each buffered case, in the same order
+        self._attempts: list[int] = []
+        self._backoff_until = 0.0
+        self._unindexed_rows = 0
+        self._flush_lock: asyncio.Lock | None = None
+        self._stop_requested: asyncio.Event | None = None
+        self._task: asyncio.Task[None] | None = None
+
+    @property
+    def size(self) -> int:
+        """Number of cases waiting to be appended."""
+        return len(self._rows)
+
+    async def add(self, cases: Sequence[Case]) -> None:
+        """Buffer cases for ingestion. Flushes if the buffer is full."""
+        self._rows.extend(case.flatten() for case in cases)
+        self._attempts.extend(0 for _ in cases)
+        self._ensure_running()
+        if len(self._rows) >= self.max_rows and time.monotonic() >= self._backoff_until:
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Append all buffered cases to the cases table."""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            rows, self._rows = self._rows, []
+            attempts, self._attempts = self._attempts, []
+            if not rows:
+                return
+            try:
+                await self.run_blocking(_append_cases, rows)
+                logger.debug(f"Appended {len(rows)} cases")
+            except Exception as e:
+                await self._retry(rows, attempts, e)
+                return
+            self._unindexed_rows += len(rows)
+            if self._unindexed_rows >= self.index_optimize_rows:
+                try:
+                    await self.run_blocking(_optimize_indices)
+                    self._unindexed_rows = 0
+                except Exception as e:
+                    logger.error("Failed to optimize case indexes", exc_info=e)
+
+    async def _retry(
+        self, rows: list[dict[str, Any]], attempts: list[int], error: Exception
+    ) -> None:
+        """Keep the cases of a failed append for the next flush, within limits."""
+        self._backoff_until = time.monotonic() + self.flush_interval
+        try:
+            invalid = await self.run_blocking(_find_invalid_rows, rows)
+        except Exception as e:
+            logger.error("Failed to validate cases", exc_info=e)
+            invalid = set()
+        if invalid:
+            logger.error(
+                f"Dropping {len(invalid)} cases that don't match the cases schema:"
+                f" {[rows[i].get('id') for i in sorted(invalid)]!r}",
+                exc_info=error,
+            )
+            # The other cases didn't fail themselves, so they aren't penalized
+            kept = [
+                (r, a)
+                for i, (r, a) in enumerate(zip(rows, attempts, strict=True))
+                if i not in invalid
+            ]
+        else:
+            logger.error(
+                f"Failed to append {len(rows)} cases. Retrying.", exc_info=error
+            )
+            kept = [(r, a + 1) for r, a in zip(rows, attempts, strict=True)]
+            if dropped := [r.get("id") for r, a in kept if a >= self.max_attempts]:
+                logger.error(
+                    f"Dropping cases {dropped!r} after {self.max_attempts} failed appends"
+                )
+            kept = [(r, a) for r, a in kept if a < self.max_attempts]
+        self._rows[:0] = [r for r, _ in kept]
+        self._attempts[:0] = [a for _, a in kept]
+
+    async def start(self) -> None:
+        self._ensure_running()
+
+    async def stop(self) -> None:
+        """Stop the background flush loop and append the remaining cases."""
+        if self._task is not None:
+            # NOTE: Cancelling the loop could interrupt an append in flight and
+            # lose its cases. Let the loop finish its current flush instead.
+            self._stop_requested.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    def _ensure_running(self) -> None:
+        if self._task is None or self._task.done():
+            self._flush_lock = asyncio.Lock()
+            self._stop_requested = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while not self._stop_requested.is_set():
+            try:
+                await asyncio.wait_for(
+                    self._stop_requested.wait(), timeout=self.flush_interval
+                )
+            except TimeoutError:
+                if self._rows:
+                    await self.flush()
+
+
+async def run_periodic_compaction(
+    interval: float, run_blocking: BlockingRunner = asyncio.to_thread
+) -> None:
+    """Compact the cases table every `interval` seconds, until cancelled."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_blocking(compact_cases_table)
+        except Exception as e:
+            logger.error("Failed to compact cases table", exc_info=e)
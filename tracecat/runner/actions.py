@@ -36,8 +36,7 @@ from __future__ import annotations
 
 import asyncio
 import logging
-import random
-from collections.abc import Awaitable, Callable, Iterable
+from collections.abc import Awaitable, Callable, Iterable, Iterator, Mapping
 from datetime import UTC, datetime
 from enum import StrEnum, auto
 from typing import TYPE_CHECKING, Any, Literal, TypeVar
@@ -48,13 +47,18 @@ import tantivy
 from pydantic import BaseModel, Field, validator
 from tenacity import retry, stop_after_attempt, wait_exponential
 
-from tracecat.auth import AuthenticatedAPIClient
-from tracecat.config import HTTP_MAX_RETRIES
+from tracecat.config import (
+    HTTP_MAX_RETRIES,
+    TRACECAT__CASES_BUFFER_FLUSH_INTERVAL,
+    TRACECAT__CASES_BUFFER_MAX_ROWS,
+)
 from tracecat.contexts import ctx_session_role
-from tracecat.db import create_events_index, create_vdb_conn
+from tracecat.ingestion import CaseIngestionBuffer
 from tracecat.llm import DEFAULT_MODEL_TYPE, ModelType, async_openai_call
 from tracecat.logger import standard_logger
 from tracecat.runner.condition import ConditionRuleValidator, ConditionRuleVariant
+from tracecat.runner.events import event_indexer
+from tracecat.runner.executor import storage_executor
 from tracecat.runner.llm import (
     TaskFields,
     TaskFieldsSubclass,
@@ -67,24 +71,26 @@ from tracecat.runner.mail import (
     EmailNotFoundError,
     ResendMailProvider,
 )
-from tracecat.runner.templates import (
-    evaluate_templated_fields,
-    evaluate_templated_secrets,
-)
+from tracecat.runner.outbox import action_run_outbox
+from tracecat.runner.secrets import secret_cache
+from tracecat.runner.templates import TemplatePlan
+from tracecat.runner.tracker import DependencyFailedError
 from tracecat.types.actions import ActionType
-from tracecat.types.api import (
-    ActionRunResponse,
-    CreateActionRunParams,
-    RunStatus,
-    UpdateActionRunParams,
-)
+from tracecat.types.api import RunStatus, UpsertActionRunParams
 from tracecat.types.cases import Case
 
 if TYPE_CHECKING:
-    from tracecat.runner.workflows import Workflow
+    from tracecat.runner.workflows import Workflow, WorkflowRunContext
 
 logger = standard_logger(__name__)
 
+# Cases opened by action runs are appended to the cases table in batches
+case_buffer = CaseIngestionBuffer(
+    max_rows=TRACECAT__CASES_BUFFER_MAX_ROWS,
+    flush_interval=TRACECAT__CASES_BUFFER_FLUSH_INTERVAL,
+    run_blocking=storage_executor.run,
+)
+
 
 T = TypeVar("T", str, list[Any], dict[str, Any])
 
@@ -212,6 +218,11 @@ class Action(BaseModel):
         """The workflow-specific unique key of the action. This is the action slug."""
         return action_key_to_slug(self.key)
 
+    @property
+    def templated_fields(self) -> dict[str, Any]:
+        """The fields of the action that are passed to its runner and may be templated."""
+        return self.model_dump(exclude={"key", "type", "title", "tags"})
+
 
 class ActionRunResult(BaseModel):
     """The result of an action."""
@@ -321,7 +332,96 @@ ACTION_FACTORY: dict[str, type[Action]] = {
 }
 
 
-ActionTrail = dict[str, ActionRunResult]
+class ActionTrail(Mapping[str, ActionRunResult]):
+    """An immutable trail of the action run results that led to an action run.
+
+    The trail is a persistent structure: each node holds at most one result and
+    points to the trails of its upstream action runs. Extending or joining trails
+    never copies existing results, so a chain of N actions stores N results
+    instead of O(N^2). Lookups and iteration walk the ancestors, upstream first.
+    """
+
+    __slots__ = ("_ar_id", "_result", "_parents", "_size")
+
+    def __init__(
+        self,
+        ar_id: str | None = None,
+        result: ActionRunResult | None = None,
+        parents: tuple[ActionTrail, ...] = (),
+    ) -> None:
+        self._ar_id = ar_id
+        self._result = result
+        self._parents = parents
+        own = 1 if ar_id is not None else 0
+        if len(parents) <= 1:
+            self._size = own + sum(len(parent) for parent in parents)
+        else:
+            # Joined trails may share ancestors, so count the distinct results
+            self._size = sum(1 for _ in self._results())
+
+    @classmethod
+    def join(cls, trails: Iterable[ActionTrail]) -> ActionTrail:
+        """Combine the trails of multiple upstream action runs."""
+        parents = tuple(trails)
+        if len(parents) == 1:
+            return parents[0]
+        return cls(parents=parents)
+
+    def extend(self, ar_id: str, result: ActionRunResult) -> ActionTrail:
+        """Return a new trail with `result` appended to this trail."""
+        return ActionTrail(ar_id=ar_id, result=result, parents=(self,))
+
+    def _nodes(self) -> list[ActionTrail]:
+        """Return all nodes reachable from this node, ancestors first."""
+        visited: set[int] = set()
+        ordered: list[ActionTrail] = []
+        stack: list[tuple[ActionTrail, bool]] = [(self, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if expanded:
+                ordered.append(node)
+                continue
+            if id(node) in visited:
+                continue
+            visited.add(id(node))
+            stack.append((node, True))
+            stack.extend((parent, False) for parent in reversed(node._parents))
+        return ordered
+
+    def _results(self) -> Iterator[tuple[str, ActionRunResult]]:
+        """Yield the (action run ID, result) pairs of the trail in a single walk."""
+        for node in self._nodes():
+            if node._ar_id is not None:
+                yield node._ar_id, node._result
+
+    def __getitem__(self, ar_id: str) -> ActionRunResult:
+        if ar_id == self._ar_id:
+            return self._result
+        for node_ar_id, result in self._results():
+            if node_ar_id == ar_id:
+                return result
+        raise KeyError(ar_id)
+
+    def __iter__(self) -> Iterator[str]:
+        for ar_id, _ in self._results():
+            yield ar_id
+
+    def __len__(self) -> int:
+        return self._size
+
+    # NOTE: The `Mapping` mixins look up every key with `__getitem__`, which
+    # walks the trail each time. These walk it once.
+    def items(self) -> Iterator[tuple[str, ActionRunResult]]:
+        return self._results()
+
+    def values(self) -> Iterator[ActionRunResult]:
+        for _, result in self._results():
+            yield result
+
+    def __repr__(self) -> str:
+        return repr(dict(self._results()))
+
+
 ActionSubclass = (
     WebhookAction
     | HTTPRequestAction
@@ -334,30 +434,16 @@ ActionSubclass = (
 
 def _get_dependencies_results(
     dependencies: Iterable[str], action_result_store: dict[str, ActionTrail]
-) -> dict[str, ActionRunResult]:
+) -> ActionTrail:
     """Return a combined trail of the execution results of the dependencies.
 
     The keys are the action IDs and the values are the results of the actions.
+    The upstream trails are shared, not copied.
     """
-    combined_trail: dict[str, ActionRunResult] = {}
-    for dep in dependencies:
-        past_action_result = action_result_store[dep]
-        combined_trail |= past_action_result
-    return combined_trail
-
-
-async def _wait_for_dependencies(
-    upstream_deps_ar_ids: Iterable[str],
-    action_run_status_store: dict[str, ActionRunStatus],
-) -> None:
-    while not all(
-        action_run_status_store.get(ar_id) == ActionRunStatus.SUCCESS
-        for ar_id in upstream_deps_ar_ids
-    ):
-        await asyncio.sleep(random.uniform(0, 0.5))
+    return ActionTrail.join(action_result_store[dep] for dep in dependencies)
 
 
-def _index_events(
+async def _index_events(
     action_id: str,
     action_run_id: str,
     action_title: str,
@@ -367,9 +453,7 @@ def _index_events(
     workflow_run_id: str,
     action_trail: ActionTrail,
 ):
-    # Add trail to events store
-    writer = create_events_index().writer()
-    writer.add_document(
+    await event_indexer.put(
         tantivy.Document(
             action_id=action_id,
             action_run_id=action_run_id,
@@ -389,17 +473,14 @@ def _index_events(
 
 async def start_action_run(
     action_run: ActionRun,
-    # Shared data structures
-    workflow_ref: Workflow,
-    ready_jobs_queue: asyncio.Queue[ActionRun],
-    running_jobs_store: dict[str, asyncio.Task[None]],
-    action_result_store: dict[str, ActionTrail],
-    action_run_status_store: dict[str, ActionRunStatus],
+    # Execution state of the workflow run this action run belongs to
+    run_context: WorkflowRunContext,
     # Dynamic data
     pending_timeout: float | None = None,
     custom_logger: logging.Logger | None = None,
 ) -> None:
-    await log_create_action_run(action_run)
+    workflow_ref = run_context.workflow
+    log_create_action_run(action_run)
     ar_id = action_run.id
     action_key = action_run.action_key
     upstream_deps_ar_ids = action_run.upstream_dependencies(
@@ -414,18 +495,19 @@ async def start_action_run(
     # 1. Perform the action and its cleanup
     try:
         await asyncio.wait_for(
-            _wait_for_dependencies(upstream_deps_ar_ids, action_run_status_store),
-            timeout=pending_timeout,
+            run_context.dependency_tracker.wait(action_key), timeout=pending_timeout
         )
 
         action_trail = _get_dependencies_results(
-            upstream_deps_ar_ids, action_result_store
+            upstream_deps_ar_ids, run_context.action_result_store
         )
 
-        custom_logger.debug(f"Running action {ar_id!r}. Trail {action_trail.keys()}.")
-        action_run_status_store[ar_id] = ActionRunStatus.RUNNING
+        custom_logger.debug(
+            f"Running action {ar_id!r} with {len(action_trail)} upstream results."
+        )
+        run_context.action_run_status_store[ar_id] = ActionRunStatus.RUNNING
         action_ref = workflow_ref.actions[action_key]
-        await log_update_action_run(action_run, status="running")
+        log_update_action_run(action_run, status="running")
 
         # Every single 'run_xxx_action' function should return a dict
         # This dict always contains a key 'output' with the direct result of the action
@@ -440,25 +522,30 @@ async def start_action_run(
             custom_logger=custom_logger,
             action_trail=action_trail,
             action_run_kwargs=action_run.run_kwargs,
+            template_plan=workflow_ref.template_plans[action_key],
             **action_ref.model_dump(),
         )
 
-        # Mark the action as completed
-        action_run_status_store[action_run.id] = ActionRunStatus.SUCCESS
-
         # Store the result in the action result store.
         # Every action has its own result and the trail of actions that led to it.
         # The schema is {<action ID> : <action result>, ...}
-        action_trail = action_trail | {ar_id: result}
-        action_result_store[ar_id] = action_trail
-        custom_logger.debug(
-            f"Action run {ar_id!r} completed with trail: {action_trail}."
-        )
+        action_trail = action_trail.extend(ar_id, result)
+        run_context.action_result_store[ar_id] = action_trail
+        custom_logger.debug(f"Action run {ar_id!r} completed.")
+
+        # Mark the action as completed. This wakes up any downstream action
+        # whose last pending dependency was this action.
+        run_context.action_run_status_store[action_run.id] = ActionRunStatus.SUCCESS
+        run_context.dependency_tracker.mark_success(action_key)
 
     except TimeoutError:
         custom_logger.error(
             f"Action run {ar_id} timed out waiting for dependencies {upstream_deps_ar_ids}."
         )
+        run_status = "failure"
+    except DependencyFailedError as e:
+        custom_logger.warning(f"Action run {ar_id!r} will not run: {e}")
+        run_status = "canceled"
     except asyncio.CancelledError:
         custom_logger.warning(f"Action run {ar_id!r} was cancelled.")
         run_status = "canceled"
@@ -466,15 +553,14 @@ async def start_action_run(
         custom_logger.error(f"Action run {ar_id!r} failed with error: {e}.")
         run_status = "failure"
     finally:
-        if action_run_status_store[ar_id] != ActionRunStatus.SUCCESS:
+        if run_context.action_run_status_store[ar_id] != ActionRunStatus.SUCCESS:
             # Exception was raised before the action was marked as successful
-            action_run_status_store[ar_id] = ActionRunStatus.FAILURE
-
-        running_jobs_store.pop(ar_id, None)
+            run_context.action_run_status_store[ar_id] = ActionRunStatus.FAILURE
+            run_context.dependency_tracker.mark_failure(action_key)
 
     # Add trail to events store
     try:
-        _index_events(
+        await _index_events(
             action_id=action_ref.id,
             action_run_id=ar_id,
             action_title=action_ref.title,
@@ -487,13 +573,15 @@ async def start_action_run(
     except Exception as e:
         logger.error("Tantivy indexing failed.", exc_info=e)
 
-    await log_update_action_run(action_run, status=run_status)
+    log_update_action_run(action_run, status=run_status)
 
     # Handle downstream dependencies
     if run_status != "success":
         custom_logger.warning(f"Action run {ar_id!r} stopping due to failure.")
         return
-    custom_logger.debug(f"Remaining action runs: {running_jobs_store.keys()}")
+    custom_logger.debug(
+        f"Remaining action runs: {run_context.running_jobs_store.keys()}"
+    )
     if not result.should_continue:
         custom_logger.info(f"Action run {ar_id!r} stopping due to stop signal.")
         return
@@ -503,9 +591,9 @@ async def start_action_run(
         )
         # Broadcast the results to the next actions and enqueue them
         for next_ar_id in downstream_deps_ar_ids:
-            if next_ar_id not in action_run_status_store:
-                action_run_status_store[next_ar_id] = ActionRunStatus.QUEUED
-                ready_jobs_queue.put_nowait(
+            if next_ar_id not in run_context.action_run_status_store:
+                run_context.action_run_status_store[next_ar_id] = ActionRunStatus.QUEUED
+                run_context.enqueue(
                     ActionRun(
                         workflow_run_id=action_run.workflow_run_id,
                         action_key=parse_action_run_id(next_ar_id, "action_key"),
@@ -767,8 +855,6 @@ async def run_open_case_action(
     action_run_kwargs: dict[str, Any] | None = None,
     custom_logger: logging.Logger = logger,
 ) -> dict[str, str | dict[str, str] | None]:
-    db = create_vdb_conn()
-    tbl = db.open_table("cases")
     role = ctx_session_role.get()
     if role.user_id is None:
         raise ValueError(f"User ID not found in session context: {role}.")
@@ -786,7 +872,7 @@ async def run_open_case_action(
         suppression=suppression,
     )
     try:
-        tbl.add([case.flatten()])
+        await case_buffer.add([case])
     except Exception as e:
         custom_logger.error("Failed to add case to LanceDB.", exc_info=e)
         raise
@@ -799,9 +885,10 @@ async def run_action(
     workflow_id: str,
     key: str,
     title: str,
-    action_trail: dict[str, ActionRunResult],
+    action_trail: ActionTrail,
     tags: dict[str, Any] | None = None,
     action_run_kwargs: dict[str, Any] | None = None,
+    template_plan: TemplatePlan | None = None,
     custom_logger: logging.Logger = logger,
     **action_kwargs: Any,
 ) -> ActionRunResult:
@@ -836,11 +923,11 @@ async def run_action(
         result.action_slug: result.output for result in action_trail.values()
     }
     custom_logger.debug(f"Before template eval: {action_trail_json = }")
-    action_kwargs_with_secrets = await evaluate_templated_secrets(
-        templated_fields=action_kwargs
-    )
-    processed_action_kwargs = evaluate_templated_fields(
-        templated_fields=action_kwargs_with_secrets, source_data=action_trail_json
+    # The plan is normally compiled once per workflow, see `Workflow.template_plans`
+    template_plan = template_plan or TemplatePlan(action_kwargs)
+    secrets = await secret_cache.get_many(template_plan.secret_names)
+    processed_action_kwargs = template_plan.evaluate(
+        source_data=action_trail_json, secrets=secrets
     )
 
     # Only pass the action trail to the LLM action
@@ -886,35 +973,33 @@ _ACTION_RUNNER_FACTORY: dict[ActionType, _ActionRunner] = {
 }
 
 
-# TODO: Move these calls into a logger
-async def log_create_action_run(action_run: ActionRun) -> ActionRunResponse:
-    """Create a workflow run."""
+def log_create_action_run(action_run: ActionRun) -> None:
+    """Create an action run.
+
+    The API is notified asynchronously through the action run outbox.
+    """
     logger.info(f"Log create action run {action_run.id}")
-    action_id = action_key_to_id(action_run.action_key)
-    params = CreateActionRunParams(
-        action_run_id=action_run.id,
-        workflow_run_id=action_run.workflow_run_id,
-    )
-    async with AuthenticatedAPIClient(http2=True) as client:
-        response = await client.post(
-            f"/actions/{action_id}/runs", json=params.model_dump()
+    action_run_outbox.put(
+        UpsertActionRunParams(
+            action_id=action_key_to_id(action_run.action_key),
+            action_run_id=action_run.id,
+            workflow_run_id=action_run.workflow_run_id,
+            status="pending",
         )
-        response.raise_for_status()
-    return ActionRunResponse.model_validate(response.json())
+    )
+
 
+def log_update_action_run(action_run: ActionRun, *, status: RunStatus) -> None:
+    """Update an action run.
 
-async def log_update_action_run(action_run: ActionRun, *, status: RunStatus) -> None:
-    """Update a workflow run."""
+    The API is notified asynchronously through the action run outbox.
+    """
     logger.info(f"Log update action run {action_run.id} with status {status}.")
-    action_id = action_key_to_id(action_run.action_key)
-    params = UpdateActionRunParams(status=status)
-    async with AuthenticatedAPIClient(http2=True) as client:
-        response = await client.post(
-            f"/actions/{action_id}/runs/{action_run.id}",
-            json=params.model_dump(),
+    action_run_outbox.put(
+        UpsertActionRunParams(
+            action_id=action_key_to_id(action_run.action_key),
+            action_run_id=action_run.id,
+            workflow_run_id=action_run.workflow_run_id,
+            status=status,
         )
-        if response.status_code != 204:
-            logger.error(
-                f"Failed to update action run {action_run.id} in workflow run "
-                f"{action_run.workflow_run_id} with status {status}"
-            )
+    )
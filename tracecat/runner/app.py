@@ -25,6 +25,7 @@ Stores
 ------
 - We need to store the state of the workflow run.
 - The current implementation uses in-memory kv stores to manage execution state.
+- Each workflow run owns its own queue and stores (see `WorkflowRunContext`), which are dropped when the run ends.
 - We can use distributed kv stores / databases to manage state across multiple runners to scale the backend.
 - Note that ActionRuns need to be identified across workflow runs - we use a combination of the workflow id and the action id to do this.
 
@@ -33,9 +34,12 @@ Stores
 from __future__ import annotations
 
 import asyncio
+from contextlib import asynccontextmanager
 from enum import StrEnum, auto
+from pathlib import Path
 from typing import Annotated, Any
 
+import httpx
 from fastapi import (
     BackgroundTasks,
     Depends,
@@ -48,17 +52,37 @@ from fastapi.datastructures import FormData
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import ORJSONResponse
 
-from tracecat.auth import AuthenticatedAPIClient, Role, authenticate_service
-from tracecat.config import TRACECAT__API_URL, TRACECAT__APP_ENV
+from tracecat.auth import Role, authenticate_service
+from tracecat.config import (
+    TRACECAT__API_URL,
+    TRACECAT__APP_ENV,
+    TRACECAT__RUNNER_RESULTS_MAX_BYTES,
+    TRACECAT__RUNNER_RESULTS_SPILL_PATH,
+    TRACECAT__RUNNER_RESULTS_TTL,
+    TRACECAT__RUNNER_WORKFLOW_CACHE_MAX_SIZE,
+    TRACECAT__RUNNER_WORKFLOW_CACHE_TTL,
+)
 from tracecat.contexts import ctx_session_role, ctx_workflow
 from tracecat.logger import standard_logger
 from tracecat.runner.actions import (
     ActionRun,
     ActionRunStatus,
-    ActionTrail,
+    case_buffer,
     start_action_run,
 )
-from tracecat.runner.workflows import Workflow, create_workflow_run, update_workflow_run
+from tracecat.runner.cache import WorkflowCache
+from tracecat.runner.client import api_client_lifespan
+from tracecat.runner.events import event_indexer
+from tracecat.runner.executor import storage_executor
+from tracecat.runner.outbox import action_run_outbox
+from tracecat.runner.retention import RunResultStore
+from tracecat.runner.secrets import secret_cache
+from tracecat.runner.webhooks import webhook_table
+from tracecat.runner.workflows import (
+    WorkflowRunContext,
+    create_workflow_run,
+    update_workflow_run,
+)
 from tracecat.types.api import (
     AuthenticateWebhookResponse,
     RunStatus,
@@ -70,7 +94,30 @@ from tracecat.types.api import (
 logger = standard_logger(__name__)
 
 
-app = FastAPI(debug=True, default_response_class=ORJSONResponse)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    async with api_client_lifespan():
+        await action_run_outbox.start()
+        await event_indexer.start()
+        await case_buffer.start()
+        await run_result_store.start()
+        await webhook_table.warm()
+        try:
+            yield
+        finally:
+            global runner_status
+            runner_status = RunnerStatus.SHUTTING_DOWN
+            # Wake up workflow runs waiting for their next action run
+            for run_context in workflow_run_contexts.values():
+                run_context.cancel()
+            await case_buffer.stop()
+            await event_indexer.stop()
+            storage_executor.shutdown()
+            # Report remaining action run statuses before the client is closed
+            await action_run_outbox.stop()
+
+
+app = FastAPI(debug=True, default_response_class=ORJSONResponse, lifespan=lifespan)
 
 if TRACECAT__APP_ENV == "prod":
     # NOTE: If you are using Tracecat self-hosted
@@ -107,38 +154,42 @@ runner_status: RunnerStatus = RunnerStatus.RUNNING
 
 
 # Dynamic data
-action_result_store: dict[str, ActionTrail] = {}
-action_run_status_store: dict[str, ActionRunStatus] = {}
-ready_jobs_queue: asyncio.Queue[ActionRun] = asyncio.Queue()
-running_jobs_store: dict[str, asyncio.Task[None]] = {}
+# Workflow run ID -> execution state of the active workflow run
+workflow_run_contexts: dict[str, WorkflowRunContext] = {}
+# Results of finished workflow runs, bounded by TTL and size
+run_result_store = RunResultStore(
+    ttl=TRACECAT__RUNNER_RESULTS_TTL,
+    max_bytes=TRACECAT__RUNNER_RESULTS_MAX_BYTES,
+    spill_path=Path(TRACECAT__RUNNER_RESULTS_SPILL_PATH)
+    if TRACECAT__RUNNER_RESULTS_SPILL_PATH
+    else None,
+    run_blocking=storage_executor.run,
+)
+
+# Compiled workflows, shared by all runs of the same workflow version
+workflow_cache = WorkflowCache(
+    ttl=TRACECAT__RUNNER_WORKFLOW_CACHE_TTL,
+    max_size=TRACECAT__RUNNER_WORKFLOW_CACHE_MAX_SIZE,
+)
 
 
 async def get_workflow(workflow_id: str) -> WorkflowResponse:
-    try:
-        role = ctx_session_role.get()
-        async with AuthenticatedAPIClient(role=role, http2=True) as client:
-            response = await client.get(f"/workflows/{workflow_id}")
-            response.raise_for_status()
-    except HTTPException as e:
-        logger.error(e.detail)
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="An error occurred while fetching the workflow.",
-        ) from e
-    data = response.json()
-    return WorkflowResponse.model_validate(data)
+    cached_workflow = await workflow_cache.get(workflow_id)
+    return cached_workflow.response
 
 
 # Dependencies
 async def valid_workflow(workflow_id: str) -> str:
     """Check if a workflow exists."""
-    async with AuthenticatedAPIClient(http2=True) as client:
-        response = await client.get(f"/workflows/{workflow_id}")
-        if response.status_code == status.HTTP_404_NOT_FOUND:
+    try:
+        await workflow_cache.get(workflow_id)
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == status.HTTP_404_NOT_FOUND:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Workflow {workflow_id} not found.",
-            )
+            ) from e
+        raise
     return workflow_id
 
 
@@ -153,6 +204,20 @@ def check_health() -> dict[str, str]:
     return {"message": "Hello world. I am the runner. This is the health endpoint."}
 
 
+@app.get("/metrics")
+def get_metrics() -> dict[str, int]:
+    """Return the size of the runner's in-memory execution state."""
+    return {
+        "active_workflow_runs": len(workflow_run_contexts),
+        "cached_workflows": len(workflow_cache),
+        "webhook_routes": len(webhook_table),
+        "queued_events": event_indexer.queue_depth,
+        "buffered_cases": case_buffer.size,
+        **storage_executor.metrics(),
+        **run_result_store.metrics(),
+    }
+
+
 async def valid_payload(request: Request) -> dict[str, Any] | FormData:
     """Validate the payload of a request."""
     payload: dict[str, Any] | FormData
@@ -174,19 +239,16 @@ async def valid_webhook_request(path: str, secret: str) -> AuthenticateWebhookRe
 
     Steps
     -----
-    1. Lookup the secret in the database
-    2. If the secret is not found, return a 404.
+    1. Lookup the path in the webhook routing table, or the API if missing
+    2. If the webhook is not found, return a 404.
+    3. If the secret doesn't match, return a 401.
     """
-    # Change this to make a db call
-    async with AuthenticatedAPIClient(
-        role=Role(type="service", service_id="tracecat-runner"), http2=True
-    ) as client:
-        response = await client.post(
-            f"{TRACECAT__API_URL}/authenticate/webhooks/{path}/{secret}"
+    auth_response = await webhook_table.authenticate(path, secret)
+    if auth_response is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Webhook not found.",
         )
-        response.raise_for_status()
-
-    auth_response = AuthenticateWebhookResponse.model_validate(response.json())
     if auth_response.status == "Unauthorized":
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -298,6 +360,54 @@ async def start_workflow(
     )
 
 
+@app.post("/workflows/{workflow_id}/invalidate", status_code=status.HTTP_204_NO_CONTENT)
+def invalidate_workflow(
+    role: Annotated[Role, Depends(authenticate_service)],
+    workflow_id: str,
+) -> None:
+    """Drop the cached compiled workflow and its webhook routes.
+
+    Called by the API when a workflow, its actions or its webhooks change.
+    """
+    workflow_cache.invalidate(workflow_id)
+    webhook_table.invalidate_workflow(workflow_id)
+
+
+@app.post(
+    "/workflows/{workflow_id}/runs/{workflow_run_id}/cancel",
+    status_code=status.HTTP_204_NO_CONTENT,
+)
+def cancel_workflow_run(
+    role: Annotated[Role, Depends(authenticate_service)],
+    workflow_id: str,
+    workflow_run_id: str,
+) -> None:
+    """Cancel a running workflow run. Its running action runs are cancelled."""
+    run_context = workflow_run_contexts.get(workflow_run_id)
+    if run_context is None or run_context.workflow.owner_id != role.user_id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Workflow run {workflow_run_id} not found.",
+        )
+    run_context.cancel()
+
+
+@app.get("/workflows/{workflow_id}/runs/{workflow_run_id}/results")
+def get_workflow_run_results(
+    role: Annotated[Role, Depends(authenticate_service)],
+    workflow_id: str,
+    workflow_run_id: str,
+) -> dict[str, Any]:
+    """Return the action results of a finished workflow run, if still retained."""
+    results = run_result_store.get(workflow_run_id, owner_id=role.user_id)
+    if results is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Results of workflow run {workflow_run_id} not found.",
+        )
+    return results
+
+
 async def run_workflow(
     workflow_id: str,
     workflow_run_id: str,
@@ -334,13 +444,14 @@ async def run_workflow(
     - The `start_workflow` function can then just directly enqueue the first action.
     """
     run_logger = standard_logger(f"wfr-{workflow_run_id}")
-    workflow_response = await get_workflow(workflow_id)
-    workflow = Workflow.from_response(workflow_response)
+    cached_workflow = await workflow_cache.get(workflow_id)
+    workflow = cached_workflow.workflow
     logger.info(f"Set workflow context for user {workflow.owner_id}")
     ctx_workflow.set(workflow)
+    run_context = WorkflowRunContext(workflow=workflow, workflow_run_id=workflow_run_id)
 
     # Initial state
-    ready_jobs_queue.put_nowait(
+    run_context.enqueue(
         ActionRun(
             workflow_run_id=workflow_run_id,
             run_kwargs=entrypoint_payload,
@@ -349,24 +460,25 @@ async def run_workflow(
     )
 
     run_status: RunStatus = "success"
-
-    await update_workflow_run(
-        workflow_id=workflow_id,
-        workflow_run_id=workflow_run_id,
-        status="running",
-    )
     try:
-        while (
-            not ready_jobs_queue.empty() or running_jobs_store
-        ) and runner_status == RunnerStatus.RUNNING:
-            try:
-                action_run = await asyncio.wait_for(ready_jobs_queue.get(), timeout=3)
-            except TimeoutError:
-                continue
+        # NOTE: Registered inside the try, so the context is always dropped
+        workflow_run_contexts[workflow_run_id] = run_context
+        await update_workflow_run(
+            workflow_id=workflow_id,
+            workflow_run_id=workflow_run_id,
+            status="running",
+        )
+        # Load all secrets the workflow run needs in one request
+        await secret_cache.prefetch(workflow.secret_names)
+        while runner_status == RunnerStatus.RUNNING:
+            action_run = await run_context.next_action_run()
+            if action_run is None:
+                # No ready or running action runs left, or cancelled
+                break
             # Defensive: Deduplicate tasks
             if (
-                action_run.id in running_jobs_store
-                or action_run.id in action_result_store
+                action_run.id in run_context.running_jobs_store
+                or action_run.id in run_context.action_result_store
             ):
                 run_logger.debug(
                     f"Action {action_run.id!r} already running or completed. Skipping."
@@ -376,21 +488,22 @@ async def run_workflow(
             run_logger.info(
                 f"{workflow.actions[action_run.action_key].__class__.__name__} {action_run.id!r} ready. Running."
             )
-            action_run_status_store[action_run.id] = ActionRunStatus.PENDING
+            run_context.action_run_status_store[action_run.id] = ActionRunStatus.PENDING
             # Schedule a new action run
-            running_jobs_store[action_run.id] = asyncio.create_task(
+            task = asyncio.create_task(
                 start_action_run(
                     action_run=action_run,
-                    workflow_ref=workflow,
-                    ready_jobs_queue=ready_jobs_queue,
-                    running_jobs_store=running_jobs_store,
-                    action_result_store=action_result_store,
-                    action_run_status_store=action_run_status_store,
+                    run_context=run_context,
                     custom_logger=run_logger,
                 )
             )
+            run_context.add_running_job(action_run.id, task)
 
-        run_logger.info("Workflow completed.")
+        if run_context.cancelled or runner_status != RunnerStatus.RUNNING:
+            run_logger.warning("Workflow was canceled.")
+            run_status = "canceled"
+        else:
+            run_logger.info("Workflow completed.")
     except asyncio.CancelledError:
         run_logger.warning("Workflow was canceled.")
         run_status = "canceled"
@@ -399,8 +512,18 @@ async def run_workflow(
         run_status = "failure"
     finally:
         run_logger.info("Shutting down running tasks")
-        for running_task in running_jobs_store.values():
+        for running_task in list(run_context.running_jobs_store.values()):
             running_task.cancel()
+        workflow_run_contexts.pop(workflow_run_id, None)
+        # Only keep each action's own result, the trail is derived from the graph
+        await run_result_store.put(
+            workflow_run_id,
+            owner_id=workflow.owner_id,
+            results={
+                ar_id: trail[ar_id].model_dump()
+                for ar_id, trail in run_context.action_result_store.items()
+            },
+        )
 
     # TODO: Update this to update with status 'failure' if any action fails
     await update_workflow_run(
@@ -0,0 +1,139 @@
+"""Cache of compiled workflows in the runner.
+
+Starting a workflow run used to fetch the workflow from the API (often more than
+once) and compile it: build the adjacency list, validate every action and
+compile its templates. Webhook bursts against the same workflow repeated all of
+this for every event.
+
+Design
+------
+- Compiled workflows are cached per (owner, workflow ID), as the API only
+  returns a user's own workflows.
+- Entries are fresh for `ttl` seconds. After that, the workflow is fetched
+  again, but only recompiled if its content hash changed.
+- The API invalidates a workflow's entries when the workflow or its actions
+  change, so edits take effect immediately. The TTL is a fallback.
+- Concurrent requests for the same uncached workflow share a single fetch.
+- The cache holds at most `max_size` entries, evicting the least recently used.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+
+from tracecat.contexts import ctx_session_role
+from tracecat.logger import standard_logger
+from tracecat.runner.client import get_api_client
+from tracecat.runner.workflows import Workflow
+from tracecat.types.api import WorkflowResponse
+
+logger = standard_logger(__name__)
+
+# (Owner ID, workflow ID)
+_CacheKey = tuple[str | None, str]
+
+
+class CachedWorkflow:
+    """A workflow as returned by the API, and its compiled runner counterpart."""
+
+    __slots__ = ("response", "workflow", "content_hash", "expires_at")
+
+    def __init__(
+        self,
+        response: WorkflowResponse,
+        workflow: Workflow,
+        content_hash: str,
+        expires_at: float,
+    ) -> None:
+        self.response = response
+        self.workflow = workflow
+        self.content_hash = content_hash
+        self.expires_at = expires_at
+
+
+class WorkflowCache:
+    """Caches compiled workflows by owner, workflow ID and content hash."""
+
+    def __init__(self, *, ttl: float, max_size: int) -> None:
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: OrderedDict[_CacheKey, CachedWorkflow] = OrderedDict()
+        self._inflight: dict[_CacheKey, asyncio.Task[CachedWorkflow]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, workflow_id: str) -> CachedWorkflow:
+        """Return the workflow of the current session role's user.
+
+        Raises
+        ------
+        httpx.HTTPStatusError
+            If the workflow could not be fetched from the API.
+        """
+        role = ctx_session_role.get()
+        key = (role.user_id if role is not None else None, workflow_id)
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at > time.monotonic():
+            self._entries.move_to_end(key)
+            return entry
+
+        task = self._inflight.get(key)
+        if task is None:
+            # NOTE: The task copies the current context, so the fetch is made
+            # on behalf of the current session role.
+            task = asyncio.create_task(self._load(key, stale=entry))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._discard_inflight(key, t))
+        # Don't cancel the shared fetch if one of its waiters is cancelled
+        return await asyncio.shield(task)
+
+    def invalidate(self, workflow_id: str) -> None:
+        """Drop all cached entries and pending fetches of a workflow."""
+        for key in [k for k in self._entries if k[1] == workflow_id]:
+            del self._entries[key]
+        for key in [k for k in self._inflight if k[1] == workflow_id]:
+            # The fetch may have started before the change. Let it finish for
+            # its waiters, but don't cache its result.
+            del self._inflight[key]
+        logger.debug(f"Invalidated workflow {workflow_id!r}")
+
+    async def _load(
+        self, key: _CacheKey, stale: CachedWorkflow | None
+    ) -> CachedWorkflow:
+        workflow_id = key[1]
+        client = get_api_client()
+        response = await client.get(f"/workflows/{workflow_id}")
+        response.raise_for_status()
+        content_hash = hashlib.sha256(response.content).hexdigest()
+        expires_at = time.monotonic() + self.ttl
+
+        if stale is not None and stale.content_hash == content_hash:
+            logger.debug(
+                f"Workflow {workflow_id!r} unchanged, reusing compiled workflow"
+            )
+            entry = CachedWorkflow(
+                stale.response, stale.workflow, content_hash, expires_at
+            )
+        else:
+            logger.debug(f"Compiling workflow {workflow_id!r}")
+            workflow_response = WorkflowResponse.model_validate_json(response.content)
+            # NOTE: Compiling consumes the action inputs, so compile from a copy
+            workflow = Workflow.from_response(workflow_response.model_copy(deep=True))
+            entry = CachedWorkflow(
+                workflow_response, workflow, content_hash, expires_at
+            )
+
+        if self._inflight.get(key) is asyncio.current_task():
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return entry
+
+    def _discard_inflight(self, key: _CacheKey, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
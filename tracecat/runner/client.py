@@ -0,0 +1,104 @@
+"""Shared API client for the runner.
+
+The runner makes several bookkeeping calls to the API for every action run.
+Instead of opening a new connection per call, all calls go through a single
+long-lived, connection-pooled HTTP/2 client that is opened and closed with the
+runner app's lifespan.
+
+The role is injected per request from the session role context, so one client
+(and one connection pool) serves all users' workflow runs.
+"""
+
+from __future__ import annotations
+
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+import httpx
+
+from tracecat.auth import AuthenticatedAPIClient, Role, get_service_role_headers
+from tracecat.config import (
+    TRACECAT__RUNNER_API_KEEPALIVE_EXPIRY,
+    TRACECAT__RUNNER_API_MAX_CONNECTIONS,
+    TRACECAT__RUNNER_API_MAX_KEEPALIVE_CONNECTIONS,
+)
+from tracecat.contexts import ctx_session_role
+from tracecat.logger import standard_logger
+
+logger = standard_logger(__name__)
+
+RUNNER_ROLE = Role(type="service", service_id="tracecat-runner")
+
+
+class SharedAPIClient(AuthenticatedAPIClient):
+    """An authenticated API client that takes its role from the context per request.
+
+    Role precedence
+    ---------------
+    1. Role set in the session role context at request time
+    2. Role passed to the client
+    """
+
+    def build_request(self, *args, **kwargs) -> httpx.Request:
+        request = super().build_request(*args, **kwargs)
+        role = ctx_session_role.get()
+        if role is not None:
+            request.headers.update(get_service_role_headers(role))
+            if not role.user_id:
+                request.headers.pop("Service-User-ID", None)
+        return request
+
+
+_api_client: SharedAPIClient | None = None
+
+
+def _create_api_client() -> SharedAPIClient:
+    return SharedAPIClient(
+        role=RUNNER_ROLE,
+        http2=True,
+        limits=httpx.Limits(
+            max_connections=TRACECAT__RUNNER_API_MAX_CONNECTIONS,
+            max_keepalive_connections=TRACECAT__RUNNER_API_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=TRACECAT__RUNNER_API_KEEPALIVE_EXPIRY,
+        ),
+    )
+
+
+def get_api_client() -> SharedAPIClient:
+    """Return the runner's shared API client.
+
+    The client is normally opened by `api_client_lifespan`. If it isn't (e.g. when
+    calling runner functions outside of the app), it is created on first use.
+    """
+    global _api_client
+    if _api_client is None or _api_client.is_closed:
+        _api_client = _create_api_client()
+    return _api_client
+
+
+@asynccontextmanager
+async def api_client_lifespan() -> AsyncIterator[SharedAPIClient]:
+    """Open the shared API client for the lifetime of the runner."""
+    global _api_client
+    _api_client = _create_api_client()
+    logger.info("Opened shared API client")
+    try:
+        yield _api_client
+    finally:
+        await _api_client.aclose()
+        _api_client = None
+        logger.info("Closed shared API client")
+
+
+def is_transient_error(e: Exception) -> bool:
+    """Whether a failed API call may succeed if retried.
+
+    Transport errors (e.g. timeouts, connection errors) and server errors are
+    transient. Client errors, e.g. validation errors, fail again on retry.
+    """
+    if isinstance(e, httpx.TransportError):
+        return True
+    if isinstance(e, httpx.HTTPStatusError):
+        code = e.response.status_code
+        return code >= 500 or code == httpx.codes.TOO_MANY_REQUESTS
+    return False
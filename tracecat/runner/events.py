@@ -0,0 +1,168 @@
+"""Background indexing of action run events.
+
+Opening the events index and creating an index writer is expensive: the writer
+allocates its heap and takes the index lock. Doing this for every action run
+caps indexing throughput, and documents only become searchable once they are
+committed.
+
+Design
+------
+- Long-lived index writers are owned by the indexer's background task.
+- Documents are put on a bounded queue. Producers wait when the queue is full.
+- Queued documents are added and committed in batches: as soon as
+  `batch_size` documents are queued, or `commit_interval` seconds after the
+  first document of a batch arrived, whichever comes first.
+- Writing and committing run on the storage executor, so they don't block the loop.
+- The events index is partitioned by the day events were published on (UTC).
+  Each search only opens the partitions of the days it covers, and old events
+  are deleted by dropping whole partitions.
+- Writers are kept for the latest two partitions, so late events of the
+  previous day don't reopen its partition. Opening a new day's partition
+  releases older writers and drops the partitions older than `retention_days`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import defaultdict
+from datetime import UTC, date, datetime, timedelta
+
+import tantivy
+
+from tracecat.config import (
+    TRACECAT__EVENTS_RETENTION_DAYS,
+    TRACECAT__RUNNER_EVENTS_BATCH_SIZE,
+    TRACECAT__RUNNER_EVENTS_COMMIT_INTERVAL,
+    TRACECAT__RUNNER_EVENTS_QUEUE_SIZE,
+)
+from tracecat.db import build_events_index, create_events_index, drop_events_partitions
+from tracecat.logger import standard_logger
+from tracecat.runner.executor import storage_executor
+
+logger = standard_logger(__name__)
+
+# Sentinel to stop the indexer after the documents queued before it
+_STOP = object()
+
+
+class EventIndexer:
+    """Indexes events in batches through one index writer per partition."""
+
+    def __init__(
+        self,
+        *,
+        batch_size: int,
+        commit_interval: float,
+        queue_size: int,
+        retention_days: int,
+    ) -> None:
+        self.batch_size = batch_size
+        self.commit_interval = commit_interval
+        self.queue_size = queue_size
+        self.retention_days = retention_days
+        self._queue: asyncio.Queue[tantivy.Document | object] | None = None
+        # Index writers by partition day
+        self._writers: dict[date, tantivy.IndexWriter] = {}
+        self._task: asyncio.Task[None] | None = None
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of documents waiting to be indexed."""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def put(self, document: tantivy.Document) -> None:
+        """Queue a document for indexing. Waits if the queue is full."""
+        if self._task is None:
+            raise RuntimeError("Event indexer is not running")
+        await self._queue.put(document)
+
+    async def start(self) -> None:
+        # NOTE: The index is normally built by the API. Building it is a no-op
+        # if it already exists.
+        build_events_index()
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._task = asyncio.create_task(self._run())
+        logger.info("Started event indexer")
+
+    async def stop(self) -> None:
+        """Index the remaining documents and release the index writer."""
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        await self._queue.put(_STOP)
+        await task
+        await storage_executor.run(self._close_writers, None)
+        logger.info("Stopped event indexer")
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch = []
+            document = await self._queue.get()
+            deadline = time.monotonic() + self.commit_interval
+            while True:
+                if document is _STOP:
+                    stopping = True
+                    break
+                batch.append(document)
+                timeout = deadline - time.monotonic()
+                if len(batch) >= self.batch_size or timeout <= 0:
+                    break
+                try:
+                    document = await asyncio.wait_for(self._queue.get(), timeout)
+                except TimeoutError:
+                    break
+            try:
+                await self._write(batch)
+            except Exception as e:
+                logger.error(f"Failed to index {len(batch)} events", exc_info=e)
+
+    async def _write(self, batch: list[tantivy.Document]) -> None:
+        if batch:
+            await storage_executor.run(self._add_and_commit, batch)
+
+    def _add_and_commit(self, batch: list[tantivy.Document]) -> None:
+        partitions: defaultdict[date, list[tantivy.Document]] = defaultdict(list)
+        for document in batch:
+            partitions[_partition_day(document)].append(document)
+        for day, documents in partitions.items():
+            writer = self._get_writer(day)
+            for document in documents:
+                writer.add_document(document)
+            writer.commit()
+        logger.debug(f"Indexed {len(batch)} events")
+
+    def _get_writer(self, day: date) -> tantivy.IndexWriter:
+        if (writer := self._writers.get(day)) is not None:
+            return writer
+        writer = self._writers[day] = create_events_index(day).writer()
+        if day == max(self._writers):
+            self._close_writers(older_than=day - timedelta(days=1))
+            dropped = drop_events_partitions(
+                older_than=day - timedelta(days=self.retention_days)
+            )
+            if dropped:
+                logger.info(f"Dropped {len(dropped)} expired event index partitions")
+        return writer
+
+    def _close_writers(self, older_than: date | None) -> None:
+        """Release the writers of the partitions before `older_than`, or all."""
+        for day in list(self._writers):
+            if older_than is None or day < older_than:
+                self._writers.pop(day).wait_merging_threads()
+
+
+def _partition_day(document: tantivy.Document) -> date:
+    published_at: datetime | None = document.get_first("published_at")
+    if published_at is None:
+        return datetime.now(UTC).date()
+    return published_at.astimezone(UTC).date()
+
+
+event_indexer = EventIndexer(
+    batch_size=TRACECAT__RUNNER_EVENTS_BATCH_SIZE,
+    commit_interval=TRACECAT__RUNNER_EVENTS_COMMIT_INTERVAL,
+    queue_size=TRACECAT__RUNNER_EVENTS_QUEUE_SIZE,
+    retention_days=TRACECAT__EVENTS_RETENTION_DAYS,
+)
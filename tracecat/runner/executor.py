@@ -0,0 +1,115 @@
+"""Thread pool for blocking storage I/O in the runner.
+
+Tantivy and LanceDB calls are synchronous and disk-bound. Running them directly
+in a coroutine stalls every other action run in the process. Instead, they are
+run on a dedicated, bounded thread pool.
+
+Design
+------
+- At most `max_workers` storage calls run at the same time.
+- At most `max_pending` storage calls are submitted to the pool (running or
+  queued). Further callers wait before submitting, which pushes back on the
+  action runs producing the load instead of growing the queue without bound.
+- `metrics()` reports how many calls are running, queued in the pool, and
+  waiting to be submitted.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, TypeVar
+
+from tracecat.config import (
+    TRACECAT__RUNNER_STORAGE_MAX_PENDING,
+    TRACECAT__RUNNER_STORAGE_MAX_WORKERS,
+)
+from tracecat.logger import standard_logger
+
+logger = standard_logger(__name__)
+
+T = TypeVar("T")
+
+
+class StorageExecutor:
+    """A bounded thread pool executor with backpressure for storage calls."""
+
+    def __init__(self, *, name: str, max_workers: int, max_pending: int) -> None:
+        self.name = name
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor: ThreadPoolExecutor | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self._slots_loop: asyncio.AbstractEventLoop | None = None
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._submitted = 0
+        self._active = 0
+
+    def metrics(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                f"{self.name}_active": self._active,
+                f"{self.name}_queued": max(self._submitted - self._active, 0),
+                f"{self.name}_waiting": self._waiting,
+            }
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run a blocking function on the pool. Waits while the pool is saturated."""
+        slots = self._get_slots()
+        self._waiting += 1
+        try:
+            await slots.acquire()
+        finally:
+            self._waiting -= 1
+        try:
+            with self._lock:
+                self._submitted += 1
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._get_executor(), partial(self._call, fn, *args, **kwargs)
+            )
+        finally:
+            with self._lock:
+                self._submitted -= 1
+            slots.release()
+
+    def shutdown(self) -> None:
+        """Wait for the running calls to finish and release the threads."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def _call(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        with self._lock:
+            self._active += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._active -= 1
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix=f"tracecat-{self.name}"
+            )
+        return self._executor
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        # Semaphores are bound to the event loop they are first used in
+        loop = asyncio.get_running_loop()
+        if self._slots_loop is not loop:
+            self._slots = asyncio.Semaphore(self.max_pending)
+            self._slots_loop = loop
+        return self._slots
+
+
+storage_executor = StorageExecutor(
+    name="storage",
+    max_workers=TRACECAT__RUNNER_STORAGE_MAX_WORKERS,
+    max_pending=TRACECAT__RUNNER_STORAGE_MAX_PENDING,
+)
@@ -25,9 +25,9 @@ class TaskFields(BaseModel):
 
     @classmethod
     def from_dict(cls, data: dict[str, Any]) -> TaskFields:
-        task_type = data.pop("type")
-        task_field_cls = TASK_FIELDS_FACTORY[task_type]
-        return task_field_cls(**data)
+        # NOTE: Don't mutate `data`, it may be shared by a cached template plan
+        task_field_cls = TASK_FIELDS_FACTORY[data["type"]]
+        return task_field_cls.model_validate(data)
 
 
 class TranslateTaskFields(TaskFields):
@@ -0,0 +1,186 @@
+"""Asynchronous reporting of action run statuses to the API.
+
+Every action run changes status several times (pending, running, success...).
+Reporting each change with its own request puts two blocking round trips on the
+critical path of every action run. Instead, status changes are put into an
+outbox and reported in the background.
+
+Design
+------
+- Status changes are coalesced per action run: only the latest status is sent.
+- Pending changes are grouped by the role they were made under, because the API
+  uses the role to determine the owner of the action run.
+- The outbox is flushed to `POST /runs/batch` when it holds `max_batch_size`
+  changes, or every `flush_interval` seconds, whichever comes first.
+- Changes that fail to be reported with a transient error (transport or server
+  errors) are kept for the next flush, unless they have been superseded by a
+  newer status in the meantime. They are dropped after `max_attempts` failed
+  reports, so a change the API keeps rejecting doesn't block later ones.
+- Changes rejected by the API with a client error are dropped, as they would
+  be rejected again.
+"""
+
+from __future__ import annotations
+
+import asyncio
+
+from tracecat.auth import Role
+from tracecat.config import (
+    TRACECAT__RUNNER_OUTBOX_FLUSH_INTERVAL,
+    TRACECAT__RUNNER_OUTBOX_MAX_ATTEMPTS,
+    TRACECAT__RUNNER_OUTBOX_MAX_BATCH_SIZE,
+)
+from tracecat.contexts import ctx_session_role
+from tracecat.logger import standard_logger
+from tracecat.runner.client import RUNNER_ROLE, get_api_client, is_transient_error
+from tracecat.types.api import BatchUpsertActionRunsParams, UpsertActionRunParams
+
+logger = standard_logger(__name__)
+
+# (Service ID, User ID) of the role the status changes were made under
+_RoleKey = tuple[str | None, str | None]
+
+
+class ActionRunOutbox:
+    """Coalesces action run status changes and reports them to the API in batches."""
+
+    def __init__(
+        self,
+        *,
+        flush_interval: float,
+        max_batch_size: int,
+        max_attempts: int = TRACECAT__RUNNER_OUTBOX_MAX_ATTEMPTS,
+    ) -> None:
+        self.flush_interval = flush_interval
+        self.max_batch_size = max_batch_size
+        self.max_attempts = max_attempts
+        self._pending: dict[_RoleKey, dict[str, UpsertActionRunParams]] = {}
+        # (Role, action run ID) -> Number of failed reports of the pending change
+        self._attempts: dict[tuple[_RoleKey, str], int] = {}
+        self._size = 0
+        self._flush_requested: asyncio.Event | None = None
+        self._stopping = False
+        self._task: asyncio.Task[None] | None = None
+
+    @property
+    def size(self) -> int:
+        """Number of status changes waiting to be reported."""
+        return self._size
+
+    def put(self, params: UpsertActionRunParams) -> None:
+        """Queue a status change of an action run under the current session role."""
+        role = ctx_session_role.get() or RUNNER_ROLE
+        self._add((role.service_id, role.user_id), params)
+        self._ensure_running()
+        if self._size >= self.max_batch_size:
+            self._flush_requested.set()
+
+    async def flush(self) -> None:
+        """Report all pending status changes to the API."""
+        pending, self._pending, self._size = self._pending, {}, 0
+        for role_key, changes in pending.items():
+            service_id, user_id = role_key
+            role = Role(type="service", service_id=service_id, user_id=user_id)
+            params = BatchUpsertActionRunsParams(action_runs=list(changes.values()))
+            token = ctx_session_role.set(role)
+            try:
+                response = await get_api_client().post(
+                    "/runs/batch", json=params.model_dump()
+                )
+                response.raise_for_status()
+                for ar_id in changes:
+                    self._attempts.pop((role_key, ar_id), None)
+            except Exception as e:
+                self._retry(role_key, changes, e)
+            finally:
+                ctx_session_role.reset(token)
+
+    def _retry(
+        self,
+        role_key: _RoleKey,
+        changes: dict[str, UpsertActionRunParams],
+        error: Exception,
+    ) -> None:
+        """Keep failed changes for the next flush, or drop them if they can't succeed."""
+        if not is_transient_error(error):
+            logger.error(
+                f"Failed to report action run statuses {list(changes)!r}. Dropping.",
+                exc_info=error,
+            )
+            for ar_id in changes:
+                self._attempts.pop((role_key, ar_id), None)
+            return
+
+        dropped: list[str] = []
+        for ar_id, change in changes.items():
+            key = (role_key, ar_id)
+            if ar_id in self._pending.get(role_key, {}):
+                continue  # Superseded by a newer status
+            attempts = self._attempts.get(key, 0) + 1
+            if attempts >= self.max_attempts:
+                self._attempts.pop(key, None)
+                dropped.append(ar_id)
+                continue
+            self._attempts[key] = attempts
+            self._add(role_key, change, overwrite=False)
+        logger.error(
+            f"Failed to report {len(changes)} action run statuses. Retrying.",
+            exc_info=error,
+        )
+        if dropped:
+            logger.error(
+                f"Dropping action run statuses {dropped!r} after"
+                f" {self.max_attempts} failed reports."
+            )
+
+    async def start(self) -> None:
+        self._ensure_running()
+
+    async def stop(self) -> None:
+        """Stop the background flush loop and report the remaining changes."""
+        if self._task is not None:
+            # NOTE: Cancelling the loop could interrupt a flush in flight and
+            # lose its changes. Let the loop finish its current flush instead.
+            self._stopping = True
+            self._flush_requested.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    def _add(
+        self, role_key: _RoleKey, params: UpsertActionRunParams, overwrite: bool = True
+    ) -> None:
+        changes = self._pending.setdefault(role_key, {})
+        if params.action_run_id in changes:
+            if not overwrite:
+                return
+        else:
+            self._size += 1
+        if overwrite:
+            # A new status is reported afresh
+            self._attempts.pop((role_key, params.action_run_id), None)
+        changes[params.action_run_id] = params
+
+    def _ensure_running(self) -> None:
+        if self._task is None or self._task.done():
+            self._flush_requested = asyncio.Event()
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(
+                    self._flush_requested.wait(), timeout=self.flush_interval
+                )
+            except TimeoutError:
+                pass
+            self._flush_requested.clear()
+            if self._size:
+                await self.flush()
+
+
+action_run_outbox = ActionRunOutbox(
+    flush_interval=TRACECAT__RUNNER_OUTBOX_FLUSH_INTERVAL,
+    max_batch_size=TRACECAT__RUNNER_OUTBOX_MAX_BATCH_SIZE,
+)
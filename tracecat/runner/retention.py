@@ -0,0 +1,191 @@
+"""Bounded retention of finished workflow run results.
+
+Action results of a workflow run are only needed while the run executes.
+After the run finishes, we keep its results around for a while so they can be
+inspected, but we must not keep them forever: long-lived runners would otherwise
+grow without bound.
+
+Eviction
+--------
+- TTL: Results of a finished run are dropped `ttl` seconds after the run finished.
+- Size: Results are kept in an LRU ordered by last access. When the total size of
+  the retained results exceeds `max_bytes`, the least recently used runs are evicted.
+- Spill: If a spill directory is configured, runs evicted for size are written
+  to disk instead of being dropped. Spilled runs are still subject to the TTL.
+  Spill files are written and deleted outside of the event loop, by
+  `run_blocking`. Runs are only tracked in memory, so `start()` deletes the
+  spill files left by a previous process.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+from typing import Any
+
+import orjson
+
+from tracecat.logger import standard_logger
+
+logger = standard_logger(__name__)
+
+# Runs a blocking function outside of the event loop
+BlockingRunner = Callable[..., Awaitable[Any]]
+
+
+class _RetainedRun:
+    __slots__ = ("owner_id", "data", "finished_at")
+
+    def __init__(self, owner_id: str, data: bytes, finished_at: float) -> None:
+        self.owner_id = owner_id
+        self.data = data
+        self.finished_at = finished_at
+
+
+class RunResultStore:
+    """Retains the serialized action results of finished workflow runs."""
+
+    def __init__(
+        self,
+        *,
+        ttl: float,
+        max_bytes: int,
+        spill_path: Path | None = None,
+        run_blocking: BlockingRunner = asyncio.to_thread,
+    ) -> None:
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.spill_path = spill_path
+        self.run_blocking = run_blocking
+        self._runs: OrderedDict[str, _RetainedRun] = OrderedDict()
+        self._size_bytes = 0
+        # Workflow run ID -> (owner ID, finished at) of runs spilled to disk
+        self._spilled: dict[str, tuple[str, float]] = {}
+        # Workflow run ID -> results of spilled runs still being written
+        self._spilling: dict[str, bytes] = {}
+        if self.spill_path is not None:
+            self.spill_path.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def size_bytes(self) -> int:
+        """Total size of the results held in memory."""
+        return self._size_bytes
+
+    def metrics(self) -> dict[str, int]:
+        self.evict_expired()
+        return {
+            "retained_runs": len(self._runs),
+            "retained_bytes": self._size_bytes,
+            "spilled_runs": len(self._spilled),
+        }
+
+    async def start(self) -> None:
+        """Delete the spill files left by a previous process."""
+        if self.spill_path is not None:
+            await self.run_blocking(self._clear_spill_path)
+
+    async def put(
+        self, workflow_run_id: str, owner_id: str, results: dict[str, Any]
+    ) -> None:
+        """Retain the results of a finished workflow run."""
+        stale_files = self._pop_expired()
+        if (stale_file := self._pop(workflow_run_id)) is not None:
+            stale_files.append(stale_file)
+        data = orjson.dumps(results, default=str)
+        self._runs[workflow_run_id] = _RetainedRun(
+            owner_id=owner_id, data=data, finished_at=time.monotonic()
+        )
+        self._size_bytes += len(data)
+        spills = self._pop_oversized()
+        if not stale_files and not spills:
+            return
+        failed = await self.run_blocking(self._write_spills, spills, stale_files)
+        for spilled_id in spills:
+            self._spilling.pop(spilled_id, None)
+        for failed_id in failed:
+            self._spilled.pop(failed_id, None)
+
+    def get(self, workflow_run_id: str, owner_id: str) -> dict[str, Any] | None:
+        """Return the results of a finished workflow run, or None if not retained."""
+        self.evict_expired()
+        if (run := self._runs.get(workflow_run_id)) is not None:
+            if run.owner_id != owner_id:
+                return None
+            self._runs.move_to_end(workflow_run_id)
+            return orjson.loads(run.data)
+        if (spilled := self._spilled.get(workflow_run_id)) is not None:
+            if spilled[0] != owner_id:
+                return None
+            if (data := self._spilling.get(workflow_run_id)) is not None:
+                return orjson.loads(data)
+            try:
+                return orjson.loads(self._spill_file(workflow_run_id).read_bytes())
+            except FileNotFoundError:
+                self._spilled.pop(workflow_run_id, None)
+        return None
+
+    def evict_expired(self) -> None:
+        """Drop all runs, in memory or spilled, that finished more than `ttl` ago."""
+        for path in self._pop_expired():
+            path.unlink(missing_ok=True)
+
+    def _pop_expired(self) -> list[Path]:
+        """Drop expired runs and return their spill files, to be deleted."""
+        cutoff = time.monotonic() - self.ttl
+        expired = [k for k, run in self._runs.items() if run.finished_at < cutoff]
+        expired.extend(k for k, (_, t) in self._spilled.items() if t < cutoff)
+        return [path for k in expired if (path := self._pop(k)) is not None]
+
+    def _pop_oversized(self) -> dict[str, bytes]:
+        """Evict the least recently used runs until the store fits `max_bytes`.
+
+        Returns the results of the runs to spill, by workflow run ID.
+        """
+        spills: dict[str, bytes] = {}
+        while self._size_bytes > self.max_bytes and self._runs:
+            workflow_run_id, run = self._runs.popitem(last=False)
+            self._size_bytes -= len(run.data)
+            if self.spill_path is None:
+                logger.debug(f"Evicted results of workflow run {workflow_run_id!r}")
+                continue
+            self._spilled[workflow_run_id] = (run.owner_id, run.finished_at)
+            self._spilling[workflow_run_id] = run.data
+            spills[workflow_run_id] = run.data
+        return spills
+
+    def _write_spills(
+        self, spills: dict[str, bytes], stale_files: list[Path]
+    ) -> list[str]:
+        """Write spilled runs and delete stale spill files. Returns the failed spills."""
+        for path in stale_files:
+            path.unlink(missing_ok=True)
+        failed: list[str] = []
+        for workflow_run_id, data in spills.items():
+            try:
+                self._spill_file(workflow_run_id).write_bytes(data)
+            except OSError as e:
+                logger.error(
+                    f"Failed to spill results of workflow run {workflow_run_id!r}",
+                    exc_info=e,
+                )
+                failed.append(workflow_run_id)
+        return failed
+
+    def _clear_spill_path(self) -> None:
+        for path in self.spill_path.glob("*.json"):
+            path.unlink(missing_ok=True)
+
+    def _pop(self, workflow_run_id: str) -> Path | None:
+        """Drop a run. Returns its spill file, to be deleted, if it was spilled."""
+        if (run := self._runs.pop(workflow_run_id, None)) is not None:
+            self._size_bytes -= len(run.data)
+        self._spilling.pop(workflow_run_id, None)
+        if self._spilled.pop(workflow_run_id, None) is not None:
+            return self._spill_file(workflow_run_id)
+        return None
+
+    def _spill_file(self, workflow_run_id: str) -> Path:
+        return self.spill_path / f"{workflow_run_id}.json"
@@ -0,0 +1,115 @@
+"""Prefetching and caching of secrets in the runner.
+
+Secrets referenced by a workflow's templates are known as soon as the workflow
+is compiled. Instead of loading each `{{ SECRETS.x }}` occurrence with its own
+request, the runner fetches all of a workflow run's secrets in one call to
+`POST /secrets/search` when the run starts, and serves them from memory while
+the run executes.
+
+Design
+------
+- Secrets are cached per owner: a workflow run can only read the secrets of the
+  user it runs on behalf of.
+- Cached secrets expire `ttl` seconds after they were fetched. They are only
+  held in memory, so they never outlive the runner process.
+- Secrets that are missing from the cache are fetched in a single request.
+"""
+
+from __future__ import annotations
+
+import time
+from collections.abc import Iterable
+
+from pydantic import TypeAdapter
+
+from tracecat.config import TRACECAT__RUNNER_SECRETS_TTL
+from tracecat.contexts import ctx_session_role
+from tracecat.db import Secret
+from tracecat.logger import standard_logger
+from tracecat.runner.client import get_api_client
+from tracecat.types.api import SearchSecretsParams
+
+logger = standard_logger(__name__)
+
+_SECRETS_ADAPTER = TypeAdapter(list[Secret])
+
+
+class SecretCache:
+    """A short-lived, per-owner cache of decrypted secrets."""
+
+    def __init__(self, *, ttl: float) -> None:
+        self.ttl = ttl
+        # (Owner ID, secret name) -> (secret value, expires at)
+        self._secrets: dict[tuple[str | None, str], tuple[str, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._secrets)
+
+    async def get_many(self, secret_names: Iterable[str]) -> dict[str, str]:
+        """Return the values of the given secrets of the current session role's user.
+
+        Raises
+        ------
+        ValueError
+            If any of the secrets doesn't exist or couldn't be loaded.
+        """
+        owner_id = _current_owner_id()
+        now = time.monotonic()
+        secrets: dict[str, str] = {}
+        missing: list[str] = []
+        for name in set(secret_names):
+            cached = self._secrets.get((owner_id, name))
+            if cached is not None and cached[1] > now:
+                secrets[name] = cached[0]
+            else:
+                missing.append(name)
+
+        if missing:
+            fetched = await self._fetch(missing)
+            expires_at = time.monotonic() + self.ttl
+            for name, value in fetched.items():
+                self._secrets[(owner_id, name)] = (value, expires_at)
+            secrets.update(fetched)
+            if not_found := set(missing) - fetched.keys():
+                raise ValueError(f"Secrets {sorted(not_found)!r} could not be loaded.")
+        return secrets
+
+    async def prefetch(self, secret_names: Iterable[str]) -> None:
+        """Load the given secrets into the cache. Errors are logged, not raised.
+
+        Secrets that fail to load are retried, and fail, in the action runs that
+        use them.
+        """
+        try:
+            await self.get_many(secret_names)
+        except ValueError as e:
+            logger.warning(f"Failed to prefetch secrets: {e}")
+
+    def evict_expired(self) -> None:
+        now = time.monotonic()
+        expired = [k for k, (_, t) in self._secrets.items() if t <= now]
+        for key in expired:
+            del self._secrets[key]
+
+    async def _fetch(self, secret_names: list[str]) -> dict[str, str]:
+        """Fetch and decrypt secrets by name in a single request."""
+        self.evict_expired()
+        logger.debug(f"Fetching {len(secret_names)} secrets")
+        params = SearchSecretsParams(names=secret_names)
+        try:
+            client = get_api_client()
+            response = await client.post("/secrets/search", json=params.model_dump())
+            response.raise_for_status()
+            secrets = _SECRETS_ADAPTER.validate_json(response.content)
+            return {secret.name: secret.key for secret in secrets}  # Decrypt values
+        except Exception as e:
+            logger.error(f"Failed to fetch secrets {secret_names!r}", exc_info=e)
+            raise ValueError(f"Secrets {secret_names!r} could not be loaded.") from e
+
+
+def _current_owner_id() -> str | None:
+    role = ctx_session_role.get()
+    return role.user_id if role is not None else None
+
+
+secret_cache = SecretCache(ttl=TRACECAT__RUNNER_SECRETS_TTL)
@@ -1,16 +1,11 @@
-import asyncio
 import re
-from collections.abc import Awaitable, Callable
-from functools import partial
-from typing import Any, TypeVar
+from functools import lru_cache
+from typing import Any
 
-import httpx
 import jsonpath_ng
+from jsonpath_ng import JSONPath
 from jsonpath_ng.exceptions import JsonPathParserError
 
-from tracecat.auth import AuthenticatedAPIClient
-from tracecat.contexts import ctx_session_role
-from tracecat.db import Secret
 from tracecat.logger import standard_logger
 
 logger = standard_logger(__name__)
@@ -18,35 +13,22 @@ logger = standard_logger(__name__)
 JSONPATH_TEMPLATE_PATTERN = re.compile(r"{{\s*(?P<jsonpath>.*?)\s*}}")
 SECRET_TEMPLATE_PATTERN = re.compile(r"{{\s*SECRETS\.(?P<secret_name>.*?)\s*}}")
 
-T = TypeVar("T", str, list[Any], dict[str, Any])
 
+@lru_cache(maxsize=1024)
+def _parse_jsonpath(jsonpath: str) -> JSONPath:
+    """Parse a jsonpath expression.
 
-def _evaluate_jsonpath_str(
-    match: re.Match[str],
-    action_trail: dict[str, Any],
-    regex_group: str = "jsonpath",
-) -> str:
-    """Replacement function to be used with re.sub().
-
-    Note
-    ----
-    This function only gets called when there's a match, i.e. match is not None.
-    This means we don't have to deal with the case where there are no templates.
-
-    Cases
-    -----
-    1. Input was just a plan string. Return the original string.
-    2. Input was a jsonpath. Return the value found in the action trail.
-
+    Parsing is expensive, so parsed expressions are cached by expression string.
     """
-
-    jsonpath = match.group(regex_group)
-    logger.debug(f"{"*"*10} Evaluating jsonpath {jsonpath} {"*"*10}")
     try:
-        jsonpath_expr = jsonpath_ng.parse(jsonpath)
+        return jsonpath_ng.parse(jsonpath)
     except JsonPathParserError as e:
         raise ValueError(f"Invalid jsonpath {jsonpath!r}.") from e
-    logger.debug(f"{jsonpath_expr = }")
+
+
+def _find_jsonpath(
+    jsonpath_expr: JSONPath, jsonpath: str, action_trail: dict[str, Any]
+) -> str:
     matches = [found.value for found in jsonpath_expr.find(action_trail)]
     if len(matches) == 1:
         logger.debug(f"Match found for {jsonpath}: {matches[0]}.")
@@ -62,149 +44,191 @@ def _evaluate_jsonpath_str(
         )
 
 
-def _evaluate_templated_dict(
-    obj: dict[str, T], operator: Callable[[re.Match[str]], str]
-) -> dict[str, T]:
-    return {
-        _evaluate_nested_templates_rec(k, operator): _evaluate_nested_templates_rec(
-            v, operator
+### Compiled templates
+
+
+class _JsonPathSegment:
+    __slots__ = ("jsonpath", "jsonpath_expr")
+
+    def __init__(self, jsonpath: str) -> None:
+        self.jsonpath = jsonpath
+        # NOTE: Invalid jsonpaths don't fail compilation, only the evaluation.
+        # This way, they only fail the action run that uses them.
+        try:
+            self.jsonpath_expr: JSONPath | None = _parse_jsonpath(jsonpath)
+        except ValueError:
+            self.jsonpath_expr = None
+
+    def evaluate(self, source_data: dict[str, Any]) -> str:
+        if self.jsonpath_expr is None:
+            raise ValueError(f"Invalid jsonpath {self.jsonpath!r}.")
+        return _find_jsonpath(self.jsonpath_expr, self.jsonpath, source_data)
+
+
+class _SecretSegment:
+    __slots__ = ("secret_name",)
+
+    def __init__(self, secret_name: str) -> None:
+        self.secret_name = secret_name
+
+
+class CompiledTemplate:
+    """A templated string split into literal, jsonpath and secret segments.
+
+    Evaluating a compiled template only looks up the values of its segments and
+    joins them, the string is never scanned again.
+    """
+
+    __slots__ = ("template", "segments", "secret_names")
+
+    def __init__(self, template: str) -> None:
+        self.template = template
+        self.segments: list[str | _JsonPathSegment | _SecretSegment] = []
+        pos = 0
+        for match in JSONPATH_TEMPLATE_PATTERN.finditer(template):
+            if match.start() > pos:
+                self.segments.append(template[pos : match.start()])
+            if secret_match := SECRET_TEMPLATE_PATTERN.fullmatch(match.group()):
+                self.segments.append(_SecretSegment(secret_match.group("secret_name")))
+            else:
+                self.segments.append(_JsonPathSegment(match.group("jsonpath")))
+            pos = match.end()
+        if pos < len(template):
+            self.segments.append(template[pos:])
+        self.secret_names = frozenset(
+            seg.secret_name for seg in self.segments if isinstance(seg, _SecretSegment)
         )
-        for k, v in obj.items()
-    }
-
-
-def _evaluate_nested_templates_rec(
-    obj: T,
-    operator: Callable[[re.Match[str]], str],
-) -> T:
-    """Process jsonpaths in strings, lists, and dictionaries."""
-    match obj:
-        case str():
-            # Matches anything in {{ ... }}
-            return operator(obj)
-        case list():
-            return [_evaluate_nested_templates_rec(item, operator) for item in obj]
-        case dict():
-            return _evaluate_templated_dict(obj, operator)
-        case _:
-            return obj
-
-
-def evaluate_templated_fields(
-    *,
-    templated_fields: dict[str, Any],
-    source_data: dict[str, Any],
-    template_pattern: re.Pattern[str] = JSONPATH_TEMPLATE_PATTERN,
-) -> dict[str, Any]:
-    """Populate templated fields with actual values."""
-
-    jsonpath_str_evaluator = partial(_evaluate_jsonpath_str, action_trail=source_data)
-
-    def operator(obj: T) -> str:
-        return template_pattern.sub(jsonpath_str_evaluator, obj)
-
-    logger.debug(f"{"*"*10} Evaluating templated fields {"*"*10}")
-    processed_kwargs = _evaluate_templated_dict(templated_fields, operator)
-    return processed_kwargs
-
-
-async def _load_secret(secret_name: str) -> str:
-    """Load a secret on behalf of the current workflow run."""
-    try:
-        # NOTE(perf): We can frontload these requests before starting
-        # the workflow, then look up the encrypted secrets in a local cache.
-        role = ctx_session_role.get()
-
-        async with AuthenticatedAPIClient(role=role, http2=True) as client:
-            response = await client.get(f"/secrets/{secret_name}")
-            response.raise_for_status()
-        secret = Secret.model_validate_json(response.content)
-        return secret.key  # Decrypt secret value
-    except httpx.HTTPStatusError as e:
-        msg = f"Error loading {secret_name!r}. {response.text}"
-        logger.error(msg)
-        raise ValueError(msg) from e
-    except ValueError as e:
-        msg = f"Could not parse secret response for {secret_name!r}."
-        logger.error(msg)
-        raise ValueError(msg) from e
-    except Exception as e:
-        logger.error(e)
-        raise ValueError(f"Secret {secret_name!r} could not be loaded.") from e
-
-
-async def _evaluate_secret_str(
-    templated_str: str,
-    *,
-    template_pattern: re.Pattern[str] = SECRET_TEMPLATE_PATTERN,
-    regex_group: str = "secret_name",
-    secret_getter: Awaitable[str, str] = _load_secret,
-) -> str:
-    """2 pass: 1. Compute all the secret values 2. Substitute the secret value."""
-
-    # NOTE: Need to call a funciton repl to evaluate multiple appearances
-    matches = [
-        match.group(regex_group) for match in template_pattern.finditer(templated_str)
-    ]
-    logger.debug(f"{"*"*10} Evaluating secrets {"*"*10}")
-    tasks = [secret_getter(m) for m in matches]
-    secret_values = await asyncio.gather(*tasks)
-    replacement_map = dict(zip(matches, secret_values, strict=True))
-
-    def evaluator(match: re.Match[str]) -> str:
-        key = match.group(regex_group)
-        return replacement_map[key]
-
-    replaced_str = template_pattern.sub(evaluator, templated_str)
-
-    return replaced_str
-
-
-async def _async_evaluate_dict(
-    obj: dict[str, T], operator: Awaitable[re.Match[str], str]
-) -> dict[str, T]:
-    """Parallelize the evaluation of the keys and values of a dictionary."""
-    task_dict = {}
-    async with asyncio.TaskGroup() as tg:
-        for k, v in obj.items():
-            key_task = tg.create_task(_async_evaluate_nested_templates_rec(k, operator))
-            value_task = tg.create_task(
-                _async_evaluate_nested_templates_rec(v, operator)
-            )
-            task_dict[key_task] = value_task
-    # At this point, all the tasks have completed. Safe to call result on all.
-    return {k.result(): v.result() for k, v in task_dict.items()}
-
-
-async def _async_evaluate_nested_templates_rec(
-    obj: T,
-    operator: Awaitable[re.Match[str], str],
-) -> T:
-    """Process jsonpaths in strings, lists, and dictionaries."""
-    match obj:
-        case str():
-            # Matches anything in {{ ... }}
-            return await operator(obj)
-        case list():
-            tasks = [
-                _async_evaluate_nested_templates_rec(item, operator) for item in obj
-            ]
-            return await asyncio.gather(*tasks)
-        case dict():
-            return await _async_evaluate_dict(obj, operator)
-        case _:
-            return obj
-
-
-async def evaluate_templated_secrets(
-    *,
-    templated_fields: dict[str, Any],
-    template_pattern: re.Pattern[str] = SECRET_TEMPLATE_PATTERN,
-) -> dict[str, Any]:
-    """Populate templated secrets with actual values."""
-
-    operator = partial(_evaluate_secret_str, template_pattern=template_pattern)
-
-    logger.debug(f"{"*"*10} Evaluating templated secrets {"*"*10}")
-    processed_kwargs = await _async_evaluate_dict(templated_fields, operator)
-    return processed_kwargs
+
+    def __repr__(self) -> str:
+        return f"CompiledTemplate({self.template!r})"
+
+    def evaluate(self, source_data: dict[str, Any], secrets: dict[str, str]) -> str:
+        parts: list[str] = []
+        for seg in self.segments:
+            if isinstance(seg, str):
+                parts.append(seg)
+            elif isinstance(seg, _SecretSegment):
+                parts.append(secrets[seg.secret_name])
+            else:
+                parts.append(seg.evaluate(source_data))
+        return "".join(parts)
+
+
+@lru_cache(maxsize=4096)
+def compile_template(template: str) -> CompiledTemplate | str:
+    """Compile a string. Strings without templates are returned as is."""
+    if JSONPATH_TEMPLATE_PATTERN.search(template) is None:
+        return template
+    return CompiledTemplate(template)
+
+
+class _ListNode:
+    """A list with templates, and the indices of its templated items."""
+
+    __slots__ = ("obj", "templated")
+
+    def __init__(self, obj: list[Any], templated: list[tuple[int, Any]]) -> None:
+        self.obj = obj
+        self.templated = templated
+
+
+class _DictNode:
+    """A dict with templates, and the keys of its templated items."""
+
+    __slots__ = ("obj", "templated", "has_templated_keys")
+
+    def __init__(self, obj: dict[str, Any], templated: list[tuple[Any, Any]]) -> None:
+        self.obj = obj
+        # (Compiled key, compiled value) of the items with templates
+        self.templated = templated
+        self.has_templated_keys = any(not isinstance(k, str) for k, _ in self.templated)
+
+
+def _is_templated(node: Any) -> bool:
+    return isinstance(node, CompiledTemplate | _ListNode | _DictNode)
+
+
+class TemplatePlan:
+    """The templated fields of an action, compiled once and evaluated many times.
+
+    The plan is an index of where the templates are in the fields. Templated
+    strings (keys and values) are compiled into `CompiledTemplate`s and all the
+    secrets they reference are collected, so evaluating the plan needs neither
+    regex scans nor jsonpath parses.
+
+    Only the templated leaves and the containers on the path to them are copied
+    on evaluation. Subtrees without templates are shared by reference between
+    evaluations, so the evaluated fields must be treated as read-only.
+    """
+
+    __slots__ = ("_root", "secret_names")
+
+    def __init__(self, templated_fields: dict[str, Any]) -> None:
+        secret_names: set[str] = set()
+        root = self._compile(templated_fields, secret_names)
+        # NOTE: The top level dict is always copied, because callers add to it
+        self._root = root if _is_templated(root) else _DictNode(templated_fields, [])
+        self.secret_names = frozenset(secret_names)
+
+    @classmethod
+    def _compile(cls, obj: Any, secret_names: set[str]) -> Any:
+        """Compile an object. Objects without templates are returned as is."""
+        match obj:
+            case str():
+                compiled = compile_template(obj)
+                if isinstance(compiled, CompiledTemplate):
+                    secret_names.update(compiled.secret_names)
+                return compiled
+            case list():
+                templated = []
+                for i, item in enumerate(obj):
+                    node = cls._compile(item, secret_names)
+                    if _is_templated(node):
+                        templated.append((i, node))
+                return _ListNode(obj, templated) if templated else obj
+            case dict():
+                templated = []
+                for k, v in obj.items():
+                    key_node = cls._compile(k, secret_names)
+                    value_node = cls._compile(v, secret_names)
+                    if _is_templated(key_node) or _is_templated(value_node):
+                        templated.append((key_node, value_node))
+                return _DictNode(obj, templated) if templated else obj
+            case _:
+                return obj
+
+    @classmethod
+    def _evaluate(
+        cls, node: Any, source_data: dict[str, Any], secrets: dict[str, str]
+    ) -> Any:
+        match node:
+            case CompiledTemplate():
+                return node.evaluate(source_data, secrets)
+            case _ListNode():
+                result = node.obj.copy()
+                for i, item in node.templated:
+                    result[i] = cls._evaluate(item, source_data, secrets)
+                return result
+            case _DictNode() if node.has_templated_keys:
+                # Rebuild the dict to keep the order of the keys
+                evaluated = {
+                    (k if isinstance(k, str) else k.template): (
+                        cls._evaluate(k, source_data, secrets),
+                        cls._evaluate(v, source_data, secrets),
+                    )
+                    for k, v in node.templated
+                }
+                return dict(evaluated.get(k, (k, v)) for k, v in node.obj.items())
+            case _DictNode():
+                result = node.obj.copy()
+                for k, v in node.templated:
+                    result[k] = cls._evaluate(v, source_data, secrets)
+                return result
+            case _:
+                return node
+
+    def evaluate(
+        self, *, source_data: dict[str, Any], secrets: dict[str, str]
+    ) -> dict[str, Any]:
+        """Populate the templated fields with secrets and values from the source data."""
+        return self._evaluate(self._root, source_data, secrets)
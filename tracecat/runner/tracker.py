@@ -0,0 +1,92 @@
+"""Dependency tracking for action runs within a workflow run.
+
+Design
+------
+- Each action in the workflow graph has an in-degree counter: the number of upstream
+  actions that have yet to complete successfully.
+- Each action also has an `asyncio.Event` that is set exactly once, when the action
+  can no longer be blocked: either its counter reached zero, or one of its (transitive)
+  upstream actions failed.
+- A downstream action waits on its event instead of polling the status store,
+  so it is woken up as soon as its last upstream action completes.
+
+Failure propagation
+-------------------
+- An action can only run if all of its upstream actions succeed.
+- If an action fails, none of its descendants can ever run. We mark all of them as
+  failed and wake their waiters, so they fail fast instead of waiting indefinitely.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from collections.abc import Iterable, Mapping
+
+
+class DependencyFailedError(Exception):
+    """Raised when an upstream dependency of an action run has failed."""
+
+
+class DependencyTracker:
+    """Tracks the readiness of actions in a single workflow run.
+
+    All keys are action keys. A tracker must not be shared across workflow runs.
+    """
+
+    def __init__(
+        self,
+        adj_list: Mapping[str, Iterable[str]],
+        action_dependencies: Mapping[str, Iterable[str]],
+    ) -> None:
+        self._adj_list = {k: tuple(v) for k, v in adj_list.items()}
+        self._remaining = {k: len(set(v)) for k, v in action_dependencies.items()}
+        self._ready = {k: asyncio.Event() for k in self._remaining}
+        self._completed: set[str] = set()
+        self._failed: dict[str, str] = {}  # Action key -> failed upstream action key
+        for action_key, remaining in self._remaining.items():
+            if remaining == 0:
+                self._ready[action_key].set()
+
+    def is_ready(self, action_key: str) -> bool:
+        return self._ready[action_key].is_set()
+
+    async def wait(self, action_key: str) -> None:
+        """Wait until all upstream actions of `action_key` have succeeded.
+
+        Raises
+        ------
+        DependencyFailedError
+            If any of the upstream actions failed.
+        """
+        await self._ready[action_key].wait()
+        if (failed_key := self._failed.get(action_key)) is not None:
+            raise DependencyFailedError(
+                f"Upstream action {failed_key!r} of {action_key!r} failed."
+            )
+
+    def mark_success(self, action_key: str) -> None:
+        """Decrement the in-degree of all downstream actions and wake the ready ones."""
+        if action_key in self._completed:
+            return
+        self._completed.add(action_key)
+        for downstream_key in self._adj_list.get(action_key, ()):
+            if downstream_key in self._failed:
+                continue
+            self._remaining[downstream_key] -= 1
+            if self._remaining[downstream_key] == 0:
+                self._ready[downstream_key].set()
+
+    def mark_failure(self, action_key: str) -> None:
+        """Fail all descendants of `action_key` and wake their waiters."""
+        if action_key in self._completed:
+            return
+        self._completed.add(action_key)
+        queue = deque(self._adj_list.get(action_key, ()))
+        while queue:
+            downstream_key = queue.popleft()
+            if downstream_key in self._failed or downstream_key in self._completed:
+                continue
+            self._failed[downstream_key] = action_key
+            self._ready[downstream_key].set()
+            queue.extend(self._adj_list.get(downstream_key, ()))
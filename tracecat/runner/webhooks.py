@@ -0,0 +1,217 @@
+"""Routing table of webhooks in the runner.
+
+Every webhook request used to be authenticated with a call to the API, which
+looked up the webhook and its action in two queries and recomputed the
+webhook's secret hash. Bursts of events against the same webhook repeated all
+of this for every event.
+
+Design
+------
+- The runner holds a table of all webhook routes: path -> secret hash, owner,
+  action and workflow. It is loaded in one call to `GET /authenticate/webhooks`
+  at startup.
+- Once the table is older than `ttl` seconds, it is reloaded in the background.
+  Requests keep being served from the current table meanwhile. Concurrent
+  reloads share a single fetch. If a reload fails, the current routes are kept
+  until the next one.
+- Secrets are compared in constant time.
+- The API invalidates a workflow's routes when the workflow, its actions or its
+  webhooks change, so deleted webhooks stop working immediately. Invalidation
+  also marks the table for a reload.
+- While the table is up to date, paths missing from it are rejected without
+  calling the API. Between an invalidation and the next reload, or if the
+  table couldn't be loaded, missing paths are authenticated by the API, e.g.
+  for webhooks created in the meantime. Matching routes are cached, and paths
+  the API doesn't know are remembered for `miss_ttl` seconds.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hmac
+import time
+from collections import OrderedDict
+
+import httpx
+from pydantic import TypeAdapter
+
+from tracecat.config import (
+    TRACECAT__RUNNER_WEBHOOKS_MISS_TTL,
+    TRACECAT__RUNNER_WEBHOOKS_TTL,
+)
+from tracecat.logger import standard_logger
+from tracecat.runner.client import get_api_client
+from tracecat.types.api import AuthenticateWebhookResponse, WebhookRoute
+
+logger = standard_logger(__name__)
+
+_ROUTES_ADAPTER = TypeAdapter(list[WebhookRoute])
+# Bounds the memory used to remember unknown paths
+_MAX_MISSES = 10_000
+
+
+class WebhookTable:
+    """An in-memory table of webhook routes, keyed by path."""
+
+    def __init__(self, *, ttl: float, miss_ttl: float) -> None:
+        self.ttl = ttl
+        self.miss_ttl = miss_ttl
+        self._routes: dict[str, WebhookRoute] = {}
+        self._expires_at = 0.0
+        self._refresh_task: asyncio.Task[None] | None = None
+        self._background_task: asyncio.Task[None] | None = None
+        # Incremented on every invalidation. Workflow ID -> generation at which
+        # the workflow's routes were last invalidated.
+        self._generation = 0
+        self._invalidated: dict[str, int] = {}
+        # Generation at which the current table was fetched, if it was loaded
+        self._loaded_generation: int | None = None
+        # Path -> time until which the path is known not to exist
+        self._misses: OrderedDict[str, float] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._routes)
+
+    @property
+    def up_to_date(self) -> bool:
+        """Whether the table holds all webhooks, as of its last load."""
+        return self._loaded_generation == self._generation
+
+    async def warm(self) -> None:
+        """Load the table. Errors are logged, not raised.
+
+        If loading fails, the current routes are kept and the load is retried
+        after `ttl` seconds.
+        """
+        try:
+            await self.refresh()
+        except Exception as e:
+            logger.error("Failed to load webhook routes", exc_info=e)
+            self._expires_at = time.monotonic() + self.ttl
+
+    async def refresh(self) -> None:
+        """Reload all webhook routes from the API."""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh())
+        # Don't cancel the shared fetch if one of its waiters is cancelled
+        await asyncio.shield(self._refresh_task)
+
+    async def authenticate(
+        self, path: str, secret: str
+    ) -> AuthenticateWebhookResponse | None:
+        """Authenticate a webhook request and return its route.
+
+        Returns None if the webhook doesn't exist.
+
+        Raises
+        ------
+        httpx.HTTPStatusError
+            If the API couldn't authenticate the webhook.
+        """
+        if self._expires_at <= time.monotonic():
+            # Until the table is loaded, missing paths are authenticated by the API
+            self._refresh_in_background()
+        route = self._routes.get(path)
+        if route is None:
+            if self.up_to_date:
+                return None
+            return await self._authenticate_with_api(path, secret)
+        if not hmac.compare_digest(route.secret, secret):
+            return AuthenticateWebhookResponse(status="Unauthorized")
+        return AuthenticateWebhookResponse(
+            status="Authorized",
+            owner_id=route.owner_id,
+            action_key=route.action_key,
+            action_id=route.action_id,
+            webhook_id=route.path,
+            workflow_id=route.workflow_id,
+        )
+
+    def invalidate_workflow(self, workflow_id: str) -> None:
+        """Drop all routes of a workflow, and reload the table on the next request."""
+        self._generation += 1
+        self._invalidated[workflow_id] = self._generation
+        for path in [
+            p for p, r in self._routes.items() if r.workflow_id == workflow_id
+        ]:
+            del self._routes[path]
+        # The workflow may have new webhooks
+        self._misses.clear()
+        self._expires_at = 0.0
+        logger.debug(f"Invalidated webhook routes of workflow {workflow_id!r}")
+
+    def _refresh_in_background(self) -> None:
+        if self._background_task is None or self._background_task.done():
+            self._background_task = asyncio.create_task(self.warm())
+
+    async def _refresh(self) -> None:
+        generation = self._generation
+        client = get_api_client()
+        response = await client.get("/authenticate/webhooks")
+        response.raise_for_status()
+        routes = _ROUTES_ADAPTER.validate_json(response.content)
+        # The fetch may have started before a change. Leave out the routes of
+        # workflows invalidated since, they are authenticated by the API instead.
+        self._routes = {
+            route.path: route
+            for route in routes
+            if not self._invalidated_since(route.workflow_id, generation)
+        }
+        self._loaded_generation = generation
+        if generation == self._generation:
+            self._expires_at = time.monotonic() + self.ttl
+        else:
+            # Invalidated during the fetch, reload on the next request
+            self._expires_at = 0.0
+        self._invalidated = {
+            k: v for k, v in self._invalidated.items() if v > generation
+        }
+        self._misses.clear()
+        logger.debug(f"Loaded {len(self._routes)} webhook routes")
+
+    async def _authenticate_with_api(
+        self, path: str, secret: str
+    ) -> AuthenticateWebhookResponse | None:
+        miss_expires_at = self._misses.get(path)
+        if miss_expires_at is not None:
+            if miss_expires_at > time.monotonic():
+                return None
+            del self._misses[path]
+
+        generation = self._generation
+        client = get_api_client()
+        response = await client.post(f"/authenticate/webhooks/{path}/{secret}")
+        try:
+            response.raise_for_status()
+        except httpx.HTTPStatusError:
+            if response.status_code == httpx.codes.NOT_FOUND:
+                self._add_miss(path)
+                return None
+            raise
+        auth_response = AuthenticateWebhookResponse.model_validate(response.json())
+        if auth_response.status == "Authorized" and not self._invalidated_since(
+            auth_response.workflow_id, generation
+        ):
+            self._routes[path] = WebhookRoute(
+                path=path,
+                secret=secret,
+                owner_id=auth_response.owner_id,
+                action_id=auth_response.action_id,
+                action_key=auth_response.action_key,
+                workflow_id=auth_response.workflow_id,
+            )
+        return auth_response
+
+    def _add_miss(self, path: str) -> None:
+        self._misses[path] = time.monotonic() + self.miss_ttl
+        self._misses.move_to_end(path)
+        while len(self._misses) > _MAX_MISSES:
+            self._misses.popitem(last=False)
+
+    def _invalidated_since(self, workflow_id: str | None, generation: int) -> bool:
+        return self._invalidated.get(workflow_id, 0) > generation
+
+
+webhook_table = WebhookTable(
+    ttl=TRACECAT__RUNNER_WEBHOOKS_TTL, miss_ttl=TRACECAT__RUNNER_WEBHOOKS_MISS_TTL
+)
@@ -1,15 +1,21 @@
-from functools import cached_property
+import asyncio
+from functools import cached_property, partial
 from typing import Any, Self
 from uuid import uuid4
 
 from pydantic import BaseModel, ConfigDict, Field, validator
 
-from tracecat.auth import AuthenticatedAPIClient
 from tracecat.logger import standard_logger
 from tracecat.runner.actions import (
     Action,
+    ActionRun,
+    ActionRunStatus,
     ActionSubclass,
+    ActionTrail,
 )
+from tracecat.runner.client import get_api_client
+from tracecat.runner.templates import TemplatePlan
+from tracecat.runner.tracker import DependencyTracker
 from tracecat.types.api import (
     ActionResponse,
     RunStatus,
@@ -44,6 +50,21 @@ class Workflow(BaseModel):
                 deps[action].add(dependency)
         return deps
 
+    @cached_property
+    def template_plans(self) -> dict[str, TemplatePlan]:
+        """Return a mapping of action keys to their compiled templated fields."""
+        return {
+            key: TemplatePlan(action.templated_fields)
+            for key, action in self.actions.items()
+        }
+
+    @cached_property
+    def secret_names(self) -> frozenset[str]:
+        """Return the names of all secrets referenced by the workflow's actions."""
+        return frozenset().union(
+            *(plan.secret_names for plan in self.template_plans.values())
+        )
+
     @validator("actions", pre=True)
     def parse_actions(cls, v: dict[str, Any]) -> Any:
         return {k: Action.from_dict(v) for k, v in v.items()}
@@ -112,6 +133,63 @@ class Workflow(BaseModel):
         )
 
 
+class WorkflowRunContext:
+    """Execution state of a single workflow run.
+
+    Each workflow run owns its own job queue and stores, so concurrent runs never
+    pull each other's jobs and the whole state can be dropped once the run ends.
+    """
+
+    def __init__(self, workflow: Workflow, workflow_run_id: str) -> None:
+        self.workflow = workflow
+        self.workflow_run_id = workflow_run_id
+        self.ready_jobs_queue: asyncio.Queue[ActionRun] = asyncio.Queue()
+        self.running_jobs_store: dict[str, asyncio.Task[None]] = {}
+        self.action_result_store: dict[str, ActionTrail] = {}
+        self.action_run_status_store: dict[str, ActionRunStatus] = {}
+        self.dependency_tracker = DependencyTracker(
+            adj_list=workflow.adj_list,
+            action_dependencies=workflow.action_dependencies,
+        )
+        self.cancelled = False
+        self._state_changed = asyncio.Event()
+
+    def enqueue(self, action_run: ActionRun) -> None:
+        """Mark an action run as ready to be scheduled."""
+        self.ready_jobs_queue.put_nowait(action_run)
+        self._state_changed.set()
+
+    def add_running_job(self, action_run_id: str, task: asyncio.Task[None]) -> None:
+        """Track a running action run until its task (including cleanup) is done."""
+        self.running_jobs_store[action_run_id] = task
+        task.add_done_callback(partial(self._on_job_done, action_run_id))
+
+    def _on_job_done(self, action_run_id: str, _task: asyncio.Task[None]) -> None:
+        self.running_jobs_store.pop(action_run_id, None)
+        self._state_changed.set()
+
+    def cancel(self) -> None:
+        """Stop scheduling action runs, waking up a pending `next_action_run`."""
+        self.cancelled = True
+        self._state_changed.set()
+
+    async def next_action_run(self) -> ActionRun | None:
+        """Wait for the next ready action run.
+
+        Returns None as soon as the run has drained, i.e. there are no ready
+        and no running action runs left, or the run was cancelled.
+        """
+        while True:
+            if self.cancelled:
+                return None
+            if not self.ready_jobs_queue.empty():
+                return self.ready_jobs_queue.get_nowait()
+            if not self.running_jobs_store:
+                return None
+            self._state_changed.clear()
+            await self._state_changed.wait()
+
+
 def _graph_obj_to_adj_list(
     obj: dict[str, Any], actions: dict[str, ActionResponse]
 ) -> dict[str, set[str]]:
@@ -137,9 +215,9 @@ def _graph_obj_to_adj_list(
 # TODO: Move these calls into a logger or something
 async def create_workflow_run(workflow_id: str) -> WorkflowRunResponse:
     """Create a workflow run."""
-    async with AuthenticatedAPIClient(http2=True) as client:
-        response = await client.post(f"/workflows/{workflow_id}/runs")
-        response.raise_for_status()
+    client = get_api_client()
+    response = await client.post(f"/workflows/{workflow_id}/runs")
+    response.raise_for_status()
     return WorkflowRunResponse.model_validate(response.json())
 
 
@@ -151,12 +229,12 @@ async def update_workflow_run(
     """Update a workflow run."""
     logger.info(f"Log update workflow run {workflow_run_id} with status {status}")
     params = UpdateWorkflowRunParams(status=status)
-    async with AuthenticatedAPIClient(http2=True) as client:
-        response = await client.post(
-            f"/workflows/{workflow_id}/runs/{workflow_run_id}",
-            json=params.model_dump(),
+    client = get_api_client()
+    response = await client.post(
+        f"/workflows/{workflow_id}/runs/{workflow_run_id}",
+        json=params.model_dump(),
+    )
+    if response.status_code != 204:
+        logger.error(
+            f"Failed to update workflow run {workflow_run_id} with status {status}"
         )
-        if response.status_code != 204:
-            logger.error(
-                f"Failed to update workflow run {workflow_run_id} with status {status}"
-            )
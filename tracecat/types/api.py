@@ -3,7 +3,7 @@ from __future__ import annotations
 from datetime import datetime
 from typing import Any, Literal
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from tracecat.db import ActionRun, WorkflowRun
 from tracecat.types.actions import ActionType
@@ -84,6 +84,17 @@ class UpdateActionRunParams(BaseModel):
     status: RunStatus
 
 
+class UpsertActionRunParams(BaseModel):
+    action_id: str
+    action_run_id: str  # This is deterministically defined in the runner
+    workflow_run_id: str
+    status: RunStatus
+
+
+class BatchUpsertActionRunsParams(BaseModel):
+    action_runs: list[UpsertActionRunParams]
+
+
 class CreateWorkflowParams(BaseModel):
     title: str
     description: str
@@ -140,6 +151,17 @@ class AuthenticateWebhookResponse(BaseModel):
     workflow_id: str | None = None
 
 
+class WebhookRoute(BaseModel):
+    """Everything the runner needs to authenticate and route a webhook."""
+
+    path: str
+    secret: str
+    owner_id: str
+    action_id: str
+    action_key: str
+    workflow_id: str
+
+
 class Event(BaseModel):
     published_at: datetime
     action_id: str
@@ -154,9 +176,15 @@ class Event(BaseModel):
 
 class EventSearchParams(BaseModel):
     workflow_id: str
-    limit: int = 1000
-    order_by: str = "pubished_at"
+    limit: int = Field(default=1000, ge=1, le=10000)
+    offset: int = Field(default=0, ge=0)
+    order_by: Literal["published_at"] = "published_at"
+    order: Literal["asc", "desc"] = "desc"
     workflow_run_id: str | None = None
+    action_type: str | None = None
+    # Events published in [start_time, end_time)
+    start_time: datetime | None = None
+    end_time: datetime | None = None
     query: str | None = None
     group_by: list[str] | None = None
     agg: str | None = None
@@ -76,10 +76,15 @@ class Case(BaseModel):
 
     @classmethod
     def from_params(
-        cls, params: CaseParams, *, owner_id: str, id: str | None = None
+        cls,
+        params: CaseParams,
+        *,
+        owner_id: str,
+        workflow_id: str,
+        id: str | None = None,
     ) -> "Case":
         """Constructs from API params."""
-        kwargs = {"owner_id": owner_id}
+        kwargs = {"owner_id": owner_id, "workflow_id": workflow_id}
         kwargs.update(params.model_dump())
         if id:
             kwargs["id"] = id
@@ -89,6 +94,12 @@ class Case(BaseModel):
 class CaseMetrics(BaseModel):
     """Summary statistics for cases over a time period."""
 
-    statues: list[dict[str, int | float]]
-    priority: list[dict[str, int | float]]
-    malice: list[dict[str, int | float]]
+    # Number of cases per status, priority and malice, e.g.
+    # [{"status": "open", "count": 3}, ...]
+    statues: list[dict[str, str | int]]
+    priority: list[dict[str, str | int]]
+    malice: list[dict[str, str | int]]
+    # Width of the time buckets
+    interval: str
+    # Number of cases per time bucket, status, priority and malice
+    timeseries: list[dict[str, datetime | str | int]]